@@ -0,0 +1,138 @@
+# Batched Newton-Raphson power flow over many load scenarios of the same network
+# Mismatches are evaluated for all active scenarios at once, converged scenarios leave the active set
+from Powerflow import Powerflow
+from circuit import Circuit
+from Jacobian import Jacobian
+from LinearSolver import get_linear_solver
+from Telemetry import logger
+
+import numpy as np
+import pandas as pd
+
+
+class Batch_Powerflow:
+    def __init__(self, circuit: Circuit, tol: float = 0.001, max_iter: int = 50, linear_solver: str = "superlu"):
+        self.circuit = circuit
+        self.tol = tol
+        self.max_iter = max_iter
+        self.circuit.calc_y_admit()
+        #Only the specified injections are used, the circuit voltages are left as they are
+        self.powerflow = Powerflow(circuit, "previous")
+        self.jacobian = Jacobian(circuit)
+        self.linear_solver = get_linear_solver(circuit, "jacobian", linear_solver,
+                                               (circuit.pvpq_indices, circuit.pq_indices))
+
+        self.pvpq = self.circuit.pvpq_indices
+        self.pq = self.circuit.pq_indices
+
+        #Bus index of every load, in the order of circuit.loads
+        self.load_names = list(self.circuit.loads.keys())
+        self.load_indices = np.array([load.bus_index for load in self.circuit.loads.values()], dtype=np.int64)
+
+        self.vpu = None
+        self.delta = None
+        self.converged = None
+        self.iterations = None
+
+    def calc_specified_power(self, p_loads, q_loads):
+        """
+        Specified per-unit injections for each scenario (scenarios x buses).
+        Load columns replace the base-case loads, all other injections stay as in the circuit.
+        """
+        p_spec = np.tile(self.powerflow.p_spec, (p_loads.shape[0], 1))
+        q_spec = np.tile(self.powerflow.q_spec, (q_loads.shape[0], 1))
+        p_gen = self.circuit.bus_table["p_gen"][self.load_indices]
+        p_spec[:, self.load_indices] = (p_gen - p_loads) / self.circuit.settings.base_power
+        q_spec[:, self.load_indices] = -q_loads / self.circuit.settings.base_power
+        return p_spec, q_spec
+
+    def calc_mismatch(self, v, p_spec, q_spec):
+        """Mismatch rows [P of non-slack buses, Q of PQ buses] for a block of scenarios (scenarios x buses)."""
+        s_injected = v * np.conj((self.circuit.ybus @ v.T).T)
+        p_mismatch = p_spec[:, self.pvpq] - s_injected.real[:, self.pvpq]
+        q_mismatch = q_spec[:, self.pq] - s_injected.imag[:, self.pq]
+        return np.hstack((p_mismatch, q_mismatch))
+
+    def as_matrix(self, loads):
+        """Accept a scenarios x loads array, or a DataFrame with load-name columns."""
+        if isinstance(loads, pd.DataFrame):
+            loads = loads[self.load_names].to_numpy()
+        loads = np.atleast_2d(np.asarray(loads, dtype=np.float64))
+        if loads.shape[1] != len(self.load_names):
+            raise ValueError(f"Expected {len(self.load_names)} load columns, got {loads.shape[1]}")
+        return loads
+
+    def solve(self, p_loads, q_loads, batch_size: int = 32):
+        """
+        Solve every scenario (row) of the load matrices.
+
+        The scenarios are split into batch_size contiguous chains that are stepped together: step t
+        iterates the t-th scenario of every chain, so each scenario warm-starts from the converged
+        solution of the scenario before it (the first of each chain from the circuit voltages).
+        Only the mismatch evaluation is vectorized over the scenarios of a step; every active
+        scenario still has its own Jacobian factorization, sharing the cached symbolic analysis.
+
+        :param p_loads: scenarios x loads real power in MW (columns in circuit.loads order).
+        :param q_loads: scenarios x loads reactive power in MVAR.
+        :param batch_size: Number of scenarios iterated together.
+        :return: (vpu, delta) arrays of shape scenarios x buses.
+        """
+        p_loads = self.as_matrix(p_loads)
+        q_loads = self.as_matrix(q_loads)
+        num_scenarios = p_loads.shape[0]
+        n = len(self.circuit.buses)
+        num_angles = len(self.pvpq)
+
+        self.vpu = np.zeros((num_scenarios, n))
+        self.delta = np.zeros((num_scenarios, n))
+        self.converged = np.zeros(num_scenarios, dtype=bool)
+        self.iterations = np.zeros(num_scenarios, dtype=np.int64)
+
+        #Every chain starts from the circuit voltages, then from its last converged scenario
+        num_chains = max(min(batch_size, num_scenarios), 1)
+        chain_length = -(-num_scenarios // num_chains)
+        chain_starts = np.arange(num_chains) * chain_length
+        v_start = np.tile(self.circuit.get_voltage_vector(), (num_chains, 1))
+
+        for step in range(chain_length):
+            chains = np.flatnonzero(chain_starts + step < num_scenarios)
+            block = chain_starts[chains] + step
+            p_spec, q_spec = self.calc_specified_power(p_loads[block], q_loads[block])
+
+            v = v_start[chains].copy()
+            vpu = np.abs(v)
+            delta = np.angle(v)
+            active = np.arange(len(block))
+
+            for iteration in range(self.max_iter + 1):
+                mismatch = self.calc_mismatch(v[active], p_spec[active], q_spec[active])
+
+                #Drop converged scenarios from the active set
+                done = np.max(np.abs(mismatch), axis=1, initial=0) < self.tol
+                self.converged[block[active[done]]] = True
+                self.iterations[block[active]] = iteration
+                active = active[~done]
+                mismatch = mismatch[~done]
+
+                if len(active) == 0 or iteration == self.max_iter:
+                    break
+
+                for row, k in enumerate(active):
+                    self.linear_solver.factor(self.jacobian.calc_jacobian(v[k]))
+                    delta_x = self.linear_solver.solve(mismatch[row])
+                    delta[k, self.pvpq] += delta_x[:num_angles]
+                    vpu[k, self.pq] += delta_x[num_angles:]
+
+                v[active] = vpu[active] * np.exp(1j * delta[active])
+
+            self.vpu[block] = vpu
+            self.delta[block] = delta
+
+            #The next scenario of each chain warm-starts from this one if it converged
+            converged = self.converged[block]
+            v_start[chains[converged]] = v[converged]
+
+        if not np.all(self.converged):
+            logger.warning("%d of %d scenarios did not converge", np.count_nonzero(~self.converged), num_scenarios)
+
+        return self.vpu, self.delta
@@ -0,0 +1,194 @@
+# Benchmark of the solver hot paths on synthetic grids of increasing size
+# Records wall-clock time and peak traced memory per phase and size, keyed by git commit,
+# and compares two commits so regressions show up before they are merged
+#
+# python Benchmark.py --sizes 100 1000 10000               run and save under the current commit
+# python Benchmark.py --compare 7c89c39                    also compare against a saved commit
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import scipy
+
+from Grid_Generator import generate_grid
+from Jacobian import Jacobian
+from Powerflow import Powerflow
+from Newton_Raphson import Newton_Raphson
+from Symmetrical_Faults import Fault
+
+DEFAULT_SIZES = [100, 1000, 10000, 50000]
+#Commits and the default results file are taken from the repository, wherever the script is run from
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT = os.path.join(REPO_DIR, "benchmark_results.json")
+
+
+def git_commit():
+    """Short hash of HEAD, with a +dirty suffix for uncommitted changes to tracked files."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True, cwd=REPO_DIR).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True,
+                               text=True, check=True, cwd=REPO_DIR).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + "+dirty" if dirty else commit
+
+
+def get_phases(num_buses: int, seed: int):
+    """
+    Return [(phase, setup, run)] for one grid size. setup() prepares a fresh state and
+    returns the argument for run(), so every repeat measures the same cold work.
+    """
+    circuit = generate_grid(num_buses, seed)
+    circuit.calc_y_admit()
+    fault_bus = circuit.bus_table.names[len(circuit.buses) // 2]
+
+    def fresh_solvers():
+        circuit.linear_solvers = {}
+        circuit.fault_cache = None
+        return circuit
+
+    def calc_fault(fault):
+        with contextlib.redirect_stdout(io.StringIO()):
+            fault.calc_fault()
+
+    return [
+        ("generate_grid", lambda: num_buses, lambda n: generate_grid(n, seed)),
+        ("calc_y_admit", lambda: circuit, lambda c: c.calc_y_admit()),
+        ("calc_PQ", lambda: Powerflow(circuit), lambda powerflow: powerflow.calc_PQ()),
+        ("calc_jacobian", lambda: Jacobian(circuit), lambda jacobian: jacobian.calc_jacobian()),
+        ("newton_raphson", lambda: Newton_Raphson(fresh_solvers(), 1e-6, 20), lambda solver: solver.solve()),
+        ("calc_fault", lambda: Fault(fresh_solvers(), fault_bus), calc_fault),
+    ]
+
+
+def measure(setup, run, repeat: int, min_time: float = 0.05):
+    """
+    Best and median wall-clock time per call over repeat rounds, then peak traced memory of one
+    more call. Fast phases are called several times per round so a round lasts about min_time.
+    """
+    argument = setup()
+    start = time.perf_counter()
+    run(argument)
+    number = max(1, int(min_time / max(time.perf_counter() - start, 1e-9)))
+
+    times = []
+    for _ in range(repeat):
+        arguments = [setup() for _ in range(number)]
+        start = time.perf_counter()
+        for argument in arguments:
+            run(argument)
+        times.append((time.perf_counter() - start) / number)
+
+    #tracemalloc slows everything down, so memory is measured in a separate call
+    argument = setup()
+    tracemalloc.start()
+    try:
+        run(argument)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {"time": min(times), "median_time": float(np.median(times)), "number": number, "peak_mb": peak / 2**20}
+
+
+def run_benchmark(sizes, repeat: int = 3, seed: int = 0):
+    """Run every phase for every size and return {size: {phase: measurement}}."""
+    results = {}
+    for num_buses in sizes:
+        results[str(num_buses)] = {}
+        for phase, setup, run in get_phases(num_buses, seed):
+            results[str(num_buses)][phase] = measure(setup, run, repeat)
+            result = results[str(num_buses)][phase]
+            print(f"{num_buses:>8} {phase:<16}{result['time'] * 1000:12.3f} ms{result['peak_mb']:12.2f} MB")
+    return results
+
+
+def load_results(path: str):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+
+def save_results(path: str, commit: str, results, repeat: int, seed: int):
+    """Store the run under its commit, replacing an earlier run of the same commit."""
+    history = load_results(path)
+    history[commit] = {
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "scipy": scipy.__version__,
+        "repeat": repeat,
+        "seed": seed,
+        "results": results,
+    }
+    with open(path, "w") as file:
+        json.dump(history, file, indent=2)
+
+
+def compare_results(baseline, current, threshold: float = 1.25):
+    """
+    Print the time and memory ratio current/baseline of every phase both runs measured.
+    Return the (size, phase, metric, ratio) entries slower or bigger than threshold.
+    """
+    regressions = []
+    print(f"\n{'size':>8} {'phase':<16}{'time ratio':>12}{'memory ratio':>14}")
+    for size, phases in current.items():
+        for phase, result in phases.items():
+            if phase not in baseline.get(size, {}):
+                continue
+            base = baseline[size][phase]
+            time_ratio = result["time"] / base["time"] if base["time"] > 0 else float("inf")
+            memory_ratio = result["peak_mb"] / base["peak_mb"] if base["peak_mb"] > 0 else 1.0
+            flags = ""
+            if time_ratio > threshold:
+                regressions.append((size, phase, "time", time_ratio))
+                flags += "  slower"
+            if memory_ratio > threshold:
+                regressions.append((size, phase, "memory", memory_ratio))
+                flags += "  bigger"
+            print(f"{size:>8} {phase:<16}{time_ratio:12.2f}{memory_ratio:14.2f}{flags}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the power flow and fault solvers on synthetic grids.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="number of buses of each grid")
+    parser.add_argument("--repeat", type=int, default=3, help="timed rounds per phase, the best one is kept")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the grid generator")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="JSON file of results keyed by commit")
+    parser.add_argument("--compare", metavar="COMMIT", help="saved commit to compare this run against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="ratio above which a phase is a regression")
+    parser.add_argument("--no-save", action="store_true", help="do not write this run to the output file")
+    args = parser.parse_args(argv)
+
+    commit = git_commit()
+    print(f"Benchmark of commit {commit}")
+    results = run_benchmark(args.sizes, args.repeat, args.seed)
+
+    if not args.no_save:
+        save_results(args.output, commit, results, args.repeat, args.seed)
+
+    if args.compare is not None:
+        history = load_results(args.output)
+        if args.compare not in history:
+            print(f"Error: no saved results for commit {args.compare} in {args.output}")
+            return 2
+        regressions = compare_results(history[args.compare]["results"], results, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.threshold:.2f}x against {args.compare}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
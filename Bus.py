@@ -1,35 +1,102 @@
 from Load import Load
 from Generator import Generator
+from NetworkTables import BusTable, BUS_TYPES, BUS_TYPE_NAMES
 
 class Bus:
 
-
-    bus_count = 0
+    __slots__ = ("name", "table", "index", "_load", "_generator")
 
     #Recently refactored
-    def __init__(self, name:str, base_kv:float, vpu:float=1, delta:float=0, bus_type:str="PQ_Bus"):
+    def __init__(self, name:str, base_kv:float, vpu:float=1, delta:float=0, bus_type:str="PQ_Bus", table:BusTable=None):
         """
-        Initialize a Bus object.
+        Initialize a Bus object, a view onto one row of a BusTable.
 
         :param name: Name of the bus (str).
         :param base_kv: Base KV (float).
+        :param table: BusTable holding the bus data, a new one-bus table if not given.
         """
+        if table is None:
+            table = BusTable(capacity=1)
+
+        if bus_type not in BUS_TYPES:
+            print("Invalid bus type")
+
         self.name = name
-        self.base_kv = base_kv
-        self.index = Bus.bus_count
-        self.vpu = vpu
-        self.delta = delta
+        self.table = table
+        self.index = table.append(name, base_kv=base_kv, vpu=vpu, delta=delta, bus_type=BUS_TYPES.get(bus_type, -1),
+                                  v_set=vpu)
         self.generator = Generator("placeholder", 0, 0)
         self.load = Load("placeholder", 0, 0)
 
-        if bus_type =="Slack_Bus" or bus_type =="PQ_Bus" or bus_type =="PV_Bus":
-            self.bus_type = bus_type
-        else:
-            print("Invalid bus type")
+    @classmethod
+    def from_row(cls, table:BusTable, index:int):
+        """Create a Bus view onto an existing row of table, e.g. one filled in bulk."""
+        bus = cls.__new__(cls)
+        bus.name = table.names[index]
+        bus.table = table
+        bus.index = index
+        bus._generator = None  #Placeholders are created on first access
+        bus._load = None
+        return bus
+
+    @property
+    def base_kv(self):
+        return self.table.data["base_kv"][self.index]
+
+    @base_kv.setter
+    def base_kv(self, value):
+        #Branches already connected keep the per-unit impedances computed from the old base
+        self.table.data["base_kv"][self.index] = value
+
+    @property
+    def vpu(self):
+        return self.table.data["vpu"][self.index]
+
+    @vpu.setter
+    def vpu(self, value):
+        self.table.data["vpu"][self.index] = value
+
+    @property
+    def delta(self):
+        return self.table.data["delta"][self.index]
+
+    @delta.setter
+    def delta(self, value):
+        self.table.data["delta"][self.index] = value
+
+    @property
+    def bus_type(self):
+        return BUS_TYPE_NAMES.get(int(self.table.data["bus_type"][self.index]))
+
+    @bus_type.setter
+    def bus_type(self, value:str):
+        if value not in BUS_TYPES:
+            raise ValueError(f"Invalid bus type: {value}")
+        self.table.data["bus_type"][self.index] = BUS_TYPES[value]
+        if self.table.circuit is not None:
+            self.table.circuit.invalidate_bus_types()
+
+    @property
+    def load(self):
+        if self._load is None:
+            self._load = Load.from_row("placeholder", self.table, self.index)
+        return self._load
 
-        Bus.bus_count += 1
+    @load.setter
+    def load(self, load:Load):
+        load.attach(self.table, self.index)
+        self._load = load
 
+    @property
+    def generator(self):
+        if self._generator is None:
+            self._generator = Generator.from_row("placeholder", self.table, self.index)
+        return self._generator
 
+    @generator.setter
+    def generator(self, generator:Generator):
+        generator.attach(self.table, self.index)
+        self._generator = generator
 
     def __str__(self):
         """Return a formatted string representing the bus object."""
@@ -48,4 +115,4 @@ if __name__ == "__main__":
 
     print(bus1)
     print(bus2)
-    print("\nBus count: ", Bus.bus_count)
\ No newline at end of file
+    print("\nBus indices: ", bus1.index, bus2.index)
\ No newline at end of file
@@ -0,0 +1,496 @@
+# Streaming importer for MATPOWER .m, PSS/E RAW and CSV network case files
+# Files are parsed line by line (CSV in chunks) into column arrays, validated as whole arrays
+# and bulk-loaded into the circuit's bus and branch tables; the element objects are thin views
+import csv
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from circuit import Circuit
+from Settings import Settings
+from NetworkTables import SLACK_BUS, PV_BUS, PQ_BUS, describe
+from Telemetry import logger
+
+#MATPOWER bus types and PSS/E IDE codes: 1 PQ, 2 PV, 3 slack, 4 isolated
+ISOLATED = 4
+BUS_TYPE_CODES = np.array([-1, PQ_BUS, PV_BUS, SLACK_BUS, -1], dtype=np.int8)
+
+
+class CaseData:
+    """
+    Network data as column arrays, independent of the file format.
+
+    bus:    id, bus_type (1 PQ, 2 PV, 3 slack, 4 isolated), base_kv, vpu, delta (degrees),
+            p_load, q_load (MW, MVAR), g_shunt, b_shunt (MW, MVAR at 1 pu)
+    branch: from_id, to_id, r, x, b (per-unit on base_power), tap (0 for lines),
+            rating (MVA, 0 for unlimited), in_service
+    gen:    bus_id, p_gen, q_gen (MW, MVAR), v_set (pu), m_base (MVA),
+            x_sub (subtransient reactance on m_base, NaN if unknown), in_service
+    """
+    BUS_COLUMNS = ("id", "bus_type", "base_kv", "vpu", "delta", "p_load", "q_load", "g_shunt", "b_shunt")
+    BRANCH_COLUMNS = ("from_id", "to_id", "r", "x", "b", "tap", "rating", "in_service")
+    GEN_COLUMNS = ("bus_id", "p_gen", "q_gen", "v_set", "m_base", "x_sub", "in_service")
+
+    def __init__(self, base_power: float = 100.0):
+        self.base_power = base_power
+        self.bus = {}
+        self.branch = {}
+        self.gen = {}
+
+    def set_columns(self, part: str, matrix, columns):
+        """Store the columns of a 2-D array (rows x len(columns)) under the given part."""
+        matrix = np.asarray(matrix, dtype=np.float64).reshape(-1, len(columns))
+        getattr(self, part).update({column: matrix[:, k] for k, column in enumerate(columns)})
+
+
+def split_matrix(rows, name: str):
+    """Parse the rows of a MATPOWER matrix (numbers separated by spaces, commas or tabs) into a 2-D array."""
+    first = next((row for row in rows if row.strip(" ;\t\n")), None)
+    if first is None:
+        return np.zeros((0, 0))
+    num_columns = len(first.split(";")[0].replace(",", " ").split())
+    text = "".join(rows).replace(";", " ").replace(",", " ")
+    values = np.fromstring(text, sep=" ")
+    if len(values) % num_columns != 0:
+        raise ValueError(f"Rows of mpc.{name} do not all have {num_columns} columns")
+    return values.reshape(-1, num_columns)
+
+
+def read_matpower(path: str):
+    """Read the baseMVA, bus, gen and branch matrices of a MATPOWER version 2 case file."""
+    case = CaseData()
+    matrices = {}
+    current = None
+    rows = []
+
+    with open(path) as file:
+        for line in file:
+            if "%" in line:
+                line = line.split("%", 1)[0] + "\n"
+
+            if current is None:
+                line = line.strip()
+                if line.startswith("mpc.baseMVA"):
+                    case.base_power = float(line.split("=", 1)[1].strip(" ;"))
+                    continue
+                match = re.match(r"mpc\.(\w+)\s*=\s*([\[{])", line)
+                if match is None:
+                    continue
+                current = match.group(1) if match.group(2) == "[" else "_skip"
+                rows = []
+                line = line[match.end():] + "\n"
+
+            #Matrix rows are kept as raw text and parsed in one go when the matrix ends
+            end = line.find("]" if current != "_skip" else "}")
+            if current in ("bus", "gen", "branch"):
+                rows.append(line if end < 0 else line[:end])
+            if end >= 0:
+                if current in ("bus", "gen", "branch"):
+                    matrices[current] = split_matrix(rows, current)
+                current = None
+
+    for name in ("bus", "branch"):
+        if name not in matrices:
+            raise ValueError(f"{path} has no mpc.{name} matrix")
+
+    bus = matrices["bus"]
+    case.bus = {"id": bus[:, 0], "bus_type": bus[:, 1], "p_load": bus[:, 2], "q_load": bus[:, 3],
+                "g_shunt": bus[:, 4], "b_shunt": bus[:, 5], "vpu": bus[:, 7], "delta": bus[:, 8], "base_kv": bus[:, 9]}
+
+    branch = matrices["branch"]
+    if np.any(branch[:, 9] != 0):
+        logger.warning("%s: phase shifts of %d branches are ignored", path, np.count_nonzero(branch[:, 9]))
+    case.branch = {"from_id": branch[:, 0], "to_id": branch[:, 1], "r": branch[:, 2], "x": branch[:, 3],
+                   "b": branch[:, 4], "rating": branch[:, 5], "tap": branch[:, 8], "in_service": branch[:, 10]}
+
+    gen = matrices.get("gen", np.zeros((0, 8)))
+    case.gen = {"bus_id": gen[:, 0], "p_gen": gen[:, 1], "q_gen": gen[:, 2], "v_set": gen[:, 5],
+                "m_base": gen[:, 6], "x_sub": np.full(len(gen), np.nan), "in_service": gen[:, 7]}
+    return case
+
+
+RAW_COMMENT = re.compile(r"^((?:[^'/]|'[^']*')*)")
+RAW_SECTION = re.compile(r"BEGIN (.+?) DATA", re.IGNORECASE)
+
+
+def split_record(line: str):
+    """Split one comma-separated RAW record, dropping a trailing / comment and the quotes of names."""
+    if "/" in line:
+        line = RAW_COMMENT.match(line).group(1)
+    if "'" in line:
+        return [field.strip() for field in next(csv.reader([line], quotechar="'", skipinitialspace=True))]
+    return [field.strip() for field in line.split(",")]
+
+
+def read_psse_raw(path: str):
+    """
+    Read the bus, load, fixed shunt, generator, branch and two-winding transformer data of a
+    PSS/E RAW file (revisions 30 to 34, comma-separated). Three-winding transformers,
+    phase shifts and non-constant-power load components are skipped with a warning.
+    """
+    buses, loads, shunts, gens, branches = [], [], [], [], []
+    skipped = {"three-winding transformers": 0, "phase shifts": 0, "non-constant-power loads": 0}
+
+    with open(path) as file:
+        header = split_record(file.readline())
+        base_power = float(header[1])
+        version = int(float(header[2])) if len(header) > 2 and header[2] else 33
+        file.readline()
+        file.readline()
+
+        #Sections are named by the "0 / END OF ... DATA, BEGIN ... DATA" terminators, or by position
+        order = ["BUS", "LOAD", "GENERATOR", "BRANCH", "TRANSFORMER"]
+        if version >= 31:
+            order.insert(2, "FIXED SHUNT")
+        section = 0
+        name = order[0]
+        base_kv = None
+
+        for line in file:
+            if not line.strip():
+                continue
+            if line.lstrip().upper().startswith("Q"):
+                break
+            fields = split_record(line)
+
+            if fields[0] == "0":
+                section += 1
+                match = RAW_SECTION.search(line)
+                if match is not None:
+                    name = match.group(1).strip().upper()
+                else:
+                    name = order[section] if section < len(order) else "UNKNOWN"
+                continue
+
+            if name == "BUS":
+                if version <= 30:
+                    buses.append((fields[0], fields[3], fields[2], fields[8], fields[9], fields[4], fields[5]))
+                else:
+                    buses.append((fields[0], fields[3], fields[2], fields[7], fields[8], 0, 0))
+            elif name == "LOAD":
+                loads.append((fields[0], fields[5], fields[6], fields[2]))
+                if any(float(value) != 0 for value in fields[7:11] if value):
+                    skipped["non-constant-power loads"] += 1
+            elif name == "FIXED SHUNT":
+                shunts.append((fields[0], fields[3], fields[4], fields[2]))
+            elif name == "GENERATOR":
+                gens.append((fields[0], fields[2], fields[3], fields[6], fields[8], fields[10], fields[14]))
+            elif name == "BRANCH":
+                to_id = abs(int(fields[1]))
+                rating, status = (fields[7], fields[23]) if version >= 34 else (fields[6], fields[13])
+                branches.append((fields[0], to_id, fields[3], fields[4], fields[5], 0, rating, status))
+                #GI, BI, GJ, BJ are per-unit on the system base, fixed shunts in MW/MVAR at 1 pu
+                line_shunts = [float(value or 0) * base_power for value in (fields[19:23] if version >= 34 else fields[9:13])]
+                shunts.append((fields[0], line_shunts[0], line_shunts[1], status))
+                shunts.append((to_id, line_shunts[2], line_shunts[3], status))
+            elif name == "TRANSFORMER":
+                three_winding = int(fields[2]) != 0
+                lines = [split_record(next(file)) for _ in range(4 if three_winding else 3)]
+                if three_winding:
+                    skipped["three-winding transformers"] += 1
+                    continue
+                if base_kv is None:
+                    bus_array = np.array(buses, dtype=np.float64).reshape(-1, 7)
+                    base_kv = dict(zip(bus_array[:, 0].astype(np.int64), bus_array[:, 2]))
+                branches.append(parse_raw_transformer(fields, lines, base_power, base_kv, skipped))
+
+    for reason, count in skipped.items():
+        if count:
+            logger.warning("%s: %d %s skipped or approximated", path, count, reason)
+
+    case = CaseData(base_power)
+    bus = np.array(buses, dtype=np.float64).reshape(-1, 7)
+    case.bus = {"id": bus[:, 0], "bus_type": bus[:, 1], "base_kv": bus[:, 2], "vpu": bus[:, 3], "delta": bus[:, 4],
+                "p_load": np.zeros(len(bus)), "q_load": np.zeros(len(bus)), "g_shunt": bus[:, 5].copy(),
+                "b_shunt": bus[:, 6].copy()}
+    case.set_columns("branch", branches, CaseData.BRANCH_COLUMNS)
+    case.set_columns("gen", gens, CaseData.GEN_COLUMNS)
+
+    #Loads and shunts are separate records in RAW files, sum them per bus
+    index_of = BusLookup(case.bus["id"])
+    load = np.array(loads, dtype=np.float64).reshape(-1, 4)
+    load = load[load[:, 3] != 0]
+    shunt = np.array(shunts, dtype=np.float64).reshape(-1, 4)
+    shunt = shunt[shunt[:, 3] != 0]
+    for column, rows, values in (("p_load", load, 1), ("q_load", load, 2),
+                                 ("g_shunt", shunt, 1), ("b_shunt", shunt, 2)):
+        indices = index_of(rows[:, 0])
+        if np.any(indices < 0):
+            raise ValueError(f"{path}: {np.count_nonzero(indices < 0)} load or shunt records reference unknown buses")
+        case.bus[column] += np.bincount(indices, rows[:, values], len(bus))
+    return case
+
+
+def parse_raw_transformer(fields, lines, base_power: float, base_kv, skipped):
+    """Convert a two-winding RAW transformer record (first line plus 3 more) to a CaseData branch row."""
+    from_id, to_id = int(fields[0]), int(fields[1])
+    cw, cz = int(fields[4]), int(fields[5])
+    r, x, s_base = float(lines[0][0]), float(lines[0][1]), float(lines[0][2])
+    windv1, nomv1, angle, rating = float(lines[1][0]), float(lines[1][1]), float(lines[1][2]), float(lines[1][3])
+    windv2, nomv2 = float(lines[2][0]), float(lines[2][1])
+
+    #Series impedance on the system base
+    if cz == 2:
+        r, x = r * base_power / s_base, x * base_power / s_base
+    elif cz == 3:
+        z = x
+        r = r / 1e6 / s_base
+        x = np.sqrt(max(z**2 - r**2, 0.0))
+        r, x = r * base_power / s_base, x * base_power / s_base
+
+    #Winding voltages in per-unit of the bus base voltages
+    if cw == 2:
+        windv1, windv2 = windv1 / base_kv[from_id], windv2 / base_kv[to_id]
+    elif cw == 3:
+        windv1 *= (nomv1 or base_kv[from_id]) / base_kv[from_id]
+        windv2 *= (nomv2 or base_kv[to_id]) / base_kv[to_id]
+
+    if angle != 0:
+        skipped["phase shifts"] += 1
+    return (from_id, to_id, r, x, 0.0, windv1 / windv2, rating, int(fields[11]))
+
+
+def read_csv_case(directory: str, base_power: float = 100.0, chunk_size: int = 100000):
+    """
+    Read bus.csv, branch.csv and optionally gen.csv from directory, chunk by chunk.
+    Column headers are the CaseData column names; missing optional columns get defaults.
+    """
+    defaults = {
+        "bus": {"vpu": 1.0, "delta": 0.0, "p_load": 0.0, "q_load": 0.0, "g_shunt": 0.0, "b_shunt": 0.0},
+        "branch": {"b": 0.0, "tap": 0.0, "rating": 0.0, "in_service": 1.0},
+        "gen": {"q_gen": 0.0, "v_set": 1.0, "m_base": base_power, "x_sub": np.nan, "in_service": 1.0},
+    }
+    columns = {"bus": CaseData.BUS_COLUMNS, "branch": CaseData.BRANCH_COLUMNS, "gen": CaseData.GEN_COLUMNS}
+
+    case = CaseData(base_power)
+    for part in ("bus", "branch", "gen"):
+        path = os.path.join(directory, f"{part}.csv")
+        if not os.path.exists(path):
+            if part != "gen":
+                raise ValueError(f"{directory} has no {part}.csv")
+            case.gen = {column: np.zeros(0) for column in columns["gen"]}
+            continue
+
+        chunks = []
+        for chunk in pd.read_csv(path, chunksize=chunk_size, skipinitialspace=True):
+            for column, value in defaults[part].items():
+                if column not in chunk:
+                    chunk[column] = value
+            missing = [column for column in columns[part] if column not in chunk]
+            if missing:
+                raise ValueError(f"{path} is missing the columns {', '.join(missing)}")
+            chunks.append(chunk[list(columns[part])].to_numpy(dtype=np.float64))
+        case.set_columns(part, np.vstack(chunks) if chunks else np.zeros((0, len(columns[part]))), columns[part])
+    return case
+
+
+class BusLookup:
+    """Vectorized mapping of external bus ids to row indices, -1 for unknown ids."""
+
+    def __init__(self, ids):
+        self.sorter = np.argsort(ids, kind="stable")
+        self.sorted_ids = np.asarray(ids)[self.sorter]
+
+    def __call__(self, ids):
+        ids = np.asarray(ids)
+        position = np.minimum(np.searchsorted(self.sorted_ids, ids), max(len(self.sorted_ids) - 1, 0))
+        if len(self.sorted_ids) == 0:
+            return np.full(len(ids), -1, dtype=np.int64)
+        found = self.sorted_ids[position] == ids
+        return np.where(found, self.sorter[position], -1)
+
+
+def validate_case(case: CaseData):
+    """Check the case arrays and raise one ValueError listing every problem found."""
+    errors = []
+    bus, branch, gen = case.bus, case.branch, case.gen
+
+    for part, data in (("bus", bus), ("branch", branch), ("gen", gen)):
+        for column, values in data.items():
+            if column != "x_sub" and not np.all(np.isfinite(values)):
+                errors.append(f"{np.count_nonzero(~np.isfinite(values))} {part} rows have non-finite {column}")
+
+    ids = bus["id"]
+    unique_ids, counts = np.unique(ids, return_counts=True)
+    if np.any(counts > 1):
+        errors.append(f"duplicate bus ids: {describe(unique_ids[counts > 1])}")
+    if np.any(ids != np.round(ids)):
+        errors.append(f"non-integer bus ids: {describe(ids[ids != np.round(ids)])}")
+    bad_type = ~np.isin(bus["bus_type"], (1, 2, 3, ISOLATED))
+    if np.any(bad_type):
+        errors.append(f"invalid bus types at buses {describe(ids[bad_type])}")
+    if not np.any(bus["bus_type"] == 3):
+        errors.append("no slack bus")
+    if np.any(bus["base_kv"] < 0):
+        errors.append(f"negative base voltage at buses {describe(ids[bus['base_kv'] < 0])}")
+
+    index_of = BusLookup(ids)
+    from_index, to_index = index_of(branch["from_id"]), index_of(branch["to_id"])
+    unknown = (from_index < 0) | (to_index < 0)
+    if np.any(unknown):
+        errors.append(f"{np.count_nonzero(unknown)} branches reference unknown buses "
+                      f"({describe(np.concatenate((branch['from_id'][from_index < 0], branch['to_id'][to_index < 0])))})")
+    loops = branch["from_id"] == branch["to_id"]
+    if np.any(loops):
+        errors.append(f"{np.count_nonzero(loops)} branches start and end at the same bus ({describe(branch['from_id'][loops])})")
+    zero = (branch["r"] == 0) & (branch["x"] == 0) & (branch["in_service"] != 0)
+    if np.any(zero):
+        errors.append(f"{np.count_nonzero(zero)} in-service branches have zero impedance")
+    if np.any(branch["tap"] < 0):
+        errors.append(f"{np.count_nonzero(branch['tap'] < 0)} branches have a negative tap ratio")
+
+    gen_unknown = index_of(gen["bus_id"]) < 0
+    if np.any(gen_unknown):
+        errors.append(f"{np.count_nonzero(gen_unknown)} generators reference unknown buses ({describe(gen['bus_id'][gen_unknown])})")
+
+    if errors:
+        raise ValueError("Invalid case data:\n  " + "\n  ".join(errors))
+
+
+def drop_isolated(case: CaseData):
+    """Remove isolated buses (type 4) and every branch and generator connected to them."""
+    isolated = case.bus["bus_type"] == ISOLATED
+    if not np.any(isolated):
+        return case
+    removed = case.bus["id"][isolated]
+    keep_branch = ~(np.isin(case.branch["from_id"], removed) | np.isin(case.branch["to_id"], removed))
+    keep_gen = ~np.isin(case.gen["bus_id"], removed)
+    logger.warning("Dropping %d isolated buses, %d branches and %d generators connected to them",
+                   len(removed), np.count_nonzero(~keep_branch), np.count_nonzero(~keep_gen))
+
+    case.bus = {column: values[~isolated] for column, values in case.bus.items()}
+    case.branch = {column: values[keep_branch] for column, values in case.branch.items()}
+    case.gen = {column: values[keep_gen] for column, values in case.gen.items()}
+    return case
+
+
+def build_circuit(case: CaseData, name: str = "Imported", frequency: float = 60.0, sub_trans: float = None):
+    """
+    Validate case and bulk-load it into a new Circuit.
+
+    Generators at the same bus are merged into one Generator (MW summed, the first voltage
+    setpoint kept); generators at PQ buses become negative P and Q loads (and so take no part
+    in fault studies). Loads may be at any bus type. Branches with a
+    nonzero tap are added as Transformers, the others as TransmissionLines, both from per-unit
+    data through the Circuit bulk methods (lines first, so the branch order differs from the file).
+
+    :param sub_trans: Subtransient reactance on the machine base for generators without one
+        in the case (MATPOWER and CSV files); None leaves them out of fault studies.
+    """
+    validate_case(case)
+    case = drop_isolated(case)
+    circuit = Circuit(name, Settings(frequency, case.base_power))
+    base_power = case.base_power
+    bus, branch, gen = case.bus, case.branch, case.gen
+
+    n = len(bus["id"])
+    index_of = BusLookup(bus["id"])
+    bus_type = BUS_TYPE_CODES[bus["bus_type"].astype(np.int64)]
+
+    #Generators: in-service units summed per bus
+    in_service = gen["in_service"] != 0
+    gen_index = index_of(gen["bus_id"][in_service])
+    p_gen = np.bincount(gen_index, gen["p_gen"][in_service], n)
+    q_gen = np.bincount(gen_index, gen["q_gen"][in_service], n)
+    gen_buses, first = np.unique(gen_index, return_index=True)
+    v_set = bus["vpu"].copy()
+    v_set[gen_buses] = gen["v_set"][in_service][first]
+    at_pq = bus_type == PQ_BUS
+    p_load = bus["p_load"] - np.where(at_pq, p_gen, 0)
+    q_load = bus["q_load"] - np.where(at_pq, q_gen, 0)
+
+    x_sub = gen["x_sub"][in_service][first]
+    if sub_trans is not None:
+        x_sub = np.where(np.isnan(x_sub), sub_trans, x_sub)
+    m_base = gen["m_base"][in_service][first]
+
+    names = bus["id"].astype(np.int64).astype(str).tolist()
+    circuit.add_buses(names, bus["base_kv"], np.where(bus_type == PQ_BUS, bus["vpu"], v_set),
+                      np.radians(bus["delta"]), bus_type, bus["g_shunt"] / base_power, bus["b_shunt"] / base_power)
+
+    has_load = np.flatnonzero((p_load != 0) | (q_load != 0))
+    circuit.add_loads([f"Load_{names[k]}" for k in has_load.tolist()], p_load[has_load], q_load[has_load], has_load)
+    has_gen = ~at_pq[gen_buses]
+    gen_buses, x_sub, m_base = gen_buses[has_gen], x_sub[has_gen], m_base[has_gen]
+    circuit.add_generators([f"Gen_{names[k]}" for k in gen_buses.tolist()], v_set[gen_buses], p_gen[gen_buses],
+                           gen_buses, x_sub, np.where(m_base > 0, m_base, base_power))
+
+    #Branches with a tap ratio are transformers
+    from_index, to_index = index_of(branch["from_id"]), index_of(branch["to_id"])
+    branch_names = [f"{names[i]}-{names[j]}#{k}" for k, (i, j) in enumerate(zip(from_index.tolist(), to_index.tolist()))]
+    rating = np.where(branch["rating"] > 0, branch["rating"], np.inf)
+    in_service = branch["in_service"] != 0
+    line, transformer = np.flatnonzero(branch["tap"] == 0), np.flatnonzero(branch["tap"] != 0)
+    circuit.add_lines([branch_names[k] for k in line.tolist()], from_index[line], to_index[line], r=branch["r"][line],
+                      x=branch["x"][line], b=branch["b"][line], rating=rating[line], in_service=in_service[line])
+    circuit.add_transformers([branch_names[k] for k in transformer.tolist()], from_index[transformer], to_index[transformer],
+                             rating[transformer], r=branch["r"][transformer], x=branch["x"][transformer],
+                             b=branch["b"][transformer], tap=branch["tap"][transformer],
+                             in_service=in_service[transformer])
+
+    return circuit
+
+
+def import_case(path: str, name: str = None, frequency: float = 60.0, sub_trans: float = None):
+    """
+    Read a MATPOWER .m file, a PSS/E .raw file or a directory of CSV tables into a new Circuit.
+    See build_circuit for the keyword arguments.
+    """
+    if os.path.isdir(path):
+        case = read_csv_case(path)
+    elif path.lower().endswith(".m"):
+        case = read_matpower(path)
+    elif path.lower().endswith(".raw"):
+        case = read_psse_raw(path)
+    else:
+        raise ValueError(f"Unknown case file format: {path}")
+
+    if name is None:
+        name = os.path.splitext(os.path.basename(os.path.normpath(path)))[0]
+    return build_circuit(case, name, frequency, sub_trans)
+
+
+if __name__ == "__main__":
+    import tempfile
+    from Newton_Raphson import Newton_Raphson
+
+    #Regression case: a load at the PV bus 2 and a generator at the PQ bus 4, as in most MATPOWER cases
+    CASE4 = """function mpc = case4
+mpc.version = '2';
+mpc.baseMVA = 100;
+mpc.bus = [
+    1   3   0   0   0   0   1   1.02    0   230 1   1.1 0.9;
+    2   2   50  20  0   0   1   1.01    0   230 1   1.1 0.9;
+    3   1   80  30  0   10  1   1       0   230 1   1.1 0.9;
+    4   1   60  25  0   0   1   1       0   230 1   1.1 0.9;
+];
+mpc.gen = [
+    1   0   0   300 -300    1.02    100 1   250 0;
+    2   80  0   300 -300    1.01    100 1   250 0;
+    4   30  10  0   0       1       100 1   50  0;
+];
+mpc.branch = [
+    1   2   0.01    0.05    0.02    250 250 250 0   0   1   -360    360;
+    1   3   0.01    0.05    0.02    250 250 250 0   0   1   -360    360;
+    2   4   0.01    0.05    0.02    250 250 250 0   0   1   -360    360;
+    3   4   0.01    0.05    0.02    250 250 250 0   0   1   -360    360;
+];
+"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "case4.m")
+        with open(path, "w") as file:
+            file.write(CASE4)
+        circuit = import_case(path)
+
+    solver = Newton_Raphson(circuit, 1e-8, 20)
+    solver.solve()
+    v = circuit.get_voltage_vector()
+    assert solver.converged
+    #Reference solution of the same case solved by the per-element importer
+    assert np.allclose(np.abs(v), [1.02, 1.01, 1.00179008, 1.00103879], atol=1e-7)
+    assert np.allclose(np.angle(v, deg=True), [0.0, -0.25031807, -1.77421426, -1.39897695], atol=1e-6)
+    print(f"{circuit.name}: {len(circuit.buses)} buses, loads {list(circuit.loads)}, generators {list(circuit.generators)}")
+    print(f"  vpu   {np.round(np.abs(v), 6)}")
+    print(f"  angle {np.round(np.angle(v, deg=True), 4)}")
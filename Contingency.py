@@ -0,0 +1,296 @@
+# N-1 / N-2 contingency analysis
+# The base case is shipped once to every worker process, each outage is applied there as a Y-bus delta
+# screen() ranks single outages with DC line outage distribution factors first and solves only the flagged ones
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import combinations
+
+from circuit import Circuit
+from Powerflow import Powerflow
+from Newton_Raphson import Newton_Raphson, solve_arrays
+from DC_Powerflow import get_dc_powerflow
+from Worker_Pool import init_worker, get_worker_case, new_linear_solver
+from Telemetry import logger
+
+import numpy as np
+import pandas as pd
+
+
+def calc_outage_delta(base_case, outage):
+    """Y-bus change (sparse) caused by removing the given branch indices."""
+    outage = np.asarray(outage, dtype=np.int64)
+    return Circuit.stamp_branches(base_case["ybus"].shape[0], base_case["branch_from"][outage],
+                                  base_case["branch_to"][outage], -base_case["branch_yprim"][outage])
+
+
+def solve_outage(base_case, outage):
+    """Solve one contingency on the base-case arrays and summarize the result."""
+    ybus = base_case["ybus"] + calc_outage_delta(base_case, outage)
+
+    result = {"outage": [base_case["branch_names"][k] for k in outage], "converged": False,
+              "iterations": 0, "v_min": np.nan, "v_max": np.nan, "overloads": {}}
+    try:
+        v, converged, iterations = solve_arrays(ybus, base_case["v"], base_case["p_spec"], base_case["q_spec"],
+                                                base_case["pvpq"], base_case["pq"], base_case["tol"],
+                                                base_case["max_iter"], base_case.get("linear_solver"))
+    except RuntimeError:
+        #Singular Jacobian, e.g. the outage islands part of the network
+        return result
+
+    result["converged"] = converged
+    result["iterations"] = iterations
+    if not converged:
+        return result
+
+    vpu = np.abs(v)
+    result["v_min"] = float(vpu.min())
+    result["v_max"] = float(vpu.max())
+
+    #Loading of the branches still in service
+    in_service = np.ones(len(base_case["branch_names"]), dtype=bool)
+    in_service[list(outage)] = False
+    s_from, s_to = Circuit.calc_branch_flows(base_case["branch_from"], base_case["branch_to"],
+                                             base_case["branch_yprim"], v)
+    loading = np.maximum(np.abs(s_from), np.abs(s_to)) * base_case["base_power"] / base_case["ratings"]
+    overloaded = np.flatnonzero(in_service & (loading > base_case["overload_limit"]))
+    result["overloads"] = {base_case["branch_names"][k]: float(loading[k]) for k in overloaded}
+
+    return result
+
+
+def run_worker(outage):
+    return solve_outage(get_worker_case(), outage)
+
+
+class Contingency_Analysis:
+    def __init__(self, circuit: Circuit, tol: float = 0.001, max_iter: int = 20, max_workers: int = None,
+                 overload_limit: float = 1.0):
+        """
+        :param overload_limit: Branch loading (fraction of rating) above which a branch is reported overloaded.
+        :param max_workers: Size of the process pool, defaults to the number of CPUs.
+        """
+        self.circuit = circuit
+        self.max_workers = max_workers
+        self.circuit.calc_y_admit()
+        #Outages warm-start from the voltages already in the circuit (its base case solution), left as they are
+        powerflow = Powerflow(circuit, "previous")
+
+        #Everything a worker needs, shipped once per worker process
+        self.base_case = {
+            "ybus": self.circuit.ybus,
+            "v": self.circuit.get_voltage_vector(),
+            "p_spec": powerflow.p_spec,
+            "q_spec": powerflow.q_spec,
+            "pvpq": self.circuit.pvpq_indices,
+            "pq": self.circuit.pq_indices,
+            "jacobian_ordering": self.circuit.get_ordering(self.circuit.pvpq_indices, self.circuit.pq_indices),
+            "ordering_method": self.circuit.ordering_method,
+            "branch_names": list(self.circuit.branch_names),
+            "branch_from": self.circuit.branch_from,
+            "branch_to": self.circuit.branch_to,
+            "branch_yprim": self.circuit.branch_yprim,
+            "ratings": self.circuit.get_branch_ratings(),
+            "base_power": self.circuit.settings.base_power,
+            "overload_limit": overload_limit,
+            "tol": tol,
+            "max_iter": max_iter,
+        }
+
+    def n_minus_1(self):
+        """Every single-branch outage."""
+        return [(k,) for k in range(len(self.circuit.branch_names))]
+
+    def n_minus_2(self, branch_names=None):
+        """Every pair of outages among the given branches (all branches by default)."""
+        if branch_names is None:
+            branch_names = self.circuit.branch_names
+        return list(combinations(self.branch_indices(branch_names), 2))
+
+    def branch_indices(self, branch_names):
+        lookup = {name: k for k, name in enumerate(self.circuit.branch_names)}
+        return [lookup[name] for name in branch_names]
+
+    def run(self, contingencies=None):
+        """
+        Solve the contingencies on a process pool and yield each result as it completes.
+
+        :param contingencies: List of outages, each a tuple of branch indices or branch names.
+                              Defaults to N-1 over every transformer and line.
+        """
+        if contingencies is None:
+            contingencies = self.n_minus_1()
+        contingencies = [tuple(self.branch_indices(c)) if isinstance(c[0], str) else tuple(c) for c in contingencies]
+
+        with ProcessPoolExecutor(max_workers=self.max_workers, initializer=init_worker,
+                                 initargs=(self.base_case,)) as pool:
+            futures = [pool.submit(run_worker, outage) for outage in contingencies]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def run_serial(self, contingencies=None):
+        """Same as run, in the calling process. Useful for small cases and debugging."""
+        if contingencies is None:
+            contingencies = self.n_minus_1()
+        contingencies = [tuple(self.branch_indices(c)) if isinstance(c[0], str) else tuple(c) for c in contingencies]
+
+        base_case = dict(self.base_case, linear_solver=new_linear_solver(self.base_case))
+        for outage in contingencies:
+            yield solve_outage(base_case, outage)
+
+    def screen(self, outages=None, guard_band: float = 0.25, min_change: float = 0.01, top: int = 0,
+               pi_exponent: int = 2, parallel: bool = True, verify: bool = False):
+        """
+        Two-stage N-1 screening. Every single outage is ranked by its estimated post-outage loadings
+        (LODF applied to the AC base case real power flows, with the base case reactive flows kept),
+        then only the flagged outages get a full AC solve warm-started from the base case. The base
+        case is solved from the voltages already in the circuit, so a solved circuit needs no iterations.
+
+        The estimated loading of a branch is its AC base case loading plus the change the outage causes,
+        widened by the guard band: base + change + guard_band * |change|. An outage is flagged if it
+        raises the loading of a branch by more than min_change to above overload_limit * (1 - guard_band),
+        if it islands part of the network, or if it is among the top highest performance indices
+        PI = sum((loading / overload_limit) ** (2 * pi_exponent)). Branches overloaded in the base
+        case are left out and listed in screening_stats["base_overloads"].
+
+        :param outages: Branch names or indices, one outage each. Defaults to every branch.
+        :param guard_band: Margin for the error of the DC sensitivities, both relative to the estimated
+            loading changes and to overload_limit; larger values solve more outages in AC.
+        :param min_change: Loading increase (fraction of the rating) below which a branch is taken as
+            unaffected by the outage, so branches close to the limit in the base case do not flag every outage.
+        :param parallel: Solve the flagged outages on the process pool (run), else in this process.
+        :param verify: Also solve the pruned outages and count those the screening missed (new overloads
+            or no convergence), to tune guard_band.
+        :return: AC results of the flagged outages, as returned by run. The ranking is kept in
+            self.screening (a DataFrame) and the counts and timings in self.screening_stats.
+        """
+        if outages is None:
+            outages = list(range(len(self.circuit.branch_names)))
+        outages = np.array([self.branch_indices([k])[0] if isinstance(k, str) else int(k) for k in outages],
+                           dtype=np.int64)
+        limit = self.base_case["overload_limit"]
+
+        start = time.perf_counter()
+        #AC base case, the starting point of every outage solve and the flows the sensitivities act on
+        base = Newton_Raphson(self.circuit, self.base_case["tol"], self.base_case["max_iter"], start="previous")
+        base.solve()
+        if not base.converged:
+            raise RuntimeError("The base case power flow did not converge")
+        self.base_case["v"] = self.circuit.get_voltage_vector()
+        s_from, s_to = Circuit.calc_branch_flows(self.base_case["branch_from"], self.base_case["branch_to"],
+                                                 self.base_case["branch_yprim"], self.base_case["v"])
+        p_base = s_from.real * self.base_case["base_power"]
+        q_base = s_from.imag * self.base_case["base_power"]
+        ratings = self.base_case["ratings"]
+
+        #The estimates are AC base case loadings plus the change the outage causes, the change from
+        #the same real power estimate as the outage. Branches already overloaded are reported once
+        base_loading = np.maximum(np.abs(s_from), np.abs(s_to)) * self.base_case["base_power"] / ratings
+        base_estimate = np.abs(s_from) * self.base_case["base_power"] / ratings
+        base_overloads = np.flatnonzero(base_loading > limit)
+
+        #Stage 1: estimated loadings, one block of outages at a time so the LODF never has to be held whole
+        dc_powerflow = get_dc_powerflow(self.circuit)
+        max_loading = np.zeros(len(outages))
+        worst_branch = np.zeros(len(outages), dtype=np.int64)
+        performance_index = np.zeros(len(outages))
+        islanding = np.zeros(len(outages), dtype=bool)
+        for block_start in range(0, len(outages), dc_powerflow.block_size):
+            block = outages[block_start:block_start + dc_powerflow.block_size]
+            lodf = dc_powerflow.calc_lodf(None, block, cache=False)
+            p_post = p_base[:, None] + lodf * p_base[block][None, :]
+            change = np.sqrt(p_post**2 + q_base[:, None]**2) / ratings[:, None] - base_estimate[:, None]
+            loading = base_loading[:, None] + change + guard_band * np.abs(change)
+            loading[block, np.arange(len(block))] = 0.0
+            loading[base_overloads] = 0.0
+
+            columns = slice(block_start, block_start + len(block))
+            islanding[columns] = np.isnan(lodf).any(axis=0)
+            loading = np.nan_to_num(loading, nan=0.0)
+            raised = np.where(change > min_change, loading, 0.0)
+            worst_branch[columns] = np.argmax(raised, axis=0)
+            max_loading[columns] = raised.max(axis=0, initial=0)
+            performance_index[columns] = ((loading / limit)**(2 * pi_exponent)).sum(axis=0)
+
+        rank = np.empty(len(outages), dtype=np.int64)
+        rank[np.argsort(-performance_index, kind="stable")] = np.arange(len(outages))
+        flagged = (max_loading > limit * (1 - guard_band)) | islanding | (rank < top)
+        screen_time = time.perf_counter() - start
+
+        branch_names = self.base_case["branch_names"]
+        self.screening = pd.DataFrame({
+            "performance_index": performance_index,
+            "rank": rank,
+            "max_loading": max_loading,
+            "worst_branch": [branch_names[k] for k in worst_branch],
+            "islanding": islanding,
+            "flagged": flagged,
+        }, index=pd.Index([branch_names[k] for k in outages], name="outage")).sort_values("rank")
+
+        #Stage 2: full AC solves of the flagged outages only
+        start = time.perf_counter()
+        solve = self.run if parallel else self.run_serial
+        results = list(solve([(k,) for k in outages[flagged]]))
+        ac_time = time.perf_counter() - start
+
+        num_flagged = int(flagged.sum())
+        time_per_case = ac_time / num_flagged if num_flagged else 0.0
+        self.screening_stats = {
+            "outages": len(outages),
+            "flagged": num_flagged,
+            "pruned": len(outages) - num_flagged,
+            "screen_time": screen_time,
+            "ac_time": ac_time,
+            "time_saved": (len(outages) - num_flagged) * time_per_case - screen_time,
+            "base_overloads": [branch_names[k] for k in base_overloads],
+            "base_iterations": base.iterations,
+            "ac_iterations": float(np.mean([result["iterations"] for result in results])) if results else 0.0,
+        }
+
+        if verify:
+            pruned = list(solve([(k,) for k in outages[~flagged]]))
+            base_names = set(self.screening_stats["base_overloads"])
+            missed = [result["outage"][0] for result in pruned
+                      if not result["converged"] or set(result["overloads"]) - base_names]
+            self.screening_stats["missed"] = len(missed)
+            if missed:
+                logger.warning("Screening missed %d outages with overloads, widen guard_band: %s",
+                               len(missed), ", ".join(missed[:5]))
+
+        logger.info("Contingency screening: %d of %d outages solved in AC, %d pruned",
+                    num_flagged, len(outages), len(outages) - num_flagged)
+        return results
+
+    def screening_summary(self):
+        """Return a short text report of the last screen."""
+        stats = self.screening_stats
+        lines = [f"Contingency screening: {stats['flagged']} of {stats['outages']} outages solved in AC, "
+                 f"{stats['pruned']} pruned",
+                 f"  screening     {stats['screen_time'] * 1000:10.3f} ms",
+                 f"  AC solves     {stats['ac_time'] * 1000:10.3f} ms, "
+                 f"{stats['ac_iterations']:.2f} iterations each from the base case ({stats['base_iterations']} iterations)",
+                 f"  time saved    {stats['time_saved'] * 1000:10.3f} ms (estimated)"]
+        if stats["base_overloads"]:
+            lines.append(f"  base case overloads: {', '.join(stats['base_overloads'])}")
+        if "missed" in stats:
+            lines.append(f"  missed overloads: {stats['missed']}")
+        return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    from Grid_Generator import generate_grid
+
+    circuit = generate_grid(300)
+    analysis = Contingency_Analysis(circuit, 1e-6, 20, overload_limit=0.5)
+    start = time.perf_counter()
+    all_results = list(analysis.run_serial())
+    full_time = time.perf_counter() - start
+
+    results = analysis.screen(parallel=False)
+    print(analysis.screening_summary())
+    print(analysis.screening.head())
+
+    #Outages that overload a branch which is within its limit in the base case
+    base_overloads = set(analysis.screening_stats["base_overloads"])
+    overloaded = sum(1 for result in all_results if set(result["overloads"]) - base_overloads)
+    found = sum(1 for result in results if set(result["overloads"]) - base_overloads)
+    print(f"Full AC N-1: {full_time:.2f} s, {overloaded} outages with new overloads; screening found {found}")
@@ -0,0 +1,270 @@
+# Continuation power flow: traces the PV (nose) curve of a loading direction and finds the maximum loadability
+# Predictor-corrector with a pseudo-arclength parameter, so the augmented Jacobian stays nonsingular at the nose
+from Powerflow import calc_injections
+from circuit import Circuit
+from Jacobian import build_jacobian
+from Newton_Raphson import Newton_Raphson
+from LinearSolver import get_linear_solver
+from Telemetry import SolverStats, logger
+
+import numpy as np
+import scipy.sparse as sp
+
+
+class Continuation_Powerflow:
+    def __init__(self, circuit: Circuit, tol: float = 1e-6, max_iter: int = 10, step: float = 0.1,
+                 min_step: float = 1e-4, max_step: float = 1.0, nose_step: float = 1e-3, max_steps: int = 200,
+                 stop_fraction: float = 0.5,
+                 load_direction=None, gen_direction=None, linear_solver: str = "superlu", callbacks=None,
+                 start: str = "flat"):
+        """
+        Loads and generation grow as s_spec(lambda) = s_spec(0) + lambda * direction.
+
+        :param step: First arclength step, adapted to the number of corrector iterations
+            between min_step and max_step. Steps are in the RMS change of the angles, voltages and lambda.
+        :param nose_step: Steps that pass the nose are retried shorter, down to nose_step, so the
+            points around the maximum loadability are close together.
+        :param stop_fraction: Stop once lambda has fallen below stop_fraction * lambda_max past the nose.
+        :param load_direction: Complex MVA load increase per bus per unit lambda, the base case loads
+            by default (every load grows in proportion).
+        :param gen_direction: MW generation increase per bus per unit lambda. By default the PV
+            generators pick up the load increase in proportion to their setpoints (the slack its share
+            and the losses).
+        :param start: Start mode of the base case solve, see Powerflow.initialize.
+        """
+        self.circuit = circuit
+        self.tol = tol
+        self.max_iter = max_iter
+        self.step = step
+        self.min_step = min_step
+        self.max_step = max_step
+        self.nose_step = nose_step
+        self.max_steps = max_steps
+        self.stop_fraction = stop_fraction
+        self.linear_solver_name = linear_solver
+        self.start = start
+        self.stats = SolverStats("Continuation power flow", callbacks)
+
+        bus_table = circuit.bus_table
+        if load_direction is None:
+            load_direction = bus_table["p_load"] + 1j * bus_table["q_load"]
+        if gen_direction is None:
+            total_gen = bus_table["p_gen"].sum()
+            gen_direction = bus_table["p_gen"] * (np.real(load_direction).sum() / total_gen) if total_gen > 0 else 0.0
+        self.load_direction = np.broadcast_to(np.asarray(load_direction, dtype=complex), (len(bus_table),))
+        self.gen_direction = np.broadcast_to(np.asarray(gen_direction, dtype=float), (len(bus_table),))
+
+        self.lambdas = None  #Loading parameter of every point on the curve
+        self.voltages = None  #Bus voltage magnitudes of every point (points x buses)
+        self.max_loadability = None  #lambda at the nose
+        self.max_load_mw = None  #Total load at the nose
+        self.critical_bus = None  #Bus whose voltage falls fastest at the nose
+        self.converged = False
+
+    def solve(self):
+        """
+        Trace the PV curve from the base case past the nose point.
+
+        The circuit is left at the base case solution; the curve is in lambdas and voltages.
+        """
+        circuit = self.circuit
+        self.stats.reset()
+
+        #Base case, also computes the Y-bus and the bus index arrays
+        base = Newton_Raphson(circuit, self.tol, self.max_iter * 2, self.linear_solver_name, start=self.start)
+        base.solve()
+        if not base.converged:
+            raise RuntimeError("The base case power flow did not converge")
+        self.stats.timers.update(base.stats.timers)
+        v_base = circuit.get_voltage_vector()
+
+        ybus = circuit.ybus
+        pvpq, pq = circuit.pvpq_indices, circuit.pq_indices
+        num_angles, num_x = len(pvpq), len(pvpq) + len(pq)
+        base_power = circuit.settings.base_power
+
+        p_spec, q_spec = base.powerflow.p_spec, base.powerflow.q_spec
+        d = np.concatenate((((self.gen_direction - self.load_direction.real) / base_power)[pvpq],
+                            (-self.load_direction.imag / base_power)[pq]))
+        if not np.any(d):
+            raise ValueError("The loading direction is zero")
+        spec = np.concatenate((p_spec[pvpq], q_spec[pq]))
+
+        #Bordered system [[J, -d], [t^T]]: the border goes last in the fill-reducing ordering
+        linear_solver = get_linear_solver(circuit, "continuation", self.linear_solver_name)
+        ordering = circuit.get_ordering(pvpq, pq)
+        linear_solver.set_ordering(None if ordering is None else np.append(ordering, num_x), circuit.ordering_method)
+
+        vpu, delta = np.abs(v_base), np.angle(v_base)
+
+        def get_x(vpu, delta, lam):
+            return np.concatenate((delta[pvpq], vpu[pq], [lam]))
+
+        def set_x(x):
+            delta[pvpq] = x[:num_angles]
+            vpu[pq] = x[num_angles:num_x]
+            return vpu * np.exp(1j * delta)
+
+        def factor_augmented(v, tangent):
+            with self.stats.timer("jacobian"):
+                jacobian = build_jacobian(ybus, v, pvpq, pq)
+                augmented = sp.bmat([[jacobian, sp.csc_matrix(-d.reshape(-1, 1))],
+                                     [sp.csr_matrix(tangent[:num_x].reshape(1, -1)), [[tangent[-1]]]]], format="csc")
+            with self.stats.timer("factorization"):
+                linear_solver.factor(augmented)
+
+        def calc_tangent():
+            """Tangent of the curve at the last factorized point, scaled to unit RMS change per variable."""
+            rhs = np.zeros(num_x + 1)
+            rhs[-1] = 1.0
+            with self.stats.timer("solve"):
+                tangent = linear_solver.solve(rhs)
+            return tangent / np.sqrt(tangent[:num_x] @ tangent[:num_x] / num_x + tangent[-1]**2)
+
+        #Initial tangent: along increasing lambda
+        x = get_x(vpu, delta, 0.0)
+        e_lambda = np.zeros(num_x + 1)
+        e_lambda[-1] = 1.0
+        factor_augmented(v_base, e_lambda)
+        tangent = calc_tangent()
+
+        lambdas, voltages = [0.0], [vpu.copy()]
+        step = self.step
+        steps = 0
+        lambda_max = 0.0
+        past_nose = False
+
+        while steps < self.max_steps:
+            #Predictor along the tangent, then a corrector on the power flow plus the arclength condition
+            #warm-started from the prediction. The corrector keeps the factorization of the tangent
+            #solve and only refactors when the mismatch stops falling quickly
+            x_predicted = x + step * tangent
+            x_new = x_predicted.copy()
+            v = set_x(x_new)
+            converged = False
+            last_mismatch = np.inf
+            refactored = refactored_any = False
+            for iteration in range(self.max_iter + 1):
+                with self.stats.timer("injections"):
+                    s_injected = calc_injections(ybus, v)
+                    mismatch = np.concatenate((s_injected.real[pvpq], s_injected.imag[pq])) - spec - x_new[-1] * d
+                    residual = np.append(mismatch, tangent @ (x_new - x_predicted))
+                max_mismatch = np.max(np.abs(residual), initial=0)
+                if max_mismatch < self.tol:
+                    converged = True
+                    break
+                if iteration == self.max_iter or not np.isfinite(max_mismatch) or \
+                        (refactored and max_mismatch > last_mismatch):
+                    break
+                refactored = max_mismatch > 0.1 * last_mismatch
+                if refactored:
+                    factor_augmented(v, tangent)
+                    refactored_any = True
+                last_mismatch = max_mismatch
+                with self.stats.timer("solve"):
+                    x_new -= linear_solver.solve(residual)
+                v = set_x(x_new)
+
+            if not converged:
+                #Diverging or too slow: back off and retry from the last point on the curve
+                set_x(x)
+                step /= 2
+                if step < self.min_step:
+                    logger.warning("Continuation step fell below %g at lambda %.4f", self.min_step, x[-1])
+                    break
+                continue
+
+            #Tangent at the new point from its Jacobian bordered by the current tangent. The corrector's
+            #last factorization is close enough when it refactored, otherwise it is still the old point's
+            previous_tangent = tangent
+            if not refactored_any:
+                factor_augmented(v, previous_tangent)
+            tangent = calc_tangent()
+            if tangent @ previous_tangent < 0:
+                tangent = -tangent
+
+            if not past_nose and tangent[-1] < 0 and step > self.nose_step:
+                #The step went over the nose: retry shorter until the nose is located within nose_step
+                set_x(x)
+                tangent = previous_tangent
+                step = max(step / 4, self.nose_step)
+                continue
+
+            steps += 1
+            self.stats.record_iteration(steps, max_mismatch)
+            x = x_new
+            lambdas.append(x[-1])
+            voltages.append(vpu.copy())
+
+            lambda_max = max(lambda_max, x[-1])
+            past_nose = past_nose or tangent[-1] < 0
+            if past_nose and x[-1] < self.stop_fraction * lambda_max:
+                self.converged = True
+                break
+
+            #Longer steps while the corrector converges quickly, shorter when it struggles
+            if iteration <= 3:
+                step = min(step * 2, self.max_step)
+            elif iteration >= 6:
+                step = max(step / 2, self.min_step)
+
+        self.converged = self.converged or past_nose
+        self.lambdas = np.array(lambdas)
+        self.voltages = np.array(voltages)
+        self.calc_nose()
+        self.stats.finish(steps, self.converged)
+
+        circuit.set_voltages(np.abs(v_base), np.angle(v_base))
+        return self.stats
+
+    def calc_nose(self):
+        """
+        Maximum loadability from the points around the highest lambda. Close to the nose lambda is a
+        parabola in the voltage of the critical bus, the bus whose voltage dropped the most.
+        """
+        k = int(np.argmax(self.lambdas))
+        critical = int(np.argmax(self.voltages[0] - self.voltages[k]))
+        self.critical_bus = self.circuit.bus_table.names[critical]
+
+        self.max_loadability = float(self.lambdas[k])
+        if 0 < k < len(self.lambdas) - 1:
+            a, b, c = np.polyfit(self.voltages[k - 1:k + 2, critical], self.lambdas[k - 1:k + 2], 2)
+            if a < 0:
+                self.max_loadability = max(self.max_loadability, float(c - b**2 / (4 * a)))
+
+        self.max_load_mw = float(self.circuit.bus_table["p_load"].sum()
+                                 + self.max_loadability * self.load_direction.real.sum())
+
+    def summary(self):
+        return (f"{self.stats.summary()}\n"
+                f"  maximum loadability: lambda = {self.max_loadability:.4f} "
+                f"({self.max_load_mw:.1f} MW total load), critical bus {self.critical_bus}")
+
+
+if __name__ == "__main__":
+    import time
+    from Grid_Generator import generate_grid
+
+    circuit = generate_grid(2000)
+    start = time.perf_counter()
+    cpf = Continuation_Powerflow(circuit)
+    cpf.solve()
+    cpf_time = time.perf_counter() - start
+    print(cpf.summary())
+
+    #Brute force: flat start Newton-Raphson at load levels 0.05 apart until it stops converging
+    bus_table = circuit.bus_table
+    p_load, q_load, p_gen = bus_table["p_load"].copy(), bus_table["q_load"].copy(), bus_table["p_gen"].copy()
+    start = time.perf_counter()
+    lam = 0.0
+    while True:
+        bus_table["p_load"][:] = p_load + lam * cpf.load_direction.real
+        bus_table["q_load"][:] = q_load + lam * cpf.load_direction.imag
+        bus_table["p_gen"][:] = p_gen + lam * cpf.gen_direction
+        solver = Newton_Raphson(circuit, 1e-6, 20)
+        solver.solve()
+        if not solver.converged:
+            break
+        lam += 0.05
+    print(f"Continuation power flow: lambda max {cpf.max_loadability:.6f} in {cpf_time:.2f} s")
+    print(f"Newton-Raphson scan: lambda max between {lam - 0.05:.2f} and {lam:.2f} in {time.perf_counter() - start:.2f} s")
@@ -0,0 +1,216 @@
+# DC power flow with cached Power Transfer and Line Outage Distribution Factors (PTDF, LODF)
+# The reduced B matrix is factorized once per topology; flows for any injection pattern, transfer
+# or single outage are then matrix-vector products with the cached factors
+from circuit import Circuit
+from LinearSolver import get_linear_solver
+from NetworkTables import describe
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+
+def get_dc_powerflow(circuit: Circuit):
+    """Return the DC power flow cached on the circuit, rebuilding it if the topology changed."""
+    dc_powerflow = circuit.dc_powerflow
+    if dc_powerflow is None or dc_powerflow.version != circuit.topology_version:
+        dc_powerflow = DC_Powerflow(circuit)
+        circuit.dc_powerflow = dc_powerflow
+    return dc_powerflow
+
+
+class DC_Powerflow:
+    """
+    Lossless power flow with 1 pu voltages and branch susceptances 1/x (taps ignored, out-of-service
+    branches left out); the slack buses are the angle reference and absorb the balance. Flows are
+    in MW from the from bus to the to bus of every branch, in the order of circuit.branch_names.
+    """
+
+    def __init__(self, circuit: Circuit, block_size: int = 256):
+        """:param block_size: Number of right-hand sides solved at once when building PTDF and LODF."""
+        self.circuit = circuit
+        self.block_size = block_size
+        b_matrix = circuit.calc_b_matrix()
+        self.version = circuit.topology_version
+        self.n = b_matrix.shape[0]
+        self.pvpq = circuit.pvpq_indices
+        self.branch_from = circuit.branch_from
+        self.branch_to = circuit.branch_to
+        self.b_series = circuit.branch_in_service / circuit.get_branch_impedances().imag
+        self.base_power = circuit.settings.base_power
+
+        #Slack angles are 0, so only the non-slack block is factorized
+        self.linear_solver = get_linear_solver(circuit, "dc_b_prime", blocks=(self.pvpq,))
+        if len(self.pvpq) > 0:
+            self.linear_solver.factor(b_matrix[self.pvpq][:, self.pvpq])
+
+        self.ptdf_cache = {}
+        self.lodf_cache = {}
+        self.angles = None
+        self.flows = None
+
+    def get_branch_rows(self, branches):
+        """Branch rows of an array of branch names or rows, all branches for None."""
+        if branches is None:
+            return np.arange(len(self.b_series))
+        branches = np.atleast_1d(np.asarray(branches))
+        if branches.dtype.kind in "iu":
+            rows = branches.astype(np.int64)
+            unknown = branches[(rows < 0) | (rows >= len(self.b_series))]
+        else:
+            lookup = {name: k for k, name in enumerate(self.circuit.branch_names)}
+            rows = np.array([lookup.get(name, -1) for name in branches.tolist()], dtype=np.int64)
+            unknown = branches[rows < 0]
+        if len(unknown):
+            raise ValueError(f"Unknown branches: {describe(unknown)}")
+        return rows
+
+    def calc_angles(self, p_injection):
+        """
+        Bus angles in radians for per-unit injections at every bus, a vector (n) or one column per
+        injection pattern (n x k). The slack entries are ignored.
+        """
+        p_injection = np.asarray(p_injection, dtype=np.float64)
+        angles = np.zeros(p_injection.shape)
+        if len(self.pvpq) > 0:
+            angles[self.pvpq] = self.linear_solver.solve(p_injection[self.pvpq])
+        return angles
+
+    def calc_flows(self, angles, rows=None):
+        """Per-unit flows of the given branch rows (all by default) for bus angles (n or n x k)."""
+        rows = self.get_branch_rows(rows)
+        b_series = self.b_series[rows].reshape((-1,) + (1,) * (np.ndim(angles) - 1))
+        return b_series * (angles[self.branch_from[rows]] - angles[self.branch_to[rows]])
+
+    def solve(self, p_injection=None):
+        """
+        DC power flow for MW injections at every bus (n, or n x k for k patterns at once), by default
+        the generator setpoints minus the loads of the circuit. Return the branch flows in MW.
+        """
+        if p_injection is None:
+            bus_table = self.circuit.bus_table
+            p_injection = bus_table["p_gen"] - bus_table["p_load"]
+        p_injection = np.asarray(p_injection, dtype=np.float64)
+        if p_injection.shape[0] != self.n:
+            raise ValueError(f"Expected {self.n} bus injections, got {p_injection.shape[0]}")
+
+        self.angles = self.calc_angles(p_injection / self.base_power)
+        self.flows = self.calc_flows(self.angles) * self.base_power
+        return self.flows
+
+    def calc_ptdf(self, branches=None):
+        """
+        PTDF of the given branches (all by default): a branches x buses array of the flow change
+        per MW injected at each bus and withdrawn at the slack. Cached per branch selection.
+        """
+        rows = self.get_branch_rows(branches)
+        key = None if branches is None else tuple(rows.tolist())
+        if key in self.ptdf_cache:
+            return self.ptdf_cache[key]
+
+        #B is symmetric, so PTDF^T = B^-1 A^T diag(b): one solve per monitored branch, in blocks
+        ptdf = np.zeros((len(rows), self.n))
+        for start in range(0, len(rows), self.block_size):
+            block = rows[start:start + self.block_size]
+            columns = np.arange(len(block))
+            rhs = sp.csr_matrix((np.concatenate((self.b_series[block], -self.b_series[block])),
+                                 (np.concatenate((self.branch_from[block], self.branch_to[block])),
+                                  np.concatenate((columns, columns)))), shape=(self.n, len(block))).toarray()
+            ptdf[start:start + len(block)] = self.calc_angles(rhs).T
+        self.ptdf_cache[key] = ptdf
+        return ptdf
+
+    def calc_lodf(self, branches=None, outages=None, cache: bool = True):
+        """
+        LODF of the given monitored branches and outaged branches (all by default): a branches x outages
+        array of the flow change on each monitored branch per MW that flowed on the outaged branch.
+        Outages that island part of the network have NaN columns. Cached per selection unless cache
+        is False, e.g. when all outages are processed block by block.
+        """
+        rows = self.get_branch_rows(branches)
+        outage_rows = self.get_branch_rows(outages)
+        key = (None if branches is None else tuple(rows.tolist()),
+               None if outages is None else tuple(outage_rows.tolist()))
+        if key in self.lodf_cache:
+            return self.lodf_cache[key]
+
+        lodf = np.zeros((len(rows), len(outage_rows)))
+        for start in range(0, len(outage_rows), self.block_size):
+            block = outage_rows[start:start + self.block_size]
+            columns = np.arange(len(block))
+
+            #Flows for a 1 pu transfer between the ends of every outaged branch
+            transfer = sp.csr_matrix((np.concatenate((np.ones(len(block)), -np.ones(len(block)))),
+                                      (np.concatenate((self.branch_from[block], self.branch_to[block])),
+                                       np.concatenate((columns, columns)))), shape=(self.n, len(block))).toarray()
+            angles = self.calc_angles(transfer)
+            flows = self.calc_flows(angles, rows)
+            own_flow = self.b_series[block] * (angles[self.branch_from[block], columns]
+                                               - angles[self.branch_to[block], columns])
+
+            #The outaged branch carried own_flow of the transfer, the rest went through the network
+            with np.errstate(divide="ignore", invalid="ignore"):
+                factors = flows / (1 - own_flow)
+            factors[:, np.abs(1 - own_flow) < 1e-9] = np.nan
+            lodf[:, start:start + len(block)] = factors
+
+        #A monitored branch that is itself the outage loses all of its flow
+        same = (rows[:, None] == outage_rows[None, :]) & ~np.isnan(lodf)
+        lodf[same] = -1.0
+        if cache:
+            self.lodf_cache[key] = lodf
+        return lodf
+
+    def calc_transfer_flows(self, source, sink, mw=1.0, branches=None):
+        """
+        Flow change in MW on the given branches (all by default) for transfers of mw from the source to the
+        sink buses (names or rows, one transfer per entry): a branches x transfers array.
+        """
+        source = self.circuit.get_bus_indices(np.atleast_1d(np.asarray(source, dtype=object)))
+        sink = self.circuit.get_bus_indices(np.atleast_1d(np.asarray(sink, dtype=object)))
+        if np.any(source < 0) or np.any(sink < 0):
+            raise ValueError("Unknown transfer buses")
+        ptdf = self.calc_ptdf(branches)
+        return (ptdf[:, source] - ptdf[:, sink]) * np.asarray(mw, dtype=np.float64)
+
+    def calc_outage_flows(self, branches=None, outages=None, flows=None):
+        """
+        Flows in MW on the given branches after each single outage (branches x outages), from the
+        base case flows (the last solve by default) and the LODF.
+        """
+        if flows is None:
+            flows = self.flows if self.flows is not None else self.solve()
+        rows = self.get_branch_rows(branches)
+        outage_rows = self.get_branch_rows(outages)
+        return flows[rows][:, None] + self.calc_lodf(branches, outages) * flows[outage_rows][None, :]
+
+    def flows_dataframe(self):
+        """Branch flows of the last solve in MW, indexed by branch name."""
+        if self.flows is None:
+            self.solve()
+        return pd.DataFrame({"from_bus": [self.circuit.bus_table.names[k] for k in self.branch_from],
+                             "to_bus": [self.circuit.bus_table.names[k] for k in self.branch_to],
+                             "p_flow": self.flows}, index=pd.Index(self.circuit.branch_names, name="branch"))
+
+
+if __name__ == "__main__":
+    import time
+    from Grid_Generator import generate_grid
+    from Newton_Raphson import Newton_Raphson
+
+    circuit = generate_grid(2000)
+    start = time.perf_counter()
+    dc_powerflow = get_dc_powerflow(circuit)
+    flows = dc_powerflow.solve()
+    print(f"DC power flow: {time.perf_counter() - start:.3f} s")
+
+    #LODF of the 500 kV and 230 kV lines for every single outage among them
+    lines = [name for name in circuit.branch_names if name.startswith(("L500", "L230"))]
+    start = time.perf_counter()
+    outage_flows = dc_powerflow.calc_outage_flows(lines, lines)
+    print(f"{len(lines)} x {len(lines)} outage flows: {time.perf_counter() - start:.3f} s")
+
+    for mode in ("flat", "dc"):
+        solver = Newton_Raphson(circuit, 1e-6, 20, start=mode)
+        solver.solve()
+        print(f"Newton-Raphson from a {mode} start: {solver.stats.iterations} iterations")
@@ -0,0 +1,96 @@
+# Fast decoupled load flow (XB variant)
+# B' and B'' are built and factorized once, each half-iteration is a pair of triangular solves
+from Powerflow import Powerflow, calc_injections
+from circuit import Circuit
+from LinearSolver import get_linear_solver
+from Telemetry import SolverStats
+
+import numpy as np
+
+
+class Fast_Decoupled:
+    def __init__(self, circuit: Circuit, tol: float = 0.001, max_iter: int = 50, linear_solver: str = "superlu",
+                 callbacks=None, start: str = "flat", v0=None):
+        """:param start: Start mode ("flat", "previous", "vector" with v0, or "dc"), see Powerflow.initialize."""
+        self.circuit = circuit
+        self.tol = tol
+        self.max_iter = max_iter
+        self.buses = circuit.buses
+        self.stats = SolverStats("Fast decoupled", callbacks)
+        with self.stats.timer("ybus"):
+            self.circuit.calc_y_admit()
+        self.powerflow = Powerflow(circuit, start, v0)
+
+        self.pvpq = self.circuit.pvpq_indices
+        self.pq = self.circuit.pq_indices
+
+        self.iterations = 0
+        self.converged = False
+
+        #Build and factorize B' and B'' once
+        with self.stats.timer("factorization"):
+            b_prime, b_double_prime = self.calc_B_matrices()
+            self.b_prime_solver = get_linear_solver(circuit, "fdlf_b_prime", linear_solver, (self.pvpq,))
+            self.b_prime_solver.factor(b_prime)
+            self.b_double_prime_solver = get_linear_solver(circuit, "fdlf_b_double_prime", linear_solver, (self.pq,))
+            self.b_double_prime_solver.factor(b_double_prime)
+
+    def calc_B_matrices(self):
+        """
+        XB variant: B' uses only the branch reactances (resistance and shunts ignored),
+        B'' is the negative imaginary part of the full Y-bus.
+        """
+        b_full = self.circuit.calc_b_matrix()
+        b_prime = b_full[self.pvpq][:, self.pvpq]
+        b_double_prime = -self.circuit.ybus.imag[self.pq][:, self.pq]
+
+        return b_prime.tocsc(), b_double_prime.tocsc()
+
+    def calc_mismatch(self, v):
+        """Split the Powerflow mismatch vector into its P (non-slack) and Q (PQ) parts."""
+        with self.stats.timer("injections"):
+            s_injected = calc_injections(self.circuit.ybus, v)
+            mismatch = self.powerflow.calc_mismatch(s_injected.real, s_injected.imag).ravel()
+        return mismatch[:len(self.pvpq)], mismatch[len(self.pvpq):]
+
+    def solve(self):
+        v = self.circuit.get_voltage_vector()
+        vpu = np.abs(v)
+        delta = np.angle(v)
+
+        iteration = 0
+        self.converged = False
+        #The Y-bus and B', B'' factorizations of __init__ serve every solve and stay in its statistics
+        self.stats.reset(keep=("ybus", "factorization"))
+        p_mismatch, q_mismatch = self.calc_mismatch(v)
+
+        while iteration < self.max_iter:
+
+            max_mismatch = max(np.max(np.abs(p_mismatch), initial=0), np.max(np.abs(q_mismatch), initial=0))
+            self.stats.record_iteration(iteration, max_mismatch)
+
+            if max_mismatch < self.tol:
+                self.converged = True
+                break
+
+            iteration += 1
+
+            #P-theta half iteration
+            with self.stats.timer("solve"):
+                delta[self.pvpq] += self.b_prime_solver.solve(p_mismatch / vpu[self.pvpq])
+            v = vpu * np.exp(1j * delta)
+            p_mismatch, q_mismatch = self.calc_mismatch(v)
+
+            #Q-V half iteration
+            if len(self.pq) > 0:
+                with self.stats.timer("solve"):
+                    vpu[self.pq] += self.b_double_prime_solver.solve(q_mismatch / vpu[self.pq])
+                v = vpu * np.exp(1j * delta)
+                p_mismatch, q_mismatch = self.calc_mismatch(v)
+
+        self.iterations = iteration
+        with self.stats.timer("update"):
+            self.circuit.set_voltages(vpu, delta)
+
+        self.stats.finish(iteration, self.converged)
+        return self.stats
@@ -2,13 +2,71 @@ import numpy as np
 from Settings import s
 
 class Generator:
+    __slots__ = ("name", "voltage_setpoint", "table", "bus_index", "local_mw_setpoint", "local_sub_trans")
+
     def __init__(self, name:str,voltage_setpoint:float, mw_setpoint:float):
         self.name = name
         self.voltage_setpoint = voltage_setpoint
+        self.table = None   #BusTable of the bus this generator is attached to
+        self.bus_index = None
+        self.local_mw_setpoint = mw_setpoint
+        self.local_sub_trans = None
+
+    @classmethod
+    def from_row(cls, name:str, table, bus_index:int, sub_trans=None):
+        """
+        Create a generator view onto a bus table row that already holds its MW setpoint
+        (and subtransient impedance, unless sub_trans is given).
+        """
+        generator = cls.__new__(cls)
+        generator.name = name
+        generator.voltage_setpoint = table.data["v_set"][bus_index]
+        generator.table = table
+        generator.bus_index = bus_index
+        generator.local_mw_setpoint = None
+        generator.local_sub_trans = None
+        if sub_trans is not None:
+            generator.sub_trans = sub_trans
+        return generator
+
+    def attach(self, table, bus_index:int):
+        """Move the MW setpoint into the bus table row, the object then becomes a view onto it."""
+        mw_setpoint, sub_trans = self.mw_setpoint, self.sub_trans
+        self.table = table
+        self.bus_index = bus_index
         self.mw_setpoint = mw_setpoint
-        self.sub_trans=None
+        self.sub_trans = sub_trans
+
+    @property
+    def mw_setpoint(self):
+        if self.table is None:
+            return self.local_mw_setpoint
+        return self.table.data["p_gen"][self.bus_index]
+
+    @mw_setpoint.setter
+    def mw_setpoint(self, value):
+        if self.table is None:
+            self.local_mw_setpoint = value
+        else:
+            self.table.data["p_gen"][self.bus_index] = value
+
+    @property
+    def sub_trans(self):
+        """Subtransient impedance in per-unit on the system base, None if the generator is left out of fault studies."""
+        if self.table is None:
+            return self.local_sub_trans
+        value = self.table.data["sub_trans"][self.bus_index]
+        return None if np.isnan(value) else complex(value)
 
-    def calc_Impedance(self, sub_trans):
-        self.sub_trans=complex(0,sub_trans * (s.base_power / self.mw_setpoint))
+    @sub_trans.setter
+    def sub_trans(self, value):
+        if self.table is None:
+            self.local_sub_trans = value
+        else:
+            self.table.data["sub_trans"][self.bus_index] = np.nan if value is None else value
 
+    def calc_Impedance(self, sub_trans, base_power:float=None):
+        if base_power is None:
+            base_power = s.base_power
+        self.sub_trans=complex(0,sub_trans * (base_power / self.mw_setpoint))
 
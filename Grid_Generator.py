@@ -0,0 +1,171 @@
+# Synthetic meshed test networks of configurable size for benchmarking the solvers
+# Three transmission voltage levels (500, 230 and 115 kV) plus 20 kV generator buses behind step-up transformers
+import numpy as np
+from scipy.spatial import cKDTree
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
+from scipy.sparse.csgraph import connected_components
+
+from circuit import Circuit
+from Conductor import Conductor
+from Bundle import Bundle
+from Geometry import Geometry
+
+
+def mesh_edges(points, neighbours: int):
+    """
+    Edges connecting every point to its nearest neighbours, plus the extra edges needed
+    to join all connected components into one meshed network.
+    """
+    n = len(points)
+    if n < 2:
+        return np.zeros((0, 2), dtype=np.int64)
+
+    tree = cKDTree(points)
+    _, nearest = tree.query(points, k=min(neighbours + 1, n))
+    edges = np.stack([np.repeat(np.arange(n), nearest.shape[1] - 1), nearest[:, 1:].ravel()], axis=1)
+    edges = np.unique(np.sort(edges, axis=1), axis=0)
+
+    #Join every island to the largest component at the closest pair of points
+    graph = sp.coo_matrix((np.ones(len(edges)), (edges[:, 0], edges[:, 1])), shape=(n, n))
+    num_components, labels = connected_components(graph, directed=False)
+    if num_components > 1:
+        main = labels == np.bincount(labels).argmax()
+        targets = np.flatnonzero(main)
+        members = np.flatnonzero(~main)
+        distance, nearest_target = cKDTree(points[targets]).query(points[members])
+
+        #Closest member of every island: sort by distance, keep the first of each label
+        order = np.lexsort((distance, labels[members]))
+        _, first = np.unique(labels[members][order], return_index=True)
+        closest = order[first]
+        extra = np.stack([members[closest], targets[nearest_target[closest]]], axis=1)
+        edges = np.vstack((edges, extra))
+
+    return edges
+
+
+def estimate_branch_losses(circuit, p_injection):
+    """
+    Estimate the real power losses (MW) of every branch from a DC power flow with bus 0 as slack.
+
+    p_injection is the net injection of every bus in MW. Branch flows come from the DC
+    angles, losses from r * (P^2 + Q^2) with the reactive flows taken as about a quarter of P.
+    """
+    table = circuit.branch_table
+    n = len(circuit.buses)
+    f, t = table["from_bus"], table["to_bus"]
+    b = 1 / table["x"]
+
+    b_matrix = sp.csr_matrix((np.concatenate((b, b, -b, -b)),
+                              (np.concatenate((f, t, f, t)), np.concatenate((f, t, t, f)))), shape=(n, n))
+    theta = np.zeros(n)
+    theta[1:] = spla.spsolve(b_matrix[1:, 1:].tocsc(), p_injection[1:] / circuit.settings.base_power)
+
+    flow = (theta[f] - theta[t]) * b
+    return table["r"] * flow**2 * 1.07 * circuit.settings.base_power
+
+
+def generate_grid(num_buses: int, seed: int = 0, pv_fraction: float = 0.1, hv_fraction: float = 0.4,
+                  neighbours: int = 3, name: str = None):
+    """
+    Build a random, connected, meshed Circuit with roughly num_buses buses.
+
+    About pv_fraction of the buses are 20 kV generator buses, each tied to a 230 kV bus by a
+    step-up transformer (the first one is the slack). The rest form meshed 500, 230 and 115 kV
+    line networks coupled by transformers; every 230 and 115 kV bus carries a load. Each
+    generator is dispatched for the load of the buses nearest to it plus a DC estimate of the
+    losses, so flows stay local, the slack only balances the estimation error and the network
+    stays solvable at any size.
+
+    :param hv_fraction: Share of the non-generator buses at 230 kV, a tenth of that again at 500 kV.
+    :param neighbours: Number of nearest neighbours each bus is connected to by lines.
+    """
+    rng = np.random.default_rng(seed)
+    circuit = Circuit(name if name is not None else f"Synthetic{num_buses}")
+
+    num_gen = max(2, int(round(pv_fraction * num_buses)))
+    num_net = max(num_buses - num_gen, 6)
+    num_hv = max(2, int(round(hv_fraction * num_net)))
+    num_ehv = max(2, num_hv // 10)
+    num_mv = max(2, num_net - num_hv - num_ehv)
+
+    conductor = Conductor("Partridge", 0.642, 0.0217, 0.385, 460)
+    levels = {
+        500: (Bundle("Bundle500", 3, 1.5, conductor), Geometry("Geometry500", 0, 0, 12, 0, 24, 0)),
+        230: (Bundle("Bundle230", 2, 1.5, conductor), Geometry("Geometry230", 0, 0, 9.75 * 2, 0, 9.75 * 4, 0)),
+        115: (Bundle("Bundle115", 1, 0, conductor), Geometry("Geometry115", 0, 0, 12, 0, 24, 0)),
+    }
+
+    #Bus positions in miles, about 10 miles between neighbouring 230 kV substations.
+    #500 kV and 20 kV buses sit in 230 kV substations, 115 kV buses are scattered around them
+    side = 10 * np.sqrt(num_hv)
+    hv_points = rng.uniform(0, side, (num_hv, 2))
+    centre = np.argmin(np.linalg.norm(hv_points - side / 2, axis=1))  #Slack in the middle
+    others = rng.permutation(np.delete(np.arange(num_hv), centre))
+    gen_parent = np.resize(np.concatenate(([centre], others)), num_gen)
+    ehv_parent = np.concatenate(([centre], rng.permutation(others)[:num_ehv - 1]))
+    mv_parent = rng.integers(0, num_hv, num_mv)
+    mv_points = hv_points[mv_parent] + rng.normal(0, 2, (num_mv, 2))
+
+    gen_names = [f"G{k}" for k in range(num_gen)]
+    hv_names = [f"HV{k}" for k in range(num_hv)]
+    mv_names = [f"MV{k}" for k in range(num_mv)]
+    ehv_names = [f"EHV{k}" for k in range(num_ehv)]
+
+    #Buses: slack first, then PV, then the network buses
+    circuit.add_buses(gen_names, 20, bus_type=["Slack_Bus"] + ["PV_Bus"] * (num_gen - 1))
+    circuit.add_buses(hv_names + mv_names + ehv_names, np.repeat([230, 115, 500], [num_hv, num_mv, num_ehv]))
+
+    #Meshed line networks on every voltage level
+    for base_kv, names, points in ((500, ehv_names, hv_points[ehv_parent]), (230, hv_names, hv_points),
+                                   (115, mv_names, mv_points)):
+        bundle, geometry = levels[base_kv]
+        edges = mesh_edges(points, neighbours)
+        lengths = np.maximum(np.linalg.norm(points[edges[:, 0]] - points[edges[:, 1]], axis=1), 1.0)
+        names = np.array(names)
+        circuit.add_lines([f"L{base_kv}_{k}" for k in range(len(edges))], names[edges[:, 0]], names[edges[:, 1]],
+                          bundle, geometry, lengths)
+
+    #500/230 kV transformers in every 500 kV substation, 230/115 kV transformers from every
+    #substation to the first 115 kV bus around it
+    hv_names, mv_names = np.array(hv_names), np.array(mv_names)
+    circuit.add_transformers([f"T500_{k}" for k in range(num_ehv)], ehv_names, hv_names[ehv_parent], 1000, 10, 20)
+    _, couplings = np.unique(mv_parent, return_index=True)
+    circuit.add_transformers([f"T115_{k}" for k in couplings], hv_names[mv_parent[couplings]], mv_names[couplings],
+                             200, 8, 10)
+
+    #Loads on every 230 and 115 kV bus
+    p_load = np.concatenate((rng.uniform(10, 40, num_hv), rng.uniform(3, 15, num_mv)))
+    load_buses = np.concatenate((hv_names, mv_names))
+    circuit.add_loads(np.char.add("Load_", load_buses), p_load, 0.3 * p_load, load_buses)
+
+    #Every generator supplies the load of the buses closest to it, so power flows stay local
+    gen_tree = cKDTree(hv_points[gen_parent])
+    region = np.concatenate((np.arange(num_gen), gen_tree.query(hv_points)[1], gen_tree.query(mv_points)[1],
+                             gen_tree.query(hv_points[ehv_parent])[1]))
+    p_bus = circuit.bus_table["p_load"].copy()
+    dispatch = np.bincount(region, p_bus, num_gen)
+
+    #Step-up transformers, the slack one sized to also carry the error of the loss estimate,
+    #then a DC estimate of every region's losses on top of its load
+    rating = np.maximum(100.0, 1.5 * dispatch)
+    rating[0] = max(rating[0], 0.01 * p_bus.sum())
+    circuit.add_transformers([f"TG_{k}" for k in range(num_gen)], gen_names, hv_names[gen_parent], rating, 10, 12)
+
+    p_bus[:num_gen] = -dispatch
+    losses = estimate_branch_losses(circuit, -p_bus)
+    dispatch += np.bincount(region[circuit.branch_table["from_bus"]], losses, num_gen)
+
+    circuit.add_generators([f"Gen_{k}" for k in range(num_gen)], 1.0, dispatch, gen_names, 0.12)
+
+    return circuit
+
+if __name__ == "__main__":
+    from Newton_Raphson import Newton_Raphson
+
+    circuit = generate_grid(1000)
+    print(len(circuit.buses), "buses,", len(circuit.transmission_lines), "lines,", len(circuit.transformers), "transformers")
+
+    solver = Newton_Raphson(circuit, 1e-6, 20)
+    print(solver.solve().summary())
@@ -1,149 +1,98 @@
 import numpy as np
-import math
-import cmath
-import pandas as pd
+import scipy.sparse as sp
 
 
-class Jacobian:
-    def __init__(self,circuit):
-       self.circuit=circuit
-
-    def calc_jacobian(self):
-        J1=self.calc_J1()
-        J2=self.calc_J2()
-        J3=self.calc_J3()
-        J4=self.calc_J4()
-
-        jacobian=np.block([[J1,J2],[J3,J4]])
-
-        for keys in self.circuit.buses.keys():
+def calc_dS_dV(ybus, v):
+    """
+    Partial derivatives of the complex bus power injections S = V * conj(Ybus V).
 
-            if(self.circuit.buses[keys].bus_type == "Slack_Bus"):
-                index_Slack=self.circuit.buses[keys].index
-            if(self.circuit.buses[keys].bus_type == "PV_Bus"):
-                index_PV=self.circuit.buses[keys].index
+    Works on the sparse Y-bus in matrix form, so only its nonzeros are touched.
 
+    :param ybus: Sparse n x n bus admittance matrix.
+    :param v: Complex bus voltage vector (length n).
+    :return: (dS_dVa, dS_dVm) sparse n x n matrices w.r.t. voltage angle and magnitude.
+    """
+    ybus=sp.csr_matrix(ybus)
+    n=len(v)
+    i_bus=ybus @ v
 
-        jacobian_trimmed=np.delete(jacobian, [index_Slack, index_Slack+len(self.circuit.buses),index_PV+len(self.circuit.buses)],axis=0)
-        jacobian_trimmed=np.delete(jacobian_trimmed, [index_Slack, index_Slack+len(self.circuit.buses),index_PV+len(self.circuit.buses)],axis=1)
+    diag_v=sp.diags(v, format="csr")
+    diag_i_bus=sp.diags(i_bus, format="csr")
+    diag_v_norm=sp.diags(v/np.abs(v), format="csr")
 
+    dS_dVm=diag_v @ (ybus @ diag_v_norm).conj() + diag_i_bus.conj() @ diag_v_norm
+    dS_dVa=1j * diag_v @ (diag_i_bus - ybus @ diag_v).conj()
 
+    return sp.csr_matrix(dS_dVa, shape=(n, n)), sp.csr_matrix(dS_dVm, shape=(n, n))
 
 
+def build_jacobian(ybus, v, pvpq, pq):
+    """
+    Trimmed sparse Jacobian [[dP/d(delta), dP/d|V|], [dQ/d(delta), dQ/d|V|]] from arrays.
 
-        #Slight Change for commit t
-        jacobain_pd = pd.DataFrame(jacobian)
+    :param pvpq: Sorted indices of the non-slack buses (P rows and angle columns).
+    :param pq: Sorted indices of the PQ buses (Q rows and magnitude columns).
+    """
+    dS_dVa, dS_dVm = calc_dS_dV(ybus, v)
+    return sp.bmat([[dS_dVa[pvpq][:, pvpq].real, dS_dVm[pvpq][:, pq].real],
+                    [dS_dVa[pq][:, pvpq].imag, dS_dVm[pq][:, pq].imag]], format="csc")
 
-        pd.set_option('display.max_rows', None)  # Show all rows
-        pd.set_option('display.max_columns', None)  # Show all columns
-        pd.set_option('display.width', 1000)  # Increase the display width
-        pd.set_option('display.float_format', lambda x: f'{x:.5f}')
 
-        #print(jacobain_pd)
-
-        jacobain_Trimmed_pd = pd.DataFrame(jacobian_trimmed)
-
-        pd.set_option('display.max_rows', None)  # Show all rows
-        pd.set_option('display.max_columns', None)  # Show all columns
-        pd.set_option('display.width', 1000)  # Increase the display width
-        pd.set_option('display.float_format', lambda x: f'{x:.5f}')
+class Jacobian:
+    def __init__(self,circuit):
+        self.circuit=circuit
+        self.dS_dVa=None
+        self.dS_dVm=None
+
+    #Index arrays of the non-slack (angle) and PQ (magnitude) buses, read from the circuit on every
+    #use so a bus type edit (see Circuit.invalidate_bus_types) reaches a Jacobian that already exists
+    @property
+    def pvpq(self):
+        if self.circuit.pvpq_indices is None:
+            self.circuit.calc_bus_indices()
+        return self.circuit.pvpq_indices
+
+    @property
+    def pq(self):
+        if self.circuit.pq_indices is None:
+            self.circuit.calc_bus_indices()
+        return self.circuit.pq_indices
+
+    def calc_jacobian(self, v=None):
+        """
+        Build the trimmed power-flow Jacobian as a sparse CSC matrix.
+
+        Rows are [P of non-slack buses, Q of PQ buses] and columns are
+        [angle of non-slack buses, magnitude of PQ buses], in bus index order.
+
+        :param v: Optional complex voltage vector; defaults to the circuit bus voltages.
+        """
+        if v is None:
+            v=self.circuit.get_voltage_vector()
+
+        self.dS_dVa, self.dS_dVm=calc_dS_dV(self.circuit.ybus, v)
 
-        print(jacobain_Trimmed_pd)
+        J1=self.calc_J1()
+        J2=self.calc_J2()
+        J3=self.calc_J3()
+        J4=self.calc_J4()
 
-        return jacobian_trimmed
+        jacobian=sp.bmat([[J1,J2],[J3,J4]], format="csc")
 
+        return jacobian
 
+    #dP/d(delta) for non-slack buses
     def calc_J1(self):
+        return self.dS_dVa[self.pvpq][:, self.pvpq].real
 
-        J1=np.zeros([len(self.circuit.buses),len(self.circuit.buses)],dtype=float)
-
-        for n in self.circuit.buses.keys():
-            for k in self.circuit.buses.keys():
-                i=self.circuit.buses[n].index
-                j=self.circuit.buses[k].index
-
-                busn=self.circuit.buses[n]
-                busk=self.circuit.buses[k]
-                #ybus=self.circuit.ybus[j,i]
-
-                if(k==n):
-                    for p in (self.circuit.buses.keys()):
-                        busn=self.circuit.buses[p]
-                        i=busn.index
-                        if busn.index!=busk.index:
-                            J1[j,j]+= abs(self.circuit.ybus[i,j]) * busn.vpu * math.sin(busk.delta - busn.delta - np.angle(self.circuit.ybus[i,j]))  #Check Radians and degrees for cmath
-                    J1[j,j]*=(-busk.vpu)
-                else:
-                    J1[i,j]=busk.vpu * abs(self.circuit.ybus[i,j]) * busn.vpu *math.sin(busk.delta - busn.delta - np.angle(self.circuit.ybus[i,j]))
-        return J1
-
+    #dP/d|V| for non-slack rows and PQ columns
     def calc_J2(self):
+        return self.dS_dVm[self.pvpq][:, self.pq].real
 
-        J2=np.zeros([len(self.circuit.buses),len(self.circuit.buses)])
-
-        for n in self.circuit.buses.keys():
-            for k in self.circuit.buses.keys():
-                i=self.circuit.buses[n].index
-                j=self.circuit.buses[k].index
-
-                busn=self.circuit.buses[n]
-                busk=self.circuit.buses[k]
-                #ybus=self.circuit.ybus[j,i]
-
-                if(k==n):
-                    for p in (self.circuit.buses.keys()):
-                        busn=self.circuit.buses[p]
-                        i=busn.index
-                        J2[j,j]+= abs(self.circuit.ybus[i,j]) * busn.vpu * math.cos(busk.delta - busn.delta - np.angle(self.circuit.ybus[i,j]))
-                    J2[j,j]*=(busk.vpu*abs(self.circuit.ybus[j,j])*math.cos(np.angle(self.circuit.ybus[j,j])))
-                else:
-                    J2[i,j]=busk.vpu * abs(self.circuit.ybus[i,j]) * math.cos(busk.delta - busn.delta - np.angle(self.circuit.ybus[i,j]))
-        return J2
-
+    #dQ/d(delta) for PQ rows and non-slack columns
     def calc_J3(self):
+        return self.dS_dVa[self.pq][:, self.pvpq].imag
 
-        J3=np.zeros([len(self.circuit.buses),len(self.circuit.buses)])
-
-        for n in self.circuit.buses.keys():
-            for k in self.circuit.buses.keys():
-                i=self.circuit.buses[n].index
-                j=self.circuit.buses[k].index
-
-                busn=self.circuit.buses[n]
-                busk=self.circuit.buses[k]
-                #ybus=self.circuit.ybus[j,i]
-
-                if(k==n):
-                    for p in (self.circuit.buses.keys()):
-                        busn=self.circuit.buses[p]
-                        i=busn.index
-                        if busn.index!=busk.index:
-                            J3[j,j]+= abs(self.circuit.ybus[i,j]) * busn.vpu * math.cos(busk.delta - busn.delta - np.angle(self.circuit.ybus[i,j]))
-                    J3[j,j]*=(busk.vpu)
-                else:
-                    J3[i,j]=(-1)*busk.vpu * abs(self.circuit.ybus[i,j]) * busn.vpu *math.cos(busk.delta - busn.delta - np.angle(self.circuit.ybus[i,j]))
-        return J3
-
+    #dQ/d|V| for PQ buses
     def calc_J4(self):
-
-        J4=np.zeros([len(self.circuit.buses),len(self.circuit.buses)])
-
-        for n in self.circuit.buses.keys():
-            for k in self.circuit.buses.keys():
-                i=self.circuit.buses[n].index
-                j=self.circuit.buses[k].index
-
-                busn=self.circuit.buses[n]
-                busk=self.circuit.buses[k]
-                #ybus=self.circuit.ybus[j,i]
-
-                if(k==n):
-                    for p in (self.circuit.buses.keys()):
-                        busn=self.circuit.buses[p]
-                        i=busn.index
-                        J4[j,j]+= abs(self.circuit.ybus[i,j]) * busn.vpu * math.sin(busk.delta - busn.delta - np.angle(self.circuit.ybus[i,j]))
-                    J4[j,j]*=(-busk.vpu* abs(self.circuit.ybus[j,j]) *math.sin(np.angle(self.circuit.ybus[j,j])))
-                else:
-                    J4[i,j]=busk.vpu * abs(self.circuit.ybus[i,j]) *math.sin(busk.delta - busn.delta - np.angle(self.circuit.ybus[i,j]))
-
-        return J4
\ No newline at end of file
+        return self.dS_dVm[self.pq][:, self.pq].imag
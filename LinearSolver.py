@@ -0,0 +1,251 @@
+# Linear solver layer used by the power flow and fault solvers
+# Symbolic analysis (sparsity pattern + fill-reducing ordering) is done once per topology,
+# only the numeric factorization is repeated when the matrix values change
+import time
+
+import numpy as np
+import scipy.linalg as la
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
+
+
+class LinearSolver:
+    """
+    Base class of the pluggable linear solver backends.
+
+    Subclasses implement analyze (symbolic step, called when the sparsity pattern
+    changes), factorize (numeric step, called for every new matrix) and solve.
+    """
+    name = "base"
+
+    def __init__(self):
+        self.pattern = None
+        self.ordering = None  #Symmetric permutation applied before factorizing, see set_ordering
+        self.permuted_pattern = None
+        self.stats = {
+            "backend": self.name,
+            "ordering": "backend",
+            "analyses": 0,
+            "factorizations": 0,
+            "solves": 0,
+            "analyze_time": 0.0,
+            "factor_time": 0.0,
+            "solve_time": 0.0,
+            "last_factor_time": 0.0,
+            "nnz_matrix": 0,
+            "nnz_factors": 0,
+            "fill_in": 0,
+        }
+
+    def same_pattern(self, matrix):
+        """Return True if matrix has the sparsity pattern of the last analysed matrix."""
+        if self.pattern is None:
+            return False
+        shape, indptr, indices = self.pattern
+        return (matrix.shape == shape and np.array_equal(matrix.indptr, indptr)
+                and np.array_equal(matrix.indices, indices))
+
+    def set_ordering(self, ordering, method: str = "custom"):
+        """
+        Factorize P A P^T instead of A, where ordering[k] is the original row and column placed at
+        position k, and keep the backend from reordering it. None lets the backend order the matrix
+        itself (COLAMD for SuperLU). Solutions are always returned in the original order.
+        """
+        if ordering is None and self.ordering is None:
+            return
+        if ordering is not None and self.ordering is not None and np.array_equal(ordering, self.ordering):
+            return
+        self.ordering = None if ordering is None else np.asarray(ordering, dtype=np.int64)
+        self.pattern = None
+        self.stats["ordering"] = method if ordering is not None else "backend"
+
+    def permute(self, matrix, new_pattern: bool = False):
+        """Return P A P^T in CSC form, gathering the values through a map cached per sparsity pattern."""
+        if self.ordering is None:
+            return matrix
+        if new_pattern:
+            #Permute a matrix of entry numbers once, then every later matrix is a single gather
+            marker = sp.csc_matrix((np.arange(1, matrix.nnz + 1, dtype=np.float64), matrix.indices, matrix.indptr),
+                                   shape=matrix.shape)
+            permuted = marker[self.ordering][:, self.ordering].tocsc()
+            permuted.sort_indices()
+            self.permuted_pattern = (permuted.indptr, permuted.indices, permuted.data.astype(np.int64) - 1)
+        indptr, indices, data_map = self.permuted_pattern
+        return sp.csc_matrix((matrix.data[data_map], indices, indptr), shape=matrix.shape)
+
+    def factor(self, matrix):
+        """Factorize matrix, redoing the symbolic analysis only if its sparsity pattern changed."""
+        matrix = sp.csc_matrix(matrix)
+        if self.ordering is not None and not matrix.has_canonical_format:
+            matrix = matrix.copy()
+            matrix.sum_duplicates()
+
+        if not self.same_pattern(matrix):
+            start = time.perf_counter()
+            self.analyze(self.permute(matrix, new_pattern=True))
+            self.pattern = (matrix.shape, matrix.indptr.copy(), matrix.indices.copy())
+            self.stats["analyze_time"] += time.perf_counter() - start
+            self.stats["analyses"] += 1
+
+        start = time.perf_counter()
+        self.factorize(self.permute(matrix))
+        elapsed = time.perf_counter() - start
+
+        self.stats["last_factor_time"] = elapsed
+        self.stats["factor_time"] += elapsed
+        self.stats["factorizations"] += 1
+        self.stats["nnz_matrix"] = matrix.nnz
+        self.stats["fill_in"] = self.stats["nnz_factors"] - matrix.nnz
+
+    def solve(self, rhs):
+        start = time.perf_counter()
+        if self.ordering is None:
+            x = self.solve_factored(np.asarray(rhs))
+        else:
+            y = self.solve_factored(np.asarray(rhs)[self.ordering])
+            x = np.empty_like(y)
+            x[self.ordering] = y
+        self.stats["solve_time"] += time.perf_counter() - start
+        self.stats["solves"] += 1
+        return x
+
+    def analyze(self, matrix):
+        raise NotImplementedError
+
+    def factorize(self, matrix):
+        raise NotImplementedError
+
+    def solve_factored(self, rhs):
+        raise NotImplementedError
+
+
+class SuperLUSolver(LinearSolver):
+    """Sparse LU through scipy's SuperLU with a cached COLAMD column ordering."""
+    name = "superlu"
+
+    def __init__(self, permc_spec: str = "COLAMD"):
+        super().__init__()
+        self.permc_spec = permc_spec
+        self.col_order = None
+        self.lu = None
+
+    def analyze(self, matrix):
+        if self.ordering is not None:
+            #Already permuted into a fill-reducing order, keep it
+            self.col_order = None
+            return
+
+        #Let SuperLU compute the fill-reducing column ordering once, then reuse it
+        lu = spla.splu(matrix, permc_spec=self.permc_spec)
+        self.col_order = np.argsort(lu.perm_c)
+
+    def factorize(self, matrix):
+        if self.col_order is None:
+            #Prefer diagonal pivots so row interchanges do not undo the symmetric ordering
+            self.lu = spla.splu(matrix, permc_spec="NATURAL", diag_pivot_thresh=0.1)
+        else:
+            self.lu = spla.splu(matrix[:, self.col_order], permc_spec="NATURAL")
+        self.stats["nnz_factors"] = self.lu.L.nnz + self.lu.U.nnz
+
+    def solve_factored(self, rhs):
+        y = self.lu.solve(rhs)
+        if self.col_order is None:
+            return y
+        x = np.empty_like(y)
+        x[self.col_order] = y
+        return x
+
+
+class DenseSolver(LinearSolver):
+    """Dense LU fallback through LAPACK, for small systems or debugging."""
+    name = "dense"
+
+    def __init__(self):
+        super().__init__()
+        self.lu_piv = None
+
+    def analyze(self, matrix):
+        pass
+
+    def factorize(self, matrix):
+        self.lu_piv = la.lu_factor(matrix.toarray())
+        self.stats["nnz_factors"] = matrix.shape[0] * matrix.shape[1]
+
+    def solve_factored(self, rhs):
+        return la.lu_solve(self.lu_piv, rhs)
+
+
+class LowRankUpdatedSolver:
+    """
+    Solves (A + U C U^T) x = b reusing an existing factorization of A (Sherman-Morrison-Woodbury).
+
+    U holds unit vectors of the affected rows, so a branch edit between buses i and j
+    with 2x2 admittance change dY is a rank-2 update with U = [e_i, e_j] and C = dY.
+    """
+
+    def __init__(self, base_solver: LinearSolver):
+        self.base_solver = base_solver
+        self.name = base_solver.name
+        self.stats = base_solver.stats
+        self.indices = np.zeros(0, dtype=np.int64)
+        self.c_matrix = np.zeros((0, 0), dtype=complex)
+        self.a_inv_u = None
+        self.w_c = None
+        self.inner_lu_piv = None
+
+    @property
+    def rank(self):
+        return len(self.indices)
+
+    def add_update(self, indices, c_block):
+        """Append the update U C U^T where U = unit columns at the given indices."""
+        indices = np.asarray(indices, dtype=np.int64)
+        n = self.base_solver.pattern[0][0]
+
+        #A^-1 U for the new columns only, earlier columns are kept
+        unit = np.zeros((n, len(indices)), dtype=complex)
+        unit[indices, np.arange(len(indices))] = 1
+        new_cols = self.base_solver.solve(unit)
+        self.a_inv_u = new_cols if self.a_inv_u is None else np.hstack((self.a_inv_u, new_cols))
+
+        self.indices = np.concatenate((self.indices, indices))
+        self.c_matrix = la.block_diag(self.c_matrix, np.asarray(c_block, dtype=complex))
+
+        #Woodbury in the form that allows a singular C (e.g. a branch outage)
+        self.w_c = self.a_inv_u @ self.c_matrix
+        inner = np.eye(self.rank) + self.w_c[self.indices, :]
+        self.inner_lu_piv = la.lu_factor(inner)
+
+    def solve(self, rhs):
+        x = self.base_solver.solve(rhs)
+        if self.rank == 0:
+            return x
+        return x - self.w_c @ la.lu_solve(self.inner_lu_piv, x[self.indices])
+
+
+LINEAR_SOLVER_BACKENDS = {
+    "superlu": SuperLUSolver,
+    "dense": DenseSolver,
+}
+
+
+def get_linear_solver(circuit, key: str, backend: str = "superlu", blocks=None):
+    """
+    Return the solver cached on the circuit under key, creating it with the given backend.
+
+    Keeping the solver on the circuit lets repeated solves of the same topology reuse
+    the symbolic analysis. key identifies the matrix being factorized, e.g. "jacobian".
+
+    :param blocks: Bus indices of the matrix rows, one array per block (e.g. (pvpq, pq) for the
+        Jacobian), so the solver factorizes in the circuit's bus ordering (see Circuit.get_ordering).
+    """
+    if backend not in LINEAR_SOLVER_BACKENDS:
+        raise ValueError(f"Unknown linear solver backend: {backend}")
+
+    solver = circuit.linear_solvers.get(key)
+    if solver is None or solver.name != backend:
+        solver = LINEAR_SOLVER_BACKENDS[backend]()
+        circuit.linear_solvers[key] = solver
+    if blocks is not None:
+        solver.set_ordering(circuit.get_ordering(*blocks), circuit.ordering_method)
+    return solver
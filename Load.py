@@ -1,7 +1,54 @@
 import numpy as np
 
 class Load:
+    __slots__ = ("name", "table", "bus_index", "local_real_power", "local_reactive_power")
+
     def __init__(self, name:str, real_power:float, reactive_power:float):
         self.name = name
+        self.table = None   #BusTable of the bus this load is attached to
+        self.bus_index = None
+        self.local_real_power = real_power
+        self.local_reactive_power = reactive_power
+
+    @classmethod
+    def from_row(cls, name:str, table, bus_index:int):
+        """Create a load view onto a bus table row that already holds its values."""
+        load = cls.__new__(cls)
+        load.name = name
+        load.table = table
+        load.bus_index = bus_index
+        return load
+
+    def attach(self, table, bus_index:int):
+        """Move the load values into the bus table row, the object then becomes a view onto it."""
+        real_power, reactive_power = self.real_power, self.reactive_power
+        self.table = table
+        self.bus_index = bus_index
         self.real_power = real_power
-        self.reactive_power = reactive_power
\ No newline at end of file
+        self.reactive_power = reactive_power
+
+    @property
+    def real_power(self):
+        if self.table is None:
+            return self.local_real_power
+        return self.table.data["p_load"][self.bus_index]
+
+    @real_power.setter
+    def real_power(self, value):
+        if self.table is None:
+            self.local_real_power = value
+        else:
+            self.table.data["p_load"][self.bus_index] = value
+
+    @property
+    def reactive_power(self):
+        if self.table is None:
+            return self.local_reactive_power
+        return self.table.data["q_load"][self.bus_index]
+
+    @reactive_power.setter
+    def reactive_power(self, value):
+        if self.table is None:
+            self.local_reactive_power = value
+        else:
+            self.table.data["q_load"][self.bus_index] = value
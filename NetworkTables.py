@@ -0,0 +1,173 @@
+# Columnar (struct-of-arrays) storage of the network model
+# Bus, TransmissionLine and Transformer objects are thin views onto rows of these tables,
+# solvers read and write the column arrays directly
+from collections.abc import MutableMapping
+
+import numpy as np
+
+SLACK_BUS = 0
+PV_BUS = 1
+PQ_BUS = 2
+BUS_TYPES = {"Slack_Bus": SLACK_BUS, "PV_Bus": PV_BUS, "PQ_Bus": PQ_BUS}
+BUS_TYPE_NAMES = {code: name for name, code in BUS_TYPES.items()}
+
+
+def describe(values, limit: int = 5):
+    """Short text listing of offending names or ids for error messages."""
+    values = np.unique(values)
+    listed = ", ".join(str(int(v)) if isinstance(v, (float, np.floating)) and float(v).is_integer() else str(v)
+                       for v in values[:limit].tolist())
+    return listed + (", ..." if len(values) > limit else "")
+
+
+class Table:
+    """
+    Growable set of equal-length NumPy columns plus a list of row names.
+
+    table["column"] returns a view of the used rows, so in-place writes reach the table.
+    Rows are only appended; the backing arrays double in size when full.
+    """
+    COLUMNS = {}
+    DEFAULTS = {}
+
+    def __init__(self, capacity: int = 16):
+        self.size = 0
+        self.names = []
+        self.data = {column: np.zeros(capacity, dtype=dtype) for column, dtype in self.COLUMNS.items()}
+        for column, value in self.DEFAULTS.items():
+            self.data[column][:] = value
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, column):
+        return self.data[column][:self.size]
+
+    def reserve(self, capacity: int):
+        """Make room for at least capacity rows."""
+        current = len(next(iter(self.data.values())))
+        if capacity <= current:
+            return
+        capacity = max(capacity, 2 * current)
+        for column, values in self.data.items():
+            grown = np.zeros(capacity, dtype=values.dtype)
+            grown[current:] = self.DEFAULTS.get(column, 0)
+            grown[:current] = values
+            self.data[column] = grown
+
+    def append(self, name: str, **values):
+        """Add one row and return its index."""
+        self.reserve(self.size + 1)
+        index = self.size
+        for column, value in values.items():
+            self.data[column][index] = value
+        self.names.append(name)
+        self.size += 1
+        return index
+
+    def extend(self, names, **columns):
+        """Add many rows from equal-length arrays and return their indices."""
+        count = len(names)
+        self.reserve(self.size + count)
+        rows = slice(self.size, self.size + count)
+        for column, values in columns.items():
+            self.data[column][rows] = values
+        self.names.extend(names)
+        self.size += count
+        return np.arange(rows.start, rows.stop)
+
+
+class BusTable(Table):
+    COLUMNS = {
+        "base_kv": np.float64,
+        "vpu": np.float64,
+        "delta": np.float64,  #radians
+        "bus_type": np.int8,  #SLACK_BUS, PV_BUS or PQ_BUS, -1 if invalid
+        "p_load": np.float64,  #MW
+        "q_load": np.float64,  #MVAR
+        "p_gen": np.float64,  #MW setpoint
+        "v_set": np.float64,  #per-unit voltage setpoint of PV and slack buses, used by the flat start
+        "g_shunt": np.float64,  #per-unit shunt conductance at 1 pu voltage
+        "b_shunt": np.float64,  #per-unit shunt susceptance at 1 pu voltage
+        "sub_trans": np.complex128,  #per-unit subtransient impedance of the bus generator, NaN if none
+    }
+    DEFAULTS = {"vpu": 1.0, "bus_type": PQ_BUS, "v_set": 1.0, "sub_trans": np.nan}
+
+    def __init__(self, capacity: int = 16):
+        super().__init__(capacity)
+        self.circuit = None  #Circuit owning the table, told when a Bus view changes a bus type
+
+
+class BranchTable(Table):
+    COLUMNS = {
+        "from_bus": np.int64,
+        "to_bus": np.int64,
+        "r": np.float64,  #per-unit series resistance
+        "x": np.float64,  #per-unit series reactance
+        "b": np.float64,  #per-unit total shunt susceptance
+        "tap": np.float64,  #off-nominal turns ratio
+        "in_service": np.bool_,
+        "rating": np.float64,  #MVA
+        "is_transformer": np.bool_,
+        "length": np.float64,  #miles, lines built from conductor data only
+        "line_type": np.int32,  #index into Circuit.line_types (bundle, geometry), -1 for per-unit data
+    }
+    DEFAULTS = {"tap": 1.0, "in_service": True, "line_type": -1}
+
+    def calc_yprim(self):
+        """
+        Primitive 2x2 admittance matrices of every branch as an (m, 2, 2) array.
+        Out-of-service branches get zeros.
+        """
+        z = self["r"] + 1j * self["x"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            y_series = np.where(z != 0, 1 / z, np.inf)
+        y_shunt = 1j * self["b"] / 2
+        tap = self["tap"]
+
+        yprim = np.empty((self.size, 2, 2), dtype=complex)
+        yprim[:, 0, 0] = (y_series + y_shunt) / tap**2
+        yprim[:, 0, 1] = -y_series / tap
+        yprim[:, 1, 0] = -y_series / tap
+        yprim[:, 1, 1] = y_series + y_shunt
+        yprim[~self["in_service"]] = 0
+        return yprim
+
+
+class ElementViews(MutableMapping):
+    """
+    Name -> element object mapping of a Circuit (e.g. its transmission lines).
+
+    Rows loaded in bulk are stored as plain row indices and only turned into view objects,
+    by factory(row), when they are first accessed. Elements added one by one are stored as is.
+    """
+
+    def __init__(self, factory=None):
+        self.factory = factory
+        self.elements = {}
+
+    def add_rows(self, names, rows):
+        """Register bulk-loaded table rows under the given names without creating their views."""
+        self.elements.update(zip(names, rows))
+
+    def __getitem__(self, name):
+        element = self.elements[name]
+        if type(element) is int:
+            element = self.factory(element)
+            self.elements[name] = element
+        return element
+
+    def __setitem__(self, name, element):
+        self.elements[name] = element
+
+    def __delitem__(self, name):
+        del self.elements[name]
+
+    def __contains__(self, name):
+        return name in self.elements
+
+    def __iter__(self):
+        return iter(self.elements)
+
+    def __len__(self):
+        return len(self.elements)
@@ -1,92 +1,104 @@
-from Powerflow import Powerflow
-from Settings import Settings
-from Circuit import Circuit
-from JacobianTwo import Jacobian
+from Powerflow import Powerflow, calc_injections, save_snapshot
+from circuit import Circuit
+from Jacobian import Jacobian, build_jacobian
+from LinearSolver import get_linear_solver, SuperLUSolver
+from Telemetry import SolverStats
+
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 import pandas as pd
 
-s = Settings()
-
 
 class Newton_Raphson:
-    def __init__(self, circuit: Circuit, tol: float = 0.001, max_iter: int = 50):
+    def __init__(self, circuit: Circuit, tol: float = 0.001, max_iter: int = 50, linear_solver: str = "superlu",
+                 verbose: bool = False, callbacks=None, start: str = "flat", v0=None):
+        """
+        :param verbose: Print mismatch and delta_x tables every iteration (debugging only, slow).
+        :param callbacks: Functions called as callback(stats, iteration, max_mismatch) every iteration.
+        :param start: Start mode: "flat", "previous" (the voltages left in the circuit by the last solve),
+            "vector" (the complex bus voltages v0, e.g. from load_snapshot) or "dc". See Powerflow.initialize.
+        """
         self.circuit = circuit
         self.tol = tol
         self.max_iter = max_iter
+        self.verbose = verbose
         self.buses = circuit.buses
-        self.circuit.calc_y_admit()
-        self.powerflow = Powerflow(circuit)
-        self.powerflow.flat_start()
+        self.stats = SolverStats("Newton-Raphson", callbacks)
+        with self.stats.timer("ybus"):
+            self.circuit.calc_y_admit()
+        self.powerflow = Powerflow(circuit, start, v0)
         self.p_inj,self.q_inj =  self.powerflow.calc_PQ()
+        self.jacobian = Jacobian(circuit)
+        self.linear_solver = get_linear_solver(circuit, "jacobian", linear_solver,
+                                               (circuit.pvpq_indices, circuit.pq_indices))
+        self.iterations = 0
+        self.converged = False
 
     #Function to solve Newton Raphson Method
     def solve(self):
 
-        #Begin from iteration 0 with flat start mismatches
+        #Begin from iteration 0 with flat start mismatches; a repeated solve must converge again and
+        #reports only its own iterations, plus the Y-bus build of __init__
         iteration = 0
+        self.converged = False
+        self.stats.reset(keep=("ybus",))
 
         #Continue algorithm until max iterations are reached
         while iteration < self.max_iter:
 
-            print("Running Powerflow Mismatch from NR\n")
-            self.p_inj, self.q_inj = self.powerflow.calc_PQ()
-
-            #Start with flat start mismatches, compute using p_inj and q_inj
-            mismatch = self.powerflow.calc_mismatch(self.p_inj, self.q_inj)
+            with self.stats.timer("injections"):
+                self.p_inj, self.q_inj = self.powerflow.calc_PQ()
 
-            #Debug -- Print Mismatches
-            print("Mismatch\n", mismatch)
+                #Start with flat start mismatches, compute using p_inj and q_inj
+                mismatch = self.powerflow.calc_mismatch(self.p_inj, self.q_inj)
 
+            max_mismatch = np.max(np.abs(mismatch), initial=0)
+            self.stats.record_iteration(iteration, max_mismatch)
 
+            if self.verbose:
+                print(self.format_mismatch_dataframe(mismatch))
 
             #if mismatches are within tolerance, algorithm stops
-            if np.max(np.abs(mismatch)) < self.tol:
+            if max_mismatch < self.tol:
+                self.converged = True
                 break
 
             #Calculate Jacobian Matrix based on mismatches
-            Jacobian_obj = Jacobian(self.circuit)
-            jacobian_matrix = Jacobian_obj.calc_jacobian()
-
-            #print("Jacobian matrix\n")
-            #print(jacobian_matrix)
+            with self.stats.timer("jacobian"):
+                jacobian_matrix = self.jacobian.calc_jacobian()
 
             #Change in x(mismatches) solved via linear algebra
-            delta_x = np.linalg.solve(jacobian_matrix, mismatch)
-            print(self.format_delta_x(delta_x))
+            with self.stats.timer("factorization"):
+                self.linear_solver.factor(jacobian_matrix)
+            with self.stats.timer("solve"):
+                delta_x = self.linear_solver.solve(mismatch.ravel())
 
-            print("Change in voltage angles and magnitudes\n", delta_x)
+            if self.verbose:
+                with pd.option_context('display.float_format', lambda x: f'{x:.6f}'):
+                    print(self.format_delta_x(delta_x))
 
             #Update voltage values
-            self.update_voltages(delta_x)
+            with self.stats.timer("update"):
+                self.update_voltages(delta_x)
 
             #Move on to next iteration
             iteration += 1
 
-            mismatch_df = self.format_mismatch_dataframe(mismatch)
-            #print(mismatch_df)
-
-            #print("\n", iteration)
-
-        #Once exiting loop, check if max iterations was reached
-        if iteration == self.max_iter:
-            print("Warning: Newton-Raphson method did not converge")
+        self.iterations = iteration
+        self.stats.finish(iteration, self.converged)
+        return self.stats
 
+    def save_snapshot(self, path: str):
+        """Save the current bus voltages with the convergence status to a .npz snapshot."""
+        save_snapshot(self.circuit, path, converged=self.converged, iterations=self.iterations)
 
     def update_voltages(self, delta_x):
-        bus_names = list(self.circuit.buses.keys())
-        # Step 1: Get non-slack buses (angles to update)
-        non_slack_buses = [bus for bus in self.circuit.buses.values() if bus.bus_type != "Slack_Bus"]
-        # Step 2: Get PQ buses (magnitudes to update)
-        pq_buses = [bus for bus in self.circuit.buses.values() if bus.bus_type == "PQ_Bus"]
+        # Angles of non-slack buses come first in delta_x, then magnitudes of PQ buses
+        num_angles = len(self.circuit.pvpq_indices)
 
-        # Step 3: Update voltage angles
-        for i, bus in enumerate(non_slack_buses):
-            bus.delta += delta_x[i]  # radians
-
-        # Step 4: Update voltage magnitudes (only PQ buses)
-        for j, bus in enumerate(pq_buses):
-            bus.vpu += delta_x[len(non_slack_buses) + j]
+        self.circuit.bus_table["delta"][self.circuit.pvpq_indices] += delta_x[:num_angles]  # radians
+        self.circuit.bus_table["vpu"][self.circuit.pq_indices] += delta_x[num_angles:]
 
     def format_mismatch_dataframe(self, mismatch_vector):
         # Get bus references
@@ -120,6 +132,76 @@ class Newton_Raphson:
                 labels.append(f"ΔV_{bus.name}")
 
         delta_df = pd.DataFrame(delta_x, index=labels, columns=["delta_x"])
-
-        pd.set_option('display.float_format', lambda x: f'{x:.6f}')
-        return delta_df
\ No newline at end of file
+        return delta_df
+
+
+def solve_arrays(ybus, v, p_spec, q_spec, pvpq, pq, tol: float = 0.001, max_iter: int = 50, linear_solver=None,
+                 reuse_factorization: bool = False):
+    """
+    Newton-Raphson on plain arrays, without Bus objects. Used by the worker processes
+    of the contingency and batch engines.
+
+    :param ybus: Sparse n x n bus admittance matrix.
+    :param v: Complex starting voltage vector (length n), not modified.
+    :param p_spec: Specified per-unit P injections (length n).
+    :param q_spec: Specified per-unit Q injections (length n).
+    :param pvpq: Sorted indices of the non-slack buses.
+    :param pq: Sorted indices of the PQ buses.
+    :param linear_solver: Optional LinearSolver instance, a new SuperLUSolver by default.
+    :param reuse_factorization: Keep the Jacobian factorization already in linear_solver (e.g. from
+        the previous timestep of a slowly changing series) and only refactor when the mismatch
+        falls by less than half in an iteration.
+    :return: (v, converged, iterations)
+    """
+    if linear_solver is None:
+        linear_solver = SuperLUSolver()
+
+    pvpq_rows = np.asarray(pvpq)
+    pq_rows = np.asarray(pq)
+    num_angles = len(pvpq_rows)
+    vpu = np.abs(v)
+    delta = np.angle(v)
+    v = vpu * np.exp(1j * delta)
+    factored = reuse_factorization and linear_solver.pattern is not None
+    last_mismatch = np.inf
+
+    for iteration in range(max_iter + 1):
+        s_injected = calc_injections(ybus, v)
+        mismatch = np.concatenate((p_spec[pvpq_rows] - s_injected.real[pvpq_rows],
+                                   q_spec[pq_rows] - s_injected.imag[pq_rows]))
+
+        max_mismatch = np.max(np.abs(mismatch), initial=0)
+        if max_mismatch < tol:
+            return v, True, iteration
+        if iteration == max_iter:
+            break
+
+        if not factored or max_mismatch > 0.5 * last_mismatch:
+            linear_solver.factor(build_jacobian(ybus, v, pvpq_rows, pq_rows))
+        last_mismatch = max_mismatch
+        delta_x = linear_solver.solve(mismatch)
+
+        delta[pvpq_rows] += delta_x[:num_angles]
+        vpu[pq_rows] += delta_x[num_angles:]
+        v = vpu * np.exp(1j * delta)
+
+    return v, False, max_iter
+
+
+def solve_circuits(circuits, tol: float = 0.001, max_iter: int = 50, max_workers: int = None, start: str = "flat"):
+    """
+    Solve a list of independent circuits concurrently on a thread pool.
+
+    Each circuit keeps its own bus indices, settings and solver caches, so circuits
+    can be solved side by side in one process. The sparse kernels release the GIL
+    for most of their work. start is the start mode of every solve ("flat", "previous" or "dc").
+
+    :return: List of solved Newton_Raphson objects, in the order of circuits.
+    """
+    def solve_one(circuit):
+        solver = Newton_Raphson(circuit, tol, max_iter, start=start)
+        solver.solve()
+        return solver
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(solve_one, circuits))
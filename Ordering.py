@@ -0,0 +1,107 @@
+# Fill-reducing bus orderings for the sparse factorizations
+# One bus permutation per topology; every solver matrix (Y-bus, Jacobian, B', B'') is permuted
+# consistently from it, and the LinearSolver maps solutions back to the original bus order
+import time
+
+import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
+from scipy.sparse.csgraph import reverse_cuthill_mckee
+
+import pandas as pd
+
+#"colamd" leaves the ordering to the linear solver backend (SuperLU's COLAMD on each matrix)
+ORDERING_METHODS = ("colamd", "amd", "rcm", "natural")
+
+
+def calc_bus_graph(circuit):
+    """Symmetric bus adjacency pattern (n x n, CSR) of every branch, in or out of service."""
+    n = len(circuit.bus_table)
+    f, t = circuit.branch_table["from_bus"], circuit.branch_table["to_bus"]
+    graph = sp.csr_matrix((np.ones(2 * len(f)), (np.concatenate((f, t)), np.concatenate((t, f)))), shape=(n, n))
+    graph.sum_duplicates()
+    return graph
+
+
+def calc_bus_ordering(circuit, method: str):
+    """
+    Return the bus permutation of method (position -> bus index), None for "colamd".
+
+    "amd" is a minimum-degree ordering of the bus graph (SuperLU's multiple minimum degree on
+    A^T + A, scipy has no AMD of its own), "rcm" reverse Cuthill-McKee, "natural" the order the
+    buses were added in.
+    """
+    if method not in ORDERING_METHODS:
+        raise ValueError(f"Unknown ordering method: {method}, expected one of {', '.join(ORDERING_METHODS)}")
+    n = len(circuit.bus_table)
+    if method == "colamd":
+        return None
+    if method == "natural" or n == 0:
+        return np.arange(n)
+
+    graph = calc_bus_graph(circuit)
+    if method == "rcm":
+        return reverse_cuthill_mckee(graph, symmetric_mode=True).astype(np.int64)
+
+    #Diagonally dominant matrix with the bus graph pattern, so SuperLU never pivots off the diagonal
+    degree = np.asarray(graph.sum(axis=1)).ravel()
+    pattern = (sp.diags(degree + 1.0) - graph).tocsc()
+    lu = spla.splu(pattern, permc_spec="MMD_AT_PLUS_A", diag_pivot_thresh=0.0, options={"SymmetricMode": True})
+    return np.argsort(lu.perm_c).astype(np.int64)
+
+
+def calc_block_ordering(bus_ordering, blocks):
+    """
+    Permutation of a matrix whose rows are the concatenated bus index arrays of blocks (e.g. the
+    angle and magnitude rows of the Jacobian) that follows bus_ordering and keeps the rows of a bus together.
+    """
+    rank = np.empty(len(bus_ordering), dtype=np.int64)
+    rank[bus_ordering] = np.arange(len(bus_ordering))
+    buses = np.concatenate(blocks) if len(blocks) > 0 else np.zeros(0, dtype=np.int64)
+    block_ids = np.repeat(np.arange(len(blocks)), [len(block) for block in blocks])
+    return np.lexsort((block_ids, rank[buses]))
+
+
+def ordering_report(circuit, methods=("colamd", "amd", "rcm"), backend: str = "superlu"):
+    """
+    Factorize the Y-bus and the power-flow Jacobian (at the current voltages) under each ordering
+    method and report the nonzeros of the factors and the time taken. "natural" is left out by
+    default, its fill-in makes it take minutes on large meshed systems.
+
+    :return: DataFrame with one row per (matrix, method): nnz of the matrix and of L+U, fill-in
+        ratio, ordering time and factorization time (seconds).
+    """
+    from Jacobian import build_jacobian
+    from LinearSolver import LINEAR_SOLVER_BACKENDS
+
+    if circuit.ybus is None or circuit.ybus_version != circuit.topology_version:
+        circuit.calc_y_admit()
+    pvpq, pq = circuit.pvpq_indices, circuit.pq_indices
+    matrices = {
+        "ybus": (circuit.ybus, (np.arange(len(circuit.bus_table)),)),
+        "jacobian": (build_jacobian(circuit.ybus, circuit.get_voltage_vector(), pvpq, pq), (pvpq, pq)),
+    }
+
+    rows = []
+    for method in methods:
+        start = time.perf_counter()
+        bus_ordering = calc_bus_ordering(circuit, method)
+        ordering_time = time.perf_counter() - start
+
+        for name, (matrix, blocks) in matrices.items():
+            solver = LINEAR_SOLVER_BACKENDS[backend]()
+            if bus_ordering is not None:
+                solver.set_ordering(calc_block_ordering(bus_ordering, blocks), method)
+            solver.factor(matrix)
+            rows.append({"matrix": name, "method": method, "nnz_matrix": solver.stats["nnz_matrix"],
+                         "nnz_factors": solver.stats["nnz_factors"],
+                         "fill_ratio": solver.stats["nnz_factors"] / max(solver.stats["nnz_matrix"], 1),
+                         "ordering_time": ordering_time,
+                         "factor_time": solver.stats["analyze_time"] + solver.stats["factor_time"]})
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    from Grid_Generator import generate_grid
+
+    print(ordering_report(generate_grid(5000)).to_string(index=False))
@@ -3,24 +3,34 @@
 from contextlib import nullcontext
 
 from circuit import Circuit
+from DC_Powerflow import get_dc_powerflow
+from Telemetry import logger
 from Bus import Bus
 from Geometry import Geometry
 from Conductor import Conductor
 from Bundle import Bundle
-from Settings import Settings
 
 import numpy as np
 import pandas as pd
 
-s=Settings()
+START_MODES = ("flat", "previous", "vector", "dc")
+
 
 class Powerflow:
-    def __init__(self, circuit: Circuit):
+    def __init__(self, circuit: Circuit, start: str = "flat", v0=None):
+        """:param start: Start mode of the bus voltages, see initialize."""
         # Load in data from sample circuit
         self.circuit = circuit
+        self.p_spec = None
+        self.q_spec = None
 
-        # Should start from flat start: all bus voltages are 1.0 and 0 angle by default
-        self.flat_start()
+        #Bus type index arrays and specified injections are computed once
+        if self.circuit.pvpq_indices is None:
+            self.circuit.calc_bus_indices()
+        self.calc_specified_power()
+
+        # Flat start by default: all bus voltages are 1.0 and 0 angle
+        self.initialize(start, v0)
 
         #Calculate Power injection for buses
         p_injected,q_injected = self.calc_PQ()
@@ -30,43 +40,83 @@ class Powerflow:
 
 
 
+    def initialize(self, start: str = "flat", v0=None):
+        """
+        Set the starting bus voltages of a solve.
+
+        "flat" starts from 1.0 pu and 0 angle, "previous" from the voltages already in the
+        circuit (the last solution), "vector" from the complex bus voltages v0 ordered by bus
+        index, and "dc" from flat magnitudes with the angles of a DC power flow. In every mode
+        the PV and slack bus magnitudes are set to their setpoints.
+        """
+        bus_table = self.circuit.bus_table
+        if start == "flat":
+            self.flat_start()
+        elif start == "previous":
+            if not (np.all(np.isfinite(bus_table["vpu"])) and np.all(np.isfinite(bus_table["delta"]))):
+                logger.warning("Previous solution has non-finite voltages, using a flat start")
+                self.flat_start()
+            self.apply_voltage_setpoints()
+        elif start == "vector":
+            v0 = np.asarray(v0, dtype=complex) if v0 is not None else None
+            if v0 is None or v0.shape != (len(bus_table),):
+                raise ValueError(f"Start mode 'vector' needs v0 with one voltage per bus ({len(bus_table)})")
+            if not np.all(np.isfinite(v0)) or np.any(v0 == 0):
+                raise ValueError("v0 must contain finite, nonzero voltages")
+            bus_table["vpu"][:] = np.abs(v0)
+            bus_table["delta"][:] = np.angle(v0)
+            self.apply_voltage_setpoints()
+        elif start == "dc":
+            self.dc_start()
+        else:
+            raise ValueError(f"Unknown start mode: {start}, expected one of {', '.join(START_MODES)}")
+
+    def apply_voltage_setpoints(self):
+        bus_table = self.circuit.bus_table
+        regulated = np.concatenate((self.circuit.slack_indices, self.circuit.pv_indices))
+        bus_table["vpu"][regulated] = bus_table["v_set"][regulated]
+
+    def dc_start(self):
+        """
+        Flat start magnitudes with the angles of a DC power flow (lossless branches, 1 pu voltages,
+        taps ignored). Usually saves an iteration or two on heavily loaded networks.
+        """
+        self.flat_start()
+        #The factorized B matrix is cached on the circuit, so repeated DC starts only solve
+        self.circuit.bus_table["delta"][:] = get_dc_powerflow(self.circuit).calc_angles(self.p_spec)
+
     def flat_start(self):
-        for bus in self.circuit.buses.values():
-            bus.delta = 0
-            bus.vpu = 1.0
+        #PQ buses start at 1.0 pu, PV and slack buses at their generator voltage setpoint
+        bus_table = self.circuit.bus_table
+        bus_table["delta"][:] = 0
+        bus_table["vpu"][:] = 1.0
+        bus_table["vpu"][self.circuit.slack_indices] = bus_table["v_set"][self.circuit.slack_indices]
+        bus_table["vpu"][self.circuit.pv_indices] = bus_table["v_set"][self.circuit.pv_indices]
+
+    def calc_specified_power(self):
+        """
+        Precompute the specified per-unit P and Q injection vectors, ordered by bus index.
+        Every bus injects its generator MW setpoint minus its load; Q is only specified at PQ buses.
+        """
+        bus_table = self.circuit.bus_table
+        base_power = self.circuit.settings.base_power
+        self.p_spec = (bus_table["p_gen"] - bus_table["p_load"])/base_power
+        self.q_spec = np.zeros(len(bus_table), dtype=np.float64)
+
+        pq = self.circuit.pq_indices
+        self.p_spec[self.circuit.slack_indices] = 0
+        self.q_spec[pq] = -bus_table["q_load"][pq]/base_power
 
     def calc_PQ(self):
-        # Initialize real and reactive power array and running totals
-        p_calc = np.zeros(len(self.circuit.buses), dtype=np.float64)
-        p_k = 0
+        #Complex power injected at every bus in one sparse mat-vec
+        s_injected = calc_injections(self.circuit.ybus, self.circuit.get_voltage_vector())
 
-        q_calc = np.zeros(len(self.circuit.buses), dtype=np.float64)
-        q_k = 0
+        return s_injected.real, s_injected.imag
 
-        #Create list of bus names
+    def print_PQ(self, p_calc, q_calc):
+        # Create list of bus names
         bus_names = list(self.circuit.buses.keys())
 
-        for k in range(0, len(self.circuit.buses)):
-            bus_k = self.circuit.buses[bus_names[k]]
-            p_k = 0  # Reset for each bus k
-            q_k = 0  # Reset for each bus k
-
-            for m in range(0, len(self.circuit.buses)):
-                bus_m = self.circuit.buses[bus_names[m]]
-                y_bus_km = self.circuit.ybus[k][m]
-                y_bus_theta_km = np.angle(y_bus_km)
-
-                #Calc real and reactive power for current k and m indexes
-                p_k += bus_k.vpu * bus_m.vpu * abs(y_bus_km)*np.cos(bus_k.delta - bus_m.delta - y_bus_theta_km)
-                q_k += bus_k.vpu * bus_m.vpu * abs(y_bus_km)*np.sin(bus_k.delta - bus_m.delta - y_bus_theta_km)
-
-            #store values for current iteration
-            p_calc[k] = p_k
-            q_calc[k] = q_k
-
-        #print(p_calc)
-        #print(q_calc)
-
         # Print real values only
         results_df = pd.DataFrame(
             [np.round(p_calc.real, 4), np.round(q_calc.real, 4)],  # Use .real to discard imaginary part
@@ -75,67 +125,60 @@ class Powerflow:
         )
         print(results_df)
 
-
-
-        return p_calc, q_calc
-
     def calc_mismatch(self, p_injected, q_injected):
-        p_mismatch = np.zeros(len(self.circuit.buses))
-        q_mismatch = np.zeros(len(self.circuit.buses))
-
-        non_slack_indeces = []
-        pq_indeces = []
+        if self.p_spec is None:
+            self.calc_specified_power()
 
-        # Create list of bus names
-        bus_names = list(self.circuit.buses.keys())
+        pvpq = self.circuit.pvpq_indices
+        pq = self.circuit.pq_indices
 
+        #Mismatch is [P of non-slack buses, Q of PQ buses]
+        p_mismatch = self.p_spec[pvpq] - p_injected[pvpq]
+        q_mismatch = self.q_spec[pq] - q_injected[pq]
 
-        for k in range(0, len(self.circuit.buses)):
-            bus_k = self.circuit.buses[bus_names[k]]
-            if bus_k.bus_type == "Slack_Bus":
-                p_mismatch[k] = None
-                q_mismatch[k] = None
+        mismatch = np.concatenate((p_mismatch, q_mismatch)).reshape(-1, 1)
 
-            elif bus_k.bus_type == "PQ_Bus":
-                p_mismatch[k] = -self.circuit.buses[bus_names[k]].load.real_power/s.base_power - p_injected[k]
-                q_mismatch[k] = -self.circuit.buses[bus_names[k]].load.reactive_power/s.base_power - q_injected[k]
-                non_slack_indeces.append(k)
-                pq_indeces.append(k)
-
-            elif bus_k.bus_type == "PV_Bus":
-                p_mismatch[k] = self.circuit.buses[bus_names[k]].generator.mw_setpoint/s.base_power - p_injected[k]
-                q_mismatch[k] = None
-                non_slack_indeces.append(k)
-
-            else:
-                print("Not valid bus type")
-
-
-        ##Print mismatch matrices in a dataframe
-        mismatch_df = pd.DataFrame(
-            [np.round(p_mismatch, 4), np.round(q_mismatch, 4)],
-            index=["P Mismatch (MW)", "Q Mismatch (MVAR)"],
-            columns=bus_names,
-        )
-        #print(mismatch_df,"\n")
-
-
-
-        #print ("Non-slack indeces:", non_slack_indeces, "\n")
-        #print ("PQ indeces:", pq_indeces, "\n")
+        return mismatch
 
-        p_mismatch = p_mismatch[non_slack_indeces]
-        q_mismatch = q_mismatch[pq_indeces]
 
-        mismatch = np.concatenate((p_mismatch.reshape(-1, 1), q_mismatch.reshape(-1, 1)), axis=0)
+def save_snapshot(circuit: Circuit, path: str, **metadata):
+    """
+    Save the bus voltages of circuit to a .npz snapshot, keyed by bus name so it can warm-start
+    other runs and processes (see load_snapshot). metadata (e.g. converged=True) is stored alongside.
+    """
+    np.savez(path, bus_names=np.array(circuit.bus_table.names, dtype=str), vpu=circuit.bus_table["vpu"],
+             delta=circuit.bus_table["delta"], base_power=circuit.settings.base_power,
+             **{key: np.asarray(value) for key, value in metadata.items()})
 
-        #print(mismatch,"\n")
 
-        return mismatch
+def load_snapshot(circuit: Circuit, path: str):
+    """
+    Read a .npz snapshot written by save_snapshot and return its complex bus voltages ordered by
+    the bus index of circuit, for start="vector". Buses are matched by name; buses missing from
+    the snapshot start at 1.0 pu and 0 angle.
+    """
+    with np.load(path, allow_pickle=False) as snapshot:
+        position = {name: k for k, name in enumerate(snapshot["bus_names"].tolist())}
+        v_snapshot = snapshot["vpu"] * np.exp(1j * snapshot["delta"])
 
+    rows = np.array([position.get(name, -1) for name in circuit.bus_table.names], dtype=np.int64)
+    missing = np.count_nonzero(rows < 0)
+    if missing == len(rows) and len(rows) > 0:
+        raise ValueError(f"Snapshot {path} has none of the buses of circuit {circuit.name}")
+    if missing:
+        logger.warning("Snapshot %s has no voltage for %d buses, they start at 1.0 pu", path, missing)
+    return np.where(rows >= 0, v_snapshot[np.maximum(rows, 0)], 1.0 + 0j)
 
 
+def calc_injections(ybus, v):
+    """
+    Complex power injections S = V * conj(Ybus V) for all buses.
 
+    :param ybus: Sparse n x n bus admittance matrix.
+    :param v: Complex bus voltage vector (length n).
+    :return: Complex injection vector (length n), in per-unit.
+    """
+    return v * np.conj(ybus @ v)
 
 
 if __name__ == "__main__":
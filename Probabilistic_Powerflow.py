@@ -0,0 +1,352 @@
+# Monte Carlo probabilistic load flow: bus voltage and branch flow distributions under uncertain loads
+# Samples are drawn and solved chunk by chunk on a process pool, every chunk with its own seed;
+# each chunk is reduced to running statistics and histograms, which are merged as the chunks come back
+from concurrent.futures import ProcessPoolExecutor
+
+from circuit import Circuit
+from Powerflow import Powerflow
+from Newton_Raphson import solve_arrays
+from Worker_Pool import init_worker, get_worker_case, new_linear_solver
+from Telemetry import logger
+
+import numpy as np
+import pandas as pd
+
+#Default histogram bins: 0.0025 pu of voltage and 2 % of loading, percentiles are interpolated inside a bin.
+#Coarse on purpose, a chunk's statistics must stay far smaller than its raw samples
+VOLTAGE_BINS = np.linspace(0.8, 1.2, 161)
+LOADING_BINS = np.linspace(0.0, 2.0, 101)
+
+
+class Running_Statistics:
+    """
+    Count, mean, variance (Welford), minimum, maximum and a fixed-bin histogram of every column
+    of a stream of sample blocks. Two instances over different samples merge into the statistics
+    of all of them, so blocks can be reduced separately. Percentiles come from the histogram and
+    are exact to within one bin; values outside the bins count in the first or last one, which are
+    then taken to reach out to the minimum or maximum. With
+    bins None no histogram is kept.
+    """
+
+    def __init__(self, num_columns: int, bins):
+        self.bins = None if bins is None else np.asarray(bins, dtype=np.float64)
+        self.count = np.zeros(num_columns, dtype=np.int64)
+        self.mean = np.zeros(num_columns)
+        self.m2 = np.zeros(num_columns)
+        self.min = np.full(num_columns, np.inf)
+        self.max = np.full(num_columns, -np.inf)
+        self.histogram = None if bins is None else np.zeros((num_columns, len(self.bins) - 1), dtype=np.int32)
+
+    def update(self, values):
+        """Add a block of samples (samples x columns); NaN entries are skipped."""
+        values = np.atleast_2d(values)
+        valid = ~np.isnan(values)
+        block = Running_Statistics(values.shape[1], self.bins)
+        block.count = valid.sum(axis=0)
+        filled = np.where(valid, values, 0.0)
+        block.mean = np.divide(filled.sum(axis=0), block.count, out=np.zeros(values.shape[1]), where=block.count > 0)
+        block.m2 = (np.where(valid, values - block.mean, 0.0)**2).sum(axis=0)
+        block.min = np.where(valid, values, np.inf).min(axis=0, initial=np.inf)
+        block.max = np.where(valid, values, -np.inf).max(axis=0, initial=-np.inf)
+
+        if self.bins is None:
+            self.merge(block)
+            return
+
+        #One bincount over (column, bin) pairs instead of a histogram per column
+        columns = np.broadcast_to(np.arange(values.shape[1]), values.shape)[valid]
+        bin_index = np.clip(np.searchsorted(self.bins, values[valid], side="right") - 1, 0, len(self.bins) - 2)
+        block.histogram = np.bincount(columns * (len(self.bins) - 1) + bin_index, minlength=block.histogram.size
+                                      ).astype(np.int32).reshape(block.histogram.shape)
+        self.merge(block)
+
+    def merge(self, other):
+        """Combine with the statistics of other samples (Chan's parallel variance update)."""
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        weight = np.divide(other.count, count, out=np.zeros(len(count)), where=count > 0)
+        self.mean = self.mean + delta * weight
+        self.m2 = self.m2 + other.m2 + delta**2 * self.count * weight
+        self.count = count
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+        if self.histogram is not None:
+            self.histogram += other.histogram
+
+    def std(self):
+        return np.sqrt(np.divide(self.m2, self.count - 1, out=np.full(len(self.m2), np.nan), where=self.count > 1))
+
+    def percentile(self, q: float):
+        """q-th percentile of every column, interpolated linearly inside its histogram bin."""
+        cumulative = np.cumsum(self.histogram, axis=1)
+        target = q / 100 * self.count
+        k = np.minimum((cumulative < target[:, None]).sum(axis=1), self.histogram.shape[1] - 1)
+        below = np.where(k > 0, cumulative[np.arange(len(k)), k - 1], 0)
+        in_bin = self.histogram[np.arange(len(k)), k]
+        fraction = np.divide(target - below, in_bin, out=np.zeros(len(k)), where=in_bin > 0)
+        #Values outside the bins are counted in the end bins, which then reach out to the minimum and maximum
+        lower = np.where(k == 0, np.minimum(self.bins[0], self.min), self.bins[k])
+        upper = np.where(k == len(self.bins) - 2, np.maximum(self.bins[-1], self.max), self.bins[k + 1])
+        value = np.clip(lower + fraction * (upper - lower), self.min, self.max)
+        return np.where(self.count > 0, value, np.nan)
+
+
+def draw_loads(rng, base_case, num_samples: int):
+    """
+    Draw num_samples load scenarios (samples x loads) in MW and MVAR from the normal distributions
+    around the base case loads, correlated between loads as given by the Cholesky factor.
+    """
+    p_base, q_base = base_case["p_load"], base_case["q_load"]
+
+    def correlated_normal():
+        z = rng.standard_normal((num_samples, len(p_base)))
+        if base_case["cholesky"] is not None:
+            z = z @ base_case["cholesky"].T
+        return z
+
+    p_load = p_base + base_case["p_std"] * correlated_normal()
+    if base_case["q_std"] is None:
+        #Constant power factor: Q follows P
+        ratio = np.divide(q_base, p_base, out=np.zeros(len(p_base)), where=p_base != 0)
+        q_load = p_load * ratio
+    else:
+        q_load = q_base + base_case["q_std"] * correlated_normal()
+    return p_load, q_load
+
+
+def solve_chunk(base_case, seed, num_samples: int):
+    """
+    Draw and solve one chunk of samples, each warm-started from the previous one, and return its
+    statistics: (vpu, loading, p_flow) Running_Statistics and the violation and failure counts.
+    Samples refactor the Jacobian until one of the chunk converges, so a chunk never reuses a
+    factorization left by the worker's previous chunk and its results depend only on its seed.
+    """
+    rng = np.random.default_rng(seed)
+    p_loads, q_loads = draw_loads(rng, base_case, num_samples)
+    n = len(base_case["v"])
+    rows = base_case["load_rows"]
+    base_power = base_case["base_power"]
+
+    vpu = np.full((num_samples, n), np.nan)
+    num_branches = len(base_case["ratings"])
+    loading = np.full((num_samples, num_branches), np.nan)
+    p_flow = np.full((num_samples, num_branches), np.nan)
+
+    v = base_case["v"]
+    factored = False
+    for k in range(num_samples):
+        p_spec = base_case["p_spec"] + np.bincount(rows, base_case["p_load"] - p_loads[k], n) / base_power
+        q_spec = base_case["q_spec"] + np.bincount(rows, base_case["q_load"] - q_loads[k], n) / base_power
+        p_spec[base_case["slack"]] = 0
+        try:
+            v_new, converged, _ = solve_arrays(base_case["ybus"], v, p_spec, q_spec, base_case["pvpq"],
+                                               base_case["pq"], base_case["tol"], base_case["max_iter"],
+                                               base_case["linear_solver"], reuse_factorization=factored)
+        except RuntimeError:
+            converged = False
+        if not converged:
+            continue
+
+        v = v_new
+        factored = True
+        vpu[k] = np.abs(v)
+        s_from, s_to = Circuit.calc_branch_flows(base_case["branch_from"], base_case["branch_to"],
+                                                 base_case["branch_yprim"], v)
+        loading[k] = np.maximum(np.abs(s_from), np.abs(s_to)) * base_power / base_case["ratings"]
+        p_flow[k] = s_from.real * base_power
+
+    v_min, v_max = base_case["voltage_limits"]
+    result = {
+        "vpu": Running_Statistics(n, base_case["voltage_bins"]),
+        "loading": Running_Statistics(num_branches, base_case["loading_bins"]),
+        "p_flow": Running_Statistics(num_branches, None),
+        "under_voltage": np.count_nonzero(vpu < v_min, axis=0),
+        "over_voltage": np.count_nonzero(vpu > v_max, axis=0),
+        "overload": np.count_nonzero(loading > base_case["loading_limit"], axis=0),
+        "failed": int(np.isnan(vpu[:, 0]).sum()),
+    }
+    result["vpu"].update(vpu)
+    result["loading"].update(loading)
+    result["p_flow"].update(p_flow)
+    return result
+
+
+def run_worker(task):
+    return solve_chunk(get_worker_case(), *task)
+
+
+class Probabilistic_Powerflow:
+    def __init__(self, circuit: Circuit, p_std=0.1, q_std=None, correlation=0.0, tol: float = 1e-6,
+                 max_iter: int = 20, max_workers: int = None, voltage_limits=(0.95, 1.05),
+                 loading_limit: float = 1.0, voltage_bins=VOLTAGE_BINS, loading_bins=LOADING_BINS):
+        """
+        Every load is normally distributed around its base case value.
+
+        :param p_std: Standard deviation of the real power of every load as a fraction of its base
+            value, a scalar or one value per load (in circuit.loads order).
+        :param q_std: Same for the reactive power, drawn separately. None keeps every load at its
+            base case power factor.
+        :param correlation: Correlation between the loads, a scalar for all pairs or a loads x loads matrix.
+        :param max_workers: Size of the process pool, defaults to the number of CPUs.
+        :param voltage_limits: (low, high) pu limits of the under- and over-voltage probabilities.
+        :param loading_limit: Branch loading (fraction of rating) above which a branch counts as overloaded.
+        :param voltage_bins: Edges of the voltage magnitude histograms the percentiles come from, loading_bins
+            likewise. Every bus (branch) keeps one count per bin, so finer bins cost memory in every chunk.
+        """
+        self.circuit = circuit
+        self.max_workers = max_workers
+        circuit.calc_y_admit()
+        powerflow = Powerflow(circuit, "previous")
+
+        self.load_names = list(circuit.loads)
+        load_rows = np.array([load.bus_index for load in circuit.loads.values()], dtype=np.int64)
+        p_load = circuit.bus_table["p_load"][load_rows].copy()
+        q_load = circuit.bus_table["q_load"][load_rows].copy()
+        num_loads = len(load_rows)
+
+        p_std = np.broadcast_to(np.asarray(p_std, dtype=np.float64), (num_loads,)) * np.abs(p_load)
+        if q_std is not None:
+            q_std = np.broadcast_to(np.asarray(q_std, dtype=np.float64), (num_loads,)) * np.abs(q_load)
+        if np.any(p_std < 0) or (q_std is not None and np.any(q_std < 0)):
+            raise ValueError("Load standard deviations must not be negative")
+
+        self.base_case = {
+            "ybus": circuit.ybus,
+            "v": circuit.get_voltage_vector(),
+            "p_spec": powerflow.p_spec,
+            "q_spec": powerflow.q_spec,
+            "pvpq": circuit.pvpq_indices,
+            "pq": circuit.pq_indices,
+            "slack": circuit.slack_indices,
+            "jacobian_ordering": circuit.get_ordering(circuit.pvpq_indices, circuit.pq_indices),
+            "ordering_method": circuit.ordering_method,
+            "load_rows": load_rows,
+            "p_load": p_load,
+            "q_load": q_load,
+            "p_std": p_std,
+            "q_std": q_std,
+            "cholesky": self.calc_cholesky(correlation, num_loads),
+            "branch_from": circuit.branch_from,
+            "branch_to": circuit.branch_to,
+            "branch_yprim": circuit.branch_yprim,
+            "ratings": circuit.get_branch_ratings(),
+            "base_power": circuit.settings.base_power,
+            "voltage_limits": voltage_limits,
+            "loading_limit": loading_limit,
+            "voltage_bins": np.asarray(voltage_bins, dtype=np.float64),
+            "loading_bins": np.asarray(loading_bins, dtype=np.float64),
+            "tol": tol,
+            "max_iter": max_iter,
+        }
+
+        self.num_samples = 0
+        self.num_failed = 0
+        self.vpu = None
+        self.loading = None
+        self.p_flow = None
+        self.under_voltage = None
+        self.over_voltage = None
+        self.overload = None
+
+    @staticmethod
+    def calc_cholesky(correlation, num_loads: int):
+        """Cholesky factor of the load correlation matrix, None for independent loads."""
+        correlation = np.asarray(correlation, dtype=np.float64)
+        if correlation.ndim == 0:
+            if correlation == 0:
+                return None
+            correlation = np.full((num_loads, num_loads), float(correlation))
+            np.fill_diagonal(correlation, 1.0)
+        if correlation.shape != (num_loads, num_loads):
+            raise ValueError(f"The correlation matrix must be {num_loads} x {num_loads}, got {correlation.shape}")
+        try:
+            return np.linalg.cholesky(correlation)
+        except np.linalg.LinAlgError as error:
+            raise ValueError("The correlation matrix must be symmetric positive definite") from error
+
+    def get_tasks(self, num_samples: int, chunk_size: int, seed):
+        """
+        (seed, size) of every chunk. Seeds are spawned per chunk, so the samples do not depend
+        on the number of workers or on which worker solves which chunk.
+        """
+        sizes = [min(chunk_size, num_samples - start) for start in range(0, num_samples, chunk_size)]
+        return list(zip(np.random.SeedSequence(seed).spawn(len(sizes)), sizes))
+
+    def add_chunk(self, result):
+        """Merge the statistics of one solved chunk."""
+        if self.vpu is None:
+            self.vpu, self.loading, self.p_flow = result["vpu"], result["loading"], result["p_flow"]
+            self.under_voltage, self.over_voltage = result["under_voltage"], result["over_voltage"]
+            self.overload = result["overload"]
+        else:
+            self.vpu.merge(result["vpu"])
+            self.loading.merge(result["loading"])
+            self.p_flow.merge(result["p_flow"])
+            self.under_voltage = self.under_voltage + result["under_voltage"]
+            self.over_voltage = self.over_voltage + result["over_voltage"]
+            self.overload = self.overload + result["overload"]
+        self.num_failed += result["failed"]
+
+    def run(self, num_samples: int, chunk_size: int = 500, seed=0):
+        """
+        Solve num_samples load scenarios on a process pool. Chunks are merged in order as they
+        complete, so the statistics are the same for any number of workers.
+        """
+        tasks = self.get_tasks(num_samples, chunk_size, seed)
+        with ProcessPoolExecutor(max_workers=self.max_workers, initializer=init_worker,
+                                 initargs=(self.base_case,)) as pool:
+            for result in pool.map(run_worker, tasks):
+                self.add_chunk(result)
+        self.finish(num_samples)
+        return self
+
+    def run_serial(self, num_samples: int, chunk_size: int = 500, seed=0):
+        """Same as run, in the calling process. Useful for small cases and debugging."""
+        base_case = dict(self.base_case, linear_solver=new_linear_solver(self.base_case))
+        for task in self.get_tasks(num_samples, chunk_size, seed):
+            self.add_chunk(solve_chunk(base_case, *task))
+        self.finish(num_samples)
+        return self
+
+    def finish(self, num_samples: int):
+        self.num_samples += num_samples
+        if self.num_failed:
+            logger.warning("%d of %d samples did not converge and are left out of the statistics",
+                           self.num_failed, self.num_samples)
+
+    def bus_results(self, percentiles=(5, 50, 95)):
+        """Voltage magnitude distribution and limit violation probabilities of every bus."""
+        converged = max(self.num_samples - self.num_failed, 1)
+        results = pd.DataFrame({"mean": self.vpu.mean, "std": self.vpu.std(), "min": self.vpu.min},
+                               index=pd.Index(self.circuit.bus_table.names, name="bus"))
+        for q in percentiles:
+            results[f"p{q:g}"] = self.vpu.percentile(q)
+        results["max"] = self.vpu.max
+        results["p_under_voltage"] = self.under_voltage / converged
+        results["p_over_voltage"] = self.over_voltage / converged
+        return results
+
+    def branch_results(self, percentiles=(5, 50, 95)):
+        """Real power flow (MW, from end) and loading (fraction of rating) distribution of every branch."""
+        converged = max(self.num_samples - self.num_failed, 1)
+        results = pd.DataFrame({"p_mean": self.p_flow.mean, "p_std": self.p_flow.std(),
+                                "loading_mean": self.loading.mean, "loading_std": self.loading.std()},
+                               index=pd.Index(self.circuit.branch_names, name="branch"))
+        for q in percentiles:
+            results[f"loading_p{q:g}"] = self.loading.percentile(q)
+        results["loading_max"] = self.loading.max
+        results["p_overload"] = self.overload / converged
+        return results
+
+
+if __name__ == "__main__":
+    import time
+    from Grid_Generator import generate_grid
+
+    circuit = generate_grid(200)
+    for workers in (1, 4):
+        start = time.perf_counter()
+        ppf = Probabilistic_Powerflow(circuit, p_std=0.1, correlation=0.3, max_workers=workers).run(2000)
+        print(f"{workers} worker(s): {ppf.num_samples} samples in {time.perf_counter() - start:.2f} s")
+    print(ppf.bus_results().sort_values("p5").head())
+    print(ppf.branch_results().sort_values("loading_p95", ascending=False).head())
@@ -2,8 +2,29 @@
 
 class Settings:
     def __init__(self, frequency:float=60, base_power:float=100):
-        self.frequency = frequency  #Value in Hz
-        self.base_power = base_power    #Value in MVA
+        self._frequency = frequency  #Value in Hz
+        self._base_power = base_power    #Value in MVA
+        self.version = 0    #Incremented whenever frequency or base power change, so dependent caches can rebuild
+
+    @property
+    def frequency(self):
+        return self._frequency
+
+    @frequency.setter
+    def frequency(self, value:float):
+        if value != self._frequency:
+            self._frequency = value
+            self.version += 1
+
+    @property
+    def base_power(self):
+        return self._base_power
+
+    @base_power.setter
+    def base_power(self, value:float):
+        if value != self._base_power:
+            self._base_power = value
+            self.version += 1
 
     def get_frequency(self):
         return self.frequency
@@ -11,4 +32,5 @@ class Settings:
     def get_base_power(self):
         return self.base_power
 
+#Default settings for elements created outside a Circuit, each Circuit has its own Settings instance
 s=Settings()
\ No newline at end of file
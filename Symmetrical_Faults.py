@@ -1,73 +1,176 @@
 import numpy as np
+import scipy.linalg as la
+import scipy.sparse as sp
 from circuit import Circuit
 from Bus import Bus
 from Conductor import Conductor
 from Bundle import Bundle
 from Geometry import Geometry
 import pandas as pd
+from LinearSolver import SuperLUSolver, LowRankUpdatedSolver
 
 class Fault:
 
-    def __init__(self, circuit:Circuit,bus_fault):
+    def __init__(self, circuit:Circuit,bus_fault=None,max_update_rank:int=32):
         self.circuit = circuit
-        self.bus_fault = circuit.buses[bus_fault]
+        self.bus_fault = circuit.buses[bus_fault] if bus_fault is not None else None
         self.zbus=None
+        self.zbus_column=None
         self.fault_current=None
         self.fault_voltages=None
+        self.linear_solver=None
+        self.max_update_rank=max_update_rank  #Refactorize instead of updating once the accumulated rank exceeds this
 
 
-    def calc_fault(self):
-
-        y_bus=self.circuit.ybus
-
-
-        for bus in self.circuit.buses.keys():
-            if(self.circuit.buses[bus].bus_type == "PV_Bus"):
-                pv_index=self.circuit.buses[bus].index
-            elif (self.circuit.buses[bus].bus_type == "Slack_Bus"):
-                slack_index=self.circuit.buses[bus].index
-
-        pv_bus_name=f"bus{pv_index+1}"
-        slack_bus_name=f"bus{slack_index+1}"
-
-        gen_pv=self.circuit.buses[pv_bus_name].generator
-        gen_slack=self.circuit.buses[slack_bus_name].generator
-
-        y_bus[pv_index,pv_index]+= (gen_pv.sub_trans)**(-1)
-        #y_bus[pv_index-1,pv_index]+= (gen_pv.sub_trans)**(-1)
-        #y_bus[pv_index,pv_index-1]+= (gen_pv.sub_trans)**(-1)
-
-
-        y_bus[slack_index,slack_index]+= (gen_slack.sub_trans)**(-1)
-        #y_bus[slack_index+1,slack_index]+= (gen_slack.sub_trans)**(-1)
-        #y_bus[slack_index,slack_index+1]+= (gen_slack.sub_trans)**(-1)
-
-
-        self.circuit.ybus=y_bus
-        z_bus=np.zeros_like(y_bus)
-
-        z_bus=np.linalg.inv(y_bus)
-
-        self.zbus=z_bus
-
-        for bus in self.circuit.buses:
-            self.circuit.buses[bus].vpu=1
+    def calc_fault(self, v_prefault:float=1.0):
+        """
+        Bolted three-phase fault at bus_fault. Neither the power-flow Y-bus nor the
+        bus voltages are modified; every bus is assumed to be at v_prefault before the fault.
+        """
+        self.factorize()
 
         n=self.bus_fault.index
-        self.fault_current=self.bus_fault.vpu/z_bus[n,n]
-
-        self.fault_voltages=np.zeros((1,len(self.circuit.buses)),dtype=complex)
-        for bus in self.circuit.buses:
-            k=self.circuit.buses[bus].index
+        z_col=self.calc_zbus_column(n)
+        self.zbus_column=z_col
+        self.fault_current=v_prefault/z_col[n]
 
-            zkn=z_bus[k,n]
-            znn=z_bus[n,n]
-            Vf=self.circuit.buses[bus].vpu
-            faultVoltage=(1-(zkn/znn))*Vf
-            self.fault_voltages[0,k]=(1-(zkn/znn))*Vf
+        #Post-fault voltages of every bus k: (1 - Zkn/Znn) * Vf
+        self.fault_voltages=((1-(z_col/z_col[n]))*v_prefault).reshape(1,-1)
 
         print("\nFault Current: ",abs(self.fault_current))
 
+    def factorize(self):
+        """
+        Use the circuit's cached generator-augmented Y-bus factorization. If only branch
+        edits happened since it was built they are applied as low-rank updates (to the
+        factorization and to a cached Z-bus), otherwise it is rebuilt.
+        """
+        cache=self.circuit.fault_cache
+        if cache is not None and cache["version"]!=self.circuit.topology_version:
+            changes=self.circuit.get_topology_changes(cache["version"])
+            if changes is not None and cache["linear_solver"].rank+2*len(changes)<=self.max_update_rank:
+                self.apply_topology_changes(cache, changes)
+            else:
+                cache=None
+
+        if cache is None:
+            y_aug=self.calc_augmented_ybus()
+            linear_solver=SuperLUSolver()
+            linear_solver.set_ordering(self.circuit.get_ordering(np.arange(y_aug.shape[0])),self.circuit.ordering_method)
+            linear_solver.factor(y_aug)
+            cache={"version":self.circuit.topology_version,"linear_solver":LowRankUpdatedSolver(linear_solver),"zbus":None}
+            self.circuit.fault_cache=cache
+
+        self.linear_solver=cache["linear_solver"]
+        self.zbus=cache["zbus"]
+
+    def apply_topology_changes(self, cache, changes):
+        """Rank-k update of the cached factorization and Z-bus for a list of (i, j, delta_y) branch edits."""
+        indices=np.array([bus for i,j,_ in changes for bus in (i,j)],dtype=np.int64)
+        c_matrix=la.block_diag(*[delta_y for _,_,delta_y in changes])
+
+        #Z_new = Z - Z U C (I + U^T Z U C)^-1 U^T Z, using the Z-bus before the changes
+        if cache["zbus"] is not None:
+            zbus=cache["zbus"]
+            z_u_c=zbus[:,indices]@c_matrix
+            inner=np.eye(len(indices))+z_u_c[indices,:]
+            cache["zbus"]=zbus-z_u_c@np.linalg.solve(inner,zbus[indices,:])
+
+        cache["linear_solver"].add_update(indices,c_matrix)
+        cache["version"]=self.circuit.topology_version
+
+    def calc_augmented_ybus(self):
+        """Return a new sparse matrix: the Y-bus plus the subtransient admittance of every generator."""
+        if self.circuit.ybus is None or self.circuit.ybus_version!=self.circuit.topology_version:
+            self.circuit.calc_y_admit()
+
+        #Subtransient admittances straight from the bus table column, NaN where a bus has no generator
+        sub_trans=self.circuit.bus_table["sub_trans"]
+        gen_indices=np.flatnonzero(~np.isnan(sub_trans))
+        y_gen=np.zeros(len(sub_trans),dtype=complex)
+        np.add.at(y_gen,gen_indices,1/sub_trans[gen_indices])
+        return (self.circuit.ybus+sp.diags(y_gen,format="csr")).tocsc()
+
+    def calc_zbus_column(self, n):
+        """Return column n of the Z-bus by solving Ybus * z = e_n with the cached factorization."""
+        unit=np.zeros(len(self.circuit.buses),dtype=complex)
+        unit[n]=1
+        return self.linear_solver.solve(unit)
+
+    def iter_fault_sweep(self, bus_names=None, chunk_size:int=256, v_prefault:float=1.0):
+        """
+        Bolted faults at many buses from a single factorization, processed in chunks.
+
+        Yields (fault_indices, fault_currents, fault_voltages) per chunk, where fault_voltages
+        is a (chunk x n) array of post-fault bus voltages for each faulted bus. Only one
+        n x chunk block of Z-bus columns is held in memory at a time.
+
+        :param bus_names: Buses to fault, all buses by default.
+        :param v_prefault: Pre-fault voltage in per-unit, applied to every bus.
+        """
+        self.factorize()
+
+        n_bus=len(self.circuit.buses)
+        if bus_names is None:
+            fault_indices=np.arange(n_bus)
+        else:
+            fault_indices=np.array([self.circuit.buses[name].index for name in bus_names],dtype=np.int64)
+
+        for start in range(0,len(fault_indices),chunk_size):
+            chunk=fault_indices[start:start+chunk_size]
+            columns=np.arange(len(chunk))
+
+            #Z-bus columns of the faulted buses
+            unit=np.zeros((n_bus,len(chunk)),dtype=complex)
+            unit[chunk,columns]=1
+            z_cols=self.linear_solver.solve(unit)
+            z_nn=z_cols[chunk,columns]
+
+            fault_currents=v_prefault/z_nn
+            fault_voltages=((1-z_cols/z_nn)*v_prefault).T
+
+            yield chunk, fault_currents, fault_voltages
+
+    def calc_fault_sweep(self, bus_names=None, chunk_size:int=256, v_prefault:float=1.0):
+        """
+        Fault current and MVA for a bolted fault at every bus (or the given subset).
+
+        :return: Structured array with one row per faulted bus: bus name, fault current
+                 in per-unit and kA, fault MVA, and the minimum and maximum post-fault
+                 bus voltage magnitudes (per-unit).
+        """
+        names=np.array(self.circuit.bus_table.names)
+        base_kv=self.circuit.bus_table["base_kv"]
+        n_faults=len(names) if bus_names is None else len(bus_names)
+
+        dtype=[("bus",names.dtype),("fault_current_pu",float),("fault_current_ka",float),
+               ("fault_mva",float),("v_min",float),("v_max",float)]
+        results=np.zeros(n_faults,dtype=dtype)
+
+        row=0
+        for chunk, fault_currents, fault_voltages in self.iter_fault_sweep(bus_names, chunk_size, v_prefault):
+            rows=slice(row,row+len(chunk))
+            i_pu=np.abs(fault_currents)
+            v_mag=np.abs(fault_voltages)
+
+            results["bus"][rows]=names[chunk]
+            results["fault_current_pu"][rows]=i_pu
+            results["fault_current_ka"][rows]=i_pu*self.circuit.settings.base_power/(np.sqrt(3)*base_kv[chunk])
+            results["fault_mva"][rows]=i_pu*v_prefault*self.circuit.settings.base_power
+            results["v_min"][rows]=v_mag.min(axis=1)
+            results["v_max"][rows]=v_mag.max(axis=1)
+            row+=len(chunk)
+
+        return results
+
+    def calc_zbus(self):
+        """Build the full Z-bus from the factorization. Only needed for printing, costs O(n^2) memory."""
+        self.factorize()
+        if self.zbus is None:
+            self.zbus=self.linear_solver.solve(np.eye(len(self.circuit.buses),dtype=complex))
+            self.circuit.fault_cache["zbus"]=self.zbus
+        return self.zbus
+
 
 
     def print_fault_voltages(self):
@@ -77,28 +180,28 @@ class Fault:
 
         volt = pd.DataFrame(faultVoltages, columns=bus_names)
 
-        pd.set_option('display.max_rows', None)  # Show all rows
-        pd.set_option('display.max_columns', None)  # Show all columns
-        pd.set_option('display.width', 1000)  # Increase the display width
-        pd.set_option('display.float_format', lambda x: f'{x.real:.5f}{x.imag:+.5f}j')
-        # Print the DataFrame
-        print("\n\nFault Voltages:")
-        print(volt)
+        with pd.option_context('display.max_rows', None,  # Show all rows
+                               'display.max_columns', None,  # Show all columns
+                               'display.width', 1000,  # Increase the display width
+                               'display.float_format', lambda x: f'{x.real:.5f}{x.imag:+.5f}j'):
+            # Print the DataFrame
+            print("\n\nFault Voltages:")
+            print(volt)
 
 
 
     def print_zbus(self):
         bus_names = list(self.circuit.buses.keys())
 
-        z_busdf = pd.DataFrame(self.zbus, index=bus_names, columns=bus_names)
+        z_busdf = pd.DataFrame(self.calc_zbus(), index=bus_names, columns=bus_names)
 
-        pd.set_option('display.max_rows', None)  # Show all rows
-        pd.set_option('display.max_columns', None)  # Show all columns
-        pd.set_option('display.width', 1000)  # Increase the display width
-        pd.set_option('display.float_format', lambda x: f'{x.real:.5f}{x.imag:+.5f}j')
-        # Print the DataFrame
-        print("\n\nz_bus")
-        print(z_busdf)
+        with pd.option_context('display.max_rows', None,  # Show all rows
+                               'display.max_columns', None,  # Show all columns
+                               'display.width', 1000,  # Increase the display width
+                               'display.float_format', lambda x: f'{x.real:.5f}{x.imag:+.5f}j'):
+            # Print the DataFrame
+            print("\n\nz_bus")
+            print(z_busdf)
 
 if __name__ == "__main__":
     circuit1 = Circuit("Circuit1")
@@ -0,0 +1,68 @@
+# Solver telemetry: per-phase wall-clock timers, mismatch history and iteration callbacks
+# Nothing is formatted in the solver loops; use summary() or the logging output after the solve
+import logging
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("powerflow")
+
+
+class SolverStats:
+    """
+    Statistics collected by a solver run.
+
+    timers maps a phase name (e.g. "ybus", "injections", "jacobian", "factorization",
+    "solve", "update") to accumulated seconds, mismatch_history holds the maximum absolute
+    mismatch at the start of every iteration. Each callback is called as
+    callback(stats, iteration, max_mismatch) once per iteration.
+    """
+
+    def __init__(self, solver_name: str, callbacks=None):
+        self.solver_name = solver_name
+        self.timers = {}
+        self.mismatch_history = []
+        self.iterations = 0
+        self.converged = False
+        self.callbacks = list(callbacks) if callbacks is not None else []
+
+    def reset(self, keep=()):
+        """Clear the statistics of the last run before a new one, keeping the timers of the setup phases in keep."""
+        self.timers = {phase: self.timers[phase] for phase in keep if phase in self.timers}
+        self.mismatch_history = []
+        self.iterations = 0
+        self.converged = False
+
+    @contextmanager
+    def timer(self, phase: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timers[phase] = self.timers.get(phase, 0.0) + time.perf_counter() - start
+
+    def record_iteration(self, iteration: int, max_mismatch: float):
+        self.mismatch_history.append(max_mismatch)
+        logger.debug("%s iteration %d: max mismatch %.3e", self.solver_name, iteration, max_mismatch)
+        for callback in self.callbacks:
+            callback(self, iteration, max_mismatch)
+
+    def finish(self, iterations: int, converged: bool):
+        self.iterations = iterations
+        self.converged = converged
+        if converged:
+            logger.info("%s converged in %d iterations (%.3f s)", self.solver_name, iterations, self.total_time())
+        else:
+            logger.warning("%s did not converge in %d iterations", self.solver_name, iterations)
+
+    def total_time(self):
+        return sum(self.timers.values())
+
+    def summary(self):
+        """Return a short multi-line text report of the run."""
+        lines = [f"{self.solver_name}: {'converged' if self.converged else 'not converged'} "
+                 f"after {self.iterations} iterations"]
+        for phase, seconds in self.timers.items():
+            lines.append(f"  {phase:<14}{seconds * 1000:10.3f} ms")
+        if self.mismatch_history:
+            lines.append("  max mismatch: " + ", ".join(f"{m:.2e}" for m in self.mismatch_history))
+        return "\n".join(lines)
@@ -0,0 +1,294 @@
+# Quasi-static time-series (QSTS) power flow driven by load and generation profiles
+# The profile is read chunk by chunk and every timestep is solved warm-started from the previous one;
+# results are yielded or written per chunk, so memory does not grow with the length of the horizon
+import os
+
+from circuit import Circuit
+from Powerflow import Powerflow, calc_injections
+from Newton_Raphson import solve_arrays
+from LinearSolver import get_linear_solver
+from NetworkTables import describe
+from Telemetry import SolverStats, logger
+
+import numpy as np
+import pandas as pd
+
+#Suffix of the profile columns holding the reactive power of a load, e.g. "Load_3:q"
+REACTIVE_SUFFIX = ":q"
+
+
+def read_profile(source, chunk_size: int = 10000, time_column: str = "time"):
+    """
+    Yield a profile as DataFrames of at most chunk_size timesteps.
+
+    :param source: Path of a .csv or .parquet file, a DataFrame, or an iterable of DataFrames
+        (e.g. another pipeline stage), which is passed through as it comes.
+    """
+    if isinstance(source, pd.DataFrame):
+        for start in range(0, len(source), chunk_size):
+            yield source.iloc[start:start + chunk_size]
+    elif isinstance(source, (str, os.PathLike)) and str(source).lower().endswith((".parquet", ".pq")):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as error:
+            raise ImportError("Reading Parquet profiles requires pyarrow") from error
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    elif isinstance(source, (str, os.PathLike)):
+        #The time column stays text so timestamps are passed through as written
+        yield from pd.read_csv(source, chunksize=chunk_size, skipinitialspace=True, dtype={time_column: str})
+    else:
+        yield from source
+
+
+class Time_Series_Powerflow:
+    def __init__(self, circuit: Circuit, tol: float = 0.001, max_iter: int = 20, linear_solver: str = "superlu",
+                 buses=None, time_column: str = "time", start: str = "flat", callbacks=None):
+        """
+        Profile columns are element names: a load column sets the load's real power in MW and its
+        reactive power keeps the base case power factor, unless a "<load>:q" column gives it in MVAR.
+        A generator column sets the generator's MW setpoint. Elements without a column keep their
+        setpoints, the time column (optional) is copied to the results.
+
+        :param buses: Names of the buses whose voltage magnitude is recorded every timestep, all by default.
+        :param start: Start mode of the first timestep, see Powerflow.initialize. Every later timestep
+            starts from the last converged one.
+        :param callbacks: Functions called as callback(stats, timestep, max_mismatch) after every
+            chunk, with the index of its first timestep and the largest final mismatch in it.
+        """
+        self.circuit = circuit
+        self.tol = tol
+        self.max_iter = max_iter
+        self.time_column = time_column
+        self.start = start
+        self.stats = SolverStats("Time series power flow", callbacks)
+
+        with self.stats.timer("ybus"):
+            circuit.calc_y_admit()
+        self.linear_solver = get_linear_solver(circuit, "jacobian", linear_solver,
+                                               (circuit.pvpq_indices, circuit.pq_indices))
+
+        self.bus_names = list(circuit.bus_table.names) if buses is None else list(buses)
+        self.bus_rows = circuit.get_bus_indices(np.array(self.bus_names, dtype=object))
+        if np.any(self.bus_rows < 0):
+            raise ValueError(f"Unknown buses: {describe(np.array(self.bus_names, dtype=object)[self.bus_rows < 0])}")
+
+        self.columns = None  #Profile header the element lookups below were built for
+        self.timesteps = 0
+        self.num_converged = 0
+
+    def map_columns(self, columns):
+        """Resolve the profile columns to load and generator bus rows, once per header."""
+        circuit = self.circuit
+        loads, reactive, generators, unknown = [], [], [], []
+        for column in columns:
+            if column == self.time_column:
+                continue
+            if column in circuit.loads:
+                loads.append(column)
+            elif column.endswith(REACTIVE_SUFFIX) and column[:-len(REACTIVE_SUFFIX)] in circuit.loads:
+                reactive.append(column)
+            elif column in circuit.generators:
+                generators.append(column)
+            else:
+                unknown.append(column)
+        if unknown:
+            raise ValueError(f"Profile columns are not load or generator names: {describe(unknown)}")
+
+        self.columns = list(columns)
+        self.load_columns = loads
+        self.load_rows = np.array([circuit.loads[name].bus_index for name in loads], dtype=np.int64)
+        self.reactive_columns = reactive
+        self.reactive_rows = np.array([circuit.loads[name[:-len(REACTIVE_SUFFIX)]].bus_index for name in reactive],
+                                      dtype=np.int64)
+        self.generator_columns = generators
+        self.generator_rows = np.array([circuit.generators[name].bus_index for name in generators], dtype=np.int64)
+
+        #Loads without a reactive power column scale it with their real power
+        scaled = ~np.isin(self.load_rows, self.reactive_rows)
+        self.scaled_columns = [name for name, keep in zip(loads, scaled) if keep]
+        self.scaled_rows = self.load_rows[scaled]
+        p_base = self.base_p_load[self.scaled_rows]
+        self.power_factor_ratio = np.divide(self.base_q_load[self.scaled_rows], p_base,
+                                            out=np.zeros(len(p_base)), where=p_base != 0)
+
+    def calc_specified_power(self, chunk):
+        """
+        Changes of the specified per-unit injections against the base case for every timestep of the
+        chunk: the bus row of every profile column and the P and Q changes (timesteps x columns) at them.
+        """
+        base_power = self.circuit.settings.base_power
+        p_load = chunk[self.load_columns].to_numpy(dtype=np.float64)
+        q_load = chunk[self.reactive_columns].to_numpy(dtype=np.float64)
+        q_scaled = chunk[self.scaled_columns].to_numpy(dtype=np.float64) * self.power_factor_ratio
+        p_gen = chunk[self.generator_columns].to_numpy(dtype=np.float64)
+
+        rows = np.concatenate((self.load_rows, self.reactive_rows, self.scaled_rows, self.generator_rows))
+        p_change = np.hstack((self.base_p_load[self.load_rows] - p_load,
+                              np.zeros_like(q_load), np.zeros_like(q_scaled),
+                              p_gen - self.base_p_gen[self.generator_rows])) / base_power
+        q_change = np.hstack((np.zeros_like(p_load), self.base_q_load[self.reactive_rows] - q_load,
+                              self.base_q_load[self.scaled_rows] - q_scaled, np.zeros_like(p_gen))) / base_power
+        if not (np.all(np.isfinite(p_change)) and np.all(np.isfinite(q_change))):
+            raise ValueError("Profile values must be finite numbers")
+        return rows, p_change, q_change
+
+    def run(self, source, chunk_size: int = 10000):
+        """
+        Generator stage: solve every timestep of the profile and yield one DataFrame of results per chunk.
+
+        Result columns are the time column (if the profile has one), converged, iterations,
+        p_slack and losses in MW, v_min, v_max and the voltage magnitude of every recorded bus.
+        Voltages of timesteps that did not converge are NaN. After every chunk the circuit holds the
+        setpoints and voltages of its last converged timestep.
+        """
+        circuit = self.circuit
+        ybus = circuit.ybus
+        pvpq, pq, slack = circuit.pvpq_indices, circuit.pq_indices, circuit.slack_indices
+        bus_table = circuit.bus_table
+        n = len(bus_table)
+        base_power = circuit.settings.base_power
+
+        #Profile values replace these base case setpoints, the circuit follows the profile chunk by chunk
+        self.base_p_load = bus_table["p_load"].copy()
+        self.base_q_load = bus_table["q_load"].copy()
+        self.base_p_gen = bus_table["p_gen"].copy()
+        self.columns = None
+        self.timesteps = self.num_converged = 0
+        self.stats.reset(keep=("ybus",))
+
+        powerflow = Powerflow(circuit, self.start)
+        p_base, q_base = powerflow.p_spec, powerflow.q_spec
+        v = circuit.get_voltage_vector()
+
+        for chunk in read_profile(source, chunk_size, self.time_column):
+            if self.columns is None or list(chunk.columns) != self.columns:
+                self.map_columns(chunk.columns)
+            with self.stats.timer("injections"):
+                rows, p_change, q_change = self.calc_specified_power(chunk)
+
+            num_steps = len(chunk)
+            converged = np.zeros(num_steps, dtype=bool)
+            iterations = np.zeros(num_steps, dtype=np.int64)
+            summary = np.full((num_steps, 4), np.nan)
+            vpu = np.full((num_steps, len(self.bus_rows)), np.nan)
+            max_mismatch = np.zeros(num_steps)
+            last = None  #Last converged timestep of the chunk
+
+            for k in range(num_steps):
+                p_spec = p_base + np.bincount(rows, p_change[k], n)
+                q_spec = q_base + np.bincount(rows, q_change[k], n)
+                p_spec[slack] = 0
+
+                v_new = v
+                with self.stats.timer("solve"):
+                    try:
+                        v_new, converged[k], iterations[k] = solve_arrays(ybus, v, p_spec, q_spec, pvpq, pq, self.tol,
+                                                                          self.max_iter, self.linear_solver,
+                                                                          reuse_factorization=True)
+                    except RuntimeError:
+                        #Singular Jacobian: the timestep is recorded as not converged
+                        converged[k] = False
+
+                with self.stats.timer("update"):
+                    s_injected = calc_injections(ybus, v_new)
+                    max_mismatch[k] = max(np.max(np.abs(p_spec[pvpq] - s_injected.real[pvpq]), initial=0),
+                                          np.max(np.abs(q_spec[pq] - s_injected.imag[pq]), initial=0))
+                    if converged[k]:
+                        v = v_new
+                        last = k
+                        magnitude = np.abs(v)
+                        summary[k] = (s_injected.real[slack].sum() * base_power + self.base_p_load[slack].sum(),
+                                      s_injected.real.sum() * base_power, magnitude.min(), magnitude.max())
+                        vpu[k] = magnitude[self.bus_rows]
+
+            if last is not None:
+                self.apply_timestep(chunk, last, v)
+            self.stats.record_iteration(self.timesteps, float(max_mismatch.max(initial=0)))
+            self.timesteps += num_steps
+            self.num_converged += int(converged.sum())
+
+            results = pd.DataFrame({"converged": converged, "iterations": iterations,
+                                    "p_slack": summary[:, 0], "losses": summary[:, 1],
+                                    "v_min": summary[:, 2], "v_max": summary[:, 3]})
+            if self.time_column in chunk:
+                results.insert(0, self.time_column, chunk[self.time_column].to_numpy())
+            results = pd.concat((results, pd.DataFrame(vpu, columns=self.bus_names)), axis=1)
+            yield results
+
+        self.stats.finish(self.timesteps, self.num_converged == self.timesteps)
+        if self.num_converged < self.timesteps:
+            logger.warning("%d of %d timesteps did not converge", self.timesteps - self.num_converged, self.timesteps)
+
+    def apply_timestep(self, chunk, k: int, v):
+        """Write the setpoints of timestep k of the chunk and its solved voltages into the circuit."""
+        bus_table = self.circuit.bus_table
+        row = chunk.iloc[k]
+        bus_table["p_load"][self.load_rows] = row[self.load_columns].to_numpy(dtype=np.float64)
+        bus_table["q_load"][self.reactive_rows] = row[self.reactive_columns].to_numpy(dtype=np.float64)
+        bus_table["q_load"][self.scaled_rows] = row[self.scaled_columns].to_numpy(dtype=np.float64) \
+            * self.power_factor_ratio
+        bus_table["p_gen"][self.generator_rows] = row[self.generator_columns].to_numpy(dtype=np.float64)
+        self.circuit.set_voltages(np.abs(v), np.angle(v))
+
+    def write(self, source, path: str, chunk_size: int = 10000):
+        """
+        Run the profile and append the results of every chunk to a .csv or .parquet file.
+        Return the number of timesteps written.
+        """
+        if str(path).lower().endswith((".parquet", ".pq")):
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError as error:
+                raise ImportError("Writing Parquet results requires pyarrow") from error
+            writer = None
+            try:
+                for results in self.run(source, chunk_size):
+                    table = pa.Table.from_pandas(results, preserve_index=False)
+                    if writer is None:
+                        writer = pq.ParquetWriter(path, table.schema)
+                    writer.write_table(table)
+            finally:
+                if writer is not None:
+                    writer.close()
+        else:
+            header = True
+            for results in self.run(source, chunk_size):
+                results.to_csv(path, mode="w" if header else "a", header=header, index=False)
+                header = False
+        return self.timesteps
+
+
+if __name__ == "__main__":
+    import time
+    import tracemalloc
+    from Grid_Generator import generate_grid
+
+    circuit = generate_grid(200)
+    load_names, generator_names = list(circuit.loads), list(circuit.generators)
+    p_load = np.array([circuit.loads[name].real_power for name in load_names])
+    p_gen = np.array([circuit.generators[name].mw_setpoint for name in generator_names])
+
+    def daily_profile(num_days: int, steps_per_day: int = 96, chunk_days: int = 10):
+        """Synthetic profile stage: a daily shape with noise on every load, followed by the generators."""
+        rng = np.random.default_rng(0)
+        for day in range(0, num_days, chunk_days):
+            steps = np.arange(day * steps_per_day, min(day + chunk_days, num_days) * steps_per_day)
+            shape = 0.8 + 0.2 * np.sin(2 * np.pi * (steps % steps_per_day) / steps_per_day - np.pi / 2)
+            loads = p_load * shape[:, None] * rng.normal(1, 0.02, (len(steps), len(load_names)))
+            profile = pd.DataFrame(np.hstack((loads, p_gen * shape[:, None])), columns=load_names + generator_names)
+            profile.insert(0, "time", steps)
+            yield profile
+
+    #Peak traced memory stays the same for a four times longer horizon
+    for num_days in (20, 80):
+        qsts = Time_Series_Powerflow(circuit, 1e-6, buses=[])
+        tracemalloc.start()
+        start = time.perf_counter()
+        iterations = sum(results["iterations"].sum() for results in qsts.run(daily_profile(num_days)))
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{qsts.timesteps} timesteps in {elapsed:.2f} s, {qsts.num_converged} converged, "
+              f"{iterations / qsts.timesteps:.2f} iterations per timestep, peak memory {peak / 2**20:.1f} MB")
@@ -1,41 +1,93 @@
 import numpy as np
 from Bus import Bus
-from Settings import s
+from Settings import Settings, s
+from NetworkTables import BranchTable
 import math
 
 class Transformer:
+    __slots__ = ("name", "bus1", "bus2", "power_rating", "impedance_percent", "x_over_r_ratio", "y_prim_mat",
+                 "settings", "table", "index")
+
     def __init__(self, name: str, bus1: Bus, bus2: Bus, power_rating: float, impedance_percent: float,
-                 x_over_r_ratio: float):
-        """Initialize a Transformer instance with given parameters."""
+                 x_over_r_ratio: float, table: BranchTable = None, settings: Settings = None):
+        """Initialize a Transformer instance, a view onto one row of a BranchTable."""
         self.name = name
         self.bus1 = bus1
         self.bus2 = bus2
         self.power_rating = power_rating
         self.impedance_percent = impedance_percent
         self.x_over_r_ratio = x_over_r_ratio
-
-        # Calculate impedance and admittance values
-        self.impedance = self.calculate_impedance()
-        self.admittance = 1 / self.impedance if self.impedance != 0 else float('inf')
         self.y_prim_mat=None
+        self.settings = settings if settings is not None else s
+
+        if table is None:
+            table = BranchTable(capacity=1)
+        self.table = table
+
+        # Calculate impedance and store it in the branch table
+        impedance = self.calculate_impedance()
+        self.index = table.append(name, from_bus=bus1.index, to_bus=bus2.index, r=impedance.real, x=impedance.imag,
+                                  rating=power_rating, is_transformer=True)
+
+    @classmethod
+    def from_row(cls, table: BranchTable, index: int, bus1: Bus, bus2: Bus, settings: Settings = None):
+        """
+        Create a Transformer view onto an existing row of table, e.g. one filled in bulk from
+        per-unit case data. There is no nameplate data, so impedance_percent and x_over_r_ratio are None.
+        """
+        transformer = cls.__new__(cls)
+        transformer.name = table.names[index]
+        transformer.bus1 = bus1
+        transformer.bus2 = bus2
+        transformer.power_rating = table.data["rating"][index]
+        transformer.impedance_percent = None
+        transformer.x_over_r_ratio = None
+        transformer.y_prim_mat = None
+        transformer.settings = settings if settings is not None else s
+        transformer.table = table
+        transformer.index = index
+        return transformer
 
     def calculate_impedance(self):
         """Calculate the impedance based on power rating and impedance percentage."""
         base_impedance = (self.bus1.base_kv ** 2) / self.power_rating
-        system_impedence = (self.bus1.base_kv ** 2) / s.base_power # Change in settings, 100 represents the system power base
+        system_impedence = (self.bus1.base_kv ** 2) / self.settings.base_power # Change in settings, 100 represents the system power base
         z_pu_mag = ((self.impedance_percent / 100)*base_impedance)/system_impedence
         z_pu_angle=math.atan(self.x_over_r_ratio)
         z_pu=z_pu_mag * complex(math.cos(z_pu_angle), math.sin(z_pu_angle))
         return z_pu
 
+    @property
+    def impedance(self):
+        return complex(self.table.data["r"][self.index], self.table.data["x"][self.index])
+
+    @impedance.setter
+    def impedance(self, value: complex):
+        self.table.data["r"][self.index] = value.real
+        self.table.data["x"][self.index] = value.imag
+
+    @property
+    def admittance(self):
+        return self.calculate_admittance()
+
+    @property
+    def in_service(self):
+        return bool(self.table.data["in_service"][self.index])
+
+    @in_service.setter
+    def in_service(self, value: bool):
+        self.table.data["in_service"][self.index] = value
+
     def calculate_admittance(self):
         """Calculate the admittance as the reciprocal of impedance."""
         return 1 / self.impedance if self.impedance != 0 else float('inf')
 
     def yprim(self):
-        """Compute the primitive admittance matrix."""
+        """Compute the primitive admittance matrix, including the off-nominal tap and any charging."""
         y = self.calculate_admittance()
-        self.y_prim_mat=np.array([[y, -y], [-y, y]])
+        y_shunt = 1j * self.table.data["b"][self.index] / 2
+        tap = self.table.data["tap"][self.index]
+        self.y_prim_mat=np.array([[(y + y_shunt) / tap**2, -y / tap], [-y / tap, y + y_shunt]])
         return self.y_prim_mat
 
     def Rpu_Xpu(self):
@@ -1,4 +1,5 @@
 import math
+import weakref
 
 import numpy as np
 import pandas as pd
@@ -7,7 +8,8 @@ from Bus import Bus
 from Bundle import Bundle
 from Geometry import Geometry
 from Conductor import Conductor
-from Settings import s
+from Settings import Settings, s
+from NetworkTables import BranchTable
 
 
 def get_zbase(vbase, sbase):
@@ -15,33 +17,163 @@ def get_zbase(vbase, sbase):
     return vbase**2/sbase
 
 
+def calc_line_constants(bundle: Bundle, geometry: Geometry, frequency: float):
+    """Return the series resistance and reactance (ohm) and shunt susceptance (S) per mile of a line."""
+    r = bundle.conductor.resistance/bundle.num_conductors
+    x = 2*math.pi*frequency * 2e-7 * math.log(geometry.DEQ / bundle.DSL) * 1609
+    b = 2*math.pi*frequency * 1609 * 2 * math.pi * 8.854e-12 / math.log(geometry.DEQ / bundle.DSC)
+    return r, x, b
+
+
+def calc_line_rating(bundle: Bundle, base_kv):
+    """Return the MVA rating of a line from its conductor ampacity."""
+    return math.sqrt(3) * base_kv * bundle.conductor.ampacity * bundle.num_conductors / 1000
+
+
+class LineParameterCache:
+    """
+    Per-unit series impedance and shunt admittance per mile, and the MVA rating, of lines built
+    from conductor data, keyed by (bundle, geometry, base kV) for one Settings instance.
+
+    Models reuse a few bundle and geometry combinations across many lines, so the logarithms
+    are evaluated once per combination. The cache empties itself when the frequency or base
+    power of its settings change.
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.version = settings.version
+        self.parameters = {}
+
+    def get(self, bundle: Bundle, geometry: Geometry, base_kv: float):
+        """Return (series impedance per mile, shunt admittance per mile, MVA rating) in per-unit."""
+        if self.version != self.settings.version:
+            self.parameters.clear()
+            self.version = self.settings.version
+
+        key = (bundle, geometry, float(base_kv))
+        parameters = self.parameters.get(key)
+        if parameters is None:
+            zbase = get_zbase(base_kv, self.settings.base_power)
+            r, x, b = calc_line_constants(bundle, geometry, self.settings.frequency)
+            parameters = (complex(r, x) / zbase, complex(0, b) * zbase, calc_line_rating(bundle, base_kv))
+            self.parameters[key] = parameters
+        return parameters
+
+    def calc_lines(self, bundles, geometries, base_kv, length):
+        """
+        Per-unit series impedance, shunt admittance and MVA rating of many lines in one array operation.
+
+        :param bundles: Bundle of every line (sequence), geometries likewise.
+        :param base_kv: Array of the base voltage of every line, length the array of lengths in miles.
+        :return: (series impedance, shunt admittance, rating) arrays.
+        """
+        combinations = {}
+        inverse = np.array([combinations.setdefault(key, len(combinations))
+                            for key in zip(bundles, geometries, np.asarray(base_kv, dtype=float).tolist())],
+                           dtype=np.int64)
+        parameters = np.array([self.get(*key) for key in combinations], dtype=complex).reshape(-1, 3)[inverse]
+        return parameters[:, 0] * length, parameters[:, 1] * length, parameters[:, 2].real
+
+
+parameter_caches = weakref.WeakKeyDictionary()
+
+
+def get_line_parameter_cache(settings: Settings):
+    """Return the LineParameterCache shared by every line using settings."""
+    cache = parameter_caches.get(settings)
+    if cache is None:
+        cache = parameter_caches[settings] = LineParameterCache(settings)
+    return cache
+
+
 class TransmissionLine:
-    def __init__(self, name: str, bus1: Bus, bus2: Bus, bundle: Bundle, geometry: Geometry, length: float):
-        """Initialize a TransmissionLine instance with given parameters."""
+    __slots__ = ("name", "bus1", "bus2", "bundle", "geometry", "length", "settings", "table", "index")
+
+    def __init__(self, name: str, bus1: Bus, bus2: Bus, bundle: Bundle, geometry: Geometry, length: float,
+                 table: BranchTable = None, settings: Settings = None):
+        """Initialize a TransmissionLine instance, a view onto one row of a BranchTable."""
         self.name = name
         self.bus1 = bus1
         self.bus2 = bus2
         self.bundle = bundle
         self.geometry = geometry
         self.length = length
-        self.zbase = get_zbase(bus1.base_kv, s.base_power)
-
-        # Calculate series impedance and shunt admittance
-        self.series_impedance = self.calculate_series_impedance()
-        self.shunt_admittance = self.calculate_shunt_admittance()
-        self.yprim = self.calc_yprim()
+        self.settings = settings if settings is not None else s
+
+        if table is None:
+            table = BranchTable(capacity=1)
+        self.table = table
+
+        # Series impedance and shunt admittance from the cached per-mile values
+        series_impedance = self.calculate_series_impedance()
+        shunt_admittance = self.calculate_shunt_admittance()
+        _, _, rating = get_line_parameter_cache(self.settings).get(bundle, geometry, bus1.base_kv)
+
+        self.index = table.append(name, from_bus=bus1.index, to_bus=bus2.index, r=series_impedance.real,
+                                  x=series_impedance.imag, b=shunt_admittance.imag, rating=rating, length=length)
+
+    @classmethod
+    def from_row(cls, table: BranchTable, index: int, bus1: Bus, bus2: Bus, settings: Settings = None,
+                 bundle: Bundle = None, geometry: Geometry = None):
+        """
+        Create a TransmissionLine view onto an existing row of table, e.g. one filled in bulk.
+        Lines given as per-unit data have no conductor data: bundle, geometry and length are None.
+        """
+        line = cls.__new__(cls)
+        line.name = table.names[index]
+        line.bus1 = bus1
+        line.bus2 = bus2
+        line.bundle = bundle
+        line.geometry = geometry
+        line.length = table.data["length"][index] if bundle is not None else None
+        line.settings = settings if settings is not None else s
+        line.table = table
+        line.index = index
+        return line
+
+    @property
+    def zbase(self):
+        return get_zbase(self.bus1.base_kv, self.settings.base_power)
 
     def calculate_series_impedance(self):
-        """Calculate the series impedance of the transmission line."""
-        Ra = (self.bundle.conductor.resistance/self.bundle.num_conductors  * self.length) /self.zbase
-        Xa = (2*math.pi*s.frequency * 2e-7 * math.log(self.geometry.DEQ / self.bundle.DSL) * 1609  * self.length)/self.zbase # ohm
-        return complex(Ra, Xa)
+        """Calculate the per-unit series impedance of the transmission line."""
+        z, _, _ = get_line_parameter_cache(self.settings).get(self.bundle, self.geometry, self.bus1.base_kv)
+        return z * self.length
 
     def calculate_shunt_admittance(self):
-        """Calculate the shunt admittance of the transmission line."""
-        y = (2*math.pi*s.frequency * 1609 * 2 * math.pi * 8.854e-12 / math.log(self.geometry.DEQ / self.bundle.DSC) * self.length)*self.zbase
-        return complex(0, y)
-
+        """Calculate the per-unit shunt admittance of the transmission line."""
+        _, y, _ = get_line_parameter_cache(self.settings).get(self.bundle, self.geometry, self.bus1.base_kv)
+        return y * self.length
+
+    @property
+    def series_impedance(self):
+        return complex(self.table.data["r"][self.index], self.table.data["x"][self.index])
+
+    @series_impedance.setter
+    def series_impedance(self, value: complex):
+        self.table.data["r"][self.index] = value.real
+        self.table.data["x"][self.index] = value.imag
+
+    @property
+    def shunt_admittance(self):
+        return complex(0, self.table.data["b"][self.index])
+
+    @shunt_admittance.setter
+    def shunt_admittance(self, value: complex):
+        self.table.data["b"][self.index] = complex(value).imag
+
+    @property
+    def in_service(self):
+        return bool(self.table.data["in_service"][self.index])
+
+    @in_service.setter
+    def in_service(self, value: bool):
+        self.table.data["in_service"][self.index] = value
+
+    @property
+    def yprim(self):
+        return self.calc_yprim()
 
     def __str__(self):
         """Return a formatted string representing the transmission line object."""
@@ -0,0 +1,25 @@
+# Per-process state of the process-pool studies (contingency analysis, probabilistic load flow)
+# Each worker receives the base case once through init_worker and keeps its own Jacobian solver
+from LinearSolver import SuperLUSolver
+
+#Base case of the current worker process, set once by init_worker
+worker_case = None
+
+
+def init_worker(base_case):
+    """Pool initializer: keep base_case for the tasks of this process, with a fresh Jacobian solver."""
+    global worker_case
+    worker_case = base_case
+    worker_case["linear_solver"] = new_linear_solver(base_case)
+
+
+def get_worker_case():
+    """Base case of the current worker process."""
+    return worker_case
+
+
+def new_linear_solver(base_case):
+    """Jacobian solver of a worker, in the circuit's fill-reducing ordering."""
+    linear_solver = SuperLUSolver()
+    linear_solver.set_ordering(base_case["jacobian_ordering"], base_case["ordering_method"])
+    return linear_solver
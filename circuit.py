@@ -1,31 +1,109 @@
 import numpy as np
 import pandas as pd
+import scipy.sparse as sp
 from Bus import Bus
 from Geometry import Geometry
 from Conductor import Conductor
 from Transformer import Transformer
 from Bundle import Bundle
-from TransmissionLine import TransmissionLine
+from TransmissionLine import TransmissionLine, get_line_parameter_cache
 from Geometry import Geometry
 from Load import Load
 from Generator import Generator
+from Settings import Settings
+from NetworkTables import BusTable, BranchTable, ElementViews, BUS_TYPES, SLACK_BUS, PV_BUS, PQ_BUS, describe
 
 import math
 import cmath
 from Jacobian import Jacobian
+from Ordering import ORDERING_METHODS, calc_bus_ordering, calc_block_ordering
+
+def get_bulk_columns(names, **columns):
+    """
+    Turn the arguments of a bulk add method into a list of names and a dict of equal-length arrays.
+
+    names may be a DataFrame or dict of arrays with a "name" column, whose other columns replace
+    the keyword arguments of the same name. Scalars are repeated for every element, None stays None.
+    """
+    if isinstance(names, (pd.DataFrame, dict)):
+        data=names
+        names=data["name"]
+        columns={column: data[column] if column in data else value for column, value in columns.items()}
+    names=names.tolist() if isinstance(names, (np.ndarray, pd.Series)) else list(names)
+
+    for column, value in columns.items():
+        if value is None:
+            continue
+        values=np.asarray(value)
+        if values.ndim==0:
+            values=np.full(len(names), value, dtype=values.dtype)
+        elif len(values)!=len(names):
+            raise ValueError(f"{column} has {len(values)} values for {len(names)} names")
+        columns[column]=values
+    return names, columns
+
+
+def check_names(names, elements, kind:str):
+    """Return the errors about duplicate names among names and the existing elements."""
+    errors=[]
+    if len(set(names))<len(names):
+        unique_names, counts=np.unique(np.array(names, dtype=str), return_counts=True)
+        errors.append(f"duplicate {kind} names: {describe(unique_names[counts>1])}")
+    existing=[name for name in names if name in elements] if len(elements) else []
+    if existing:
+        errors.append(f"{kind} names already in use: {describe(np.array(existing))}")
+    return errors
+
+
+def check_values(errors, names, values, valid, message:str):
+    """Append message, naming the offending elements, if any value is non-finite or not valid."""
+    bad=~(np.isfinite(values.astype(float))&valid)
+    if np.any(bad):
+        errors.append(f"{message}: {describe(np.array(names)[bad])}")
+
+
+def raise_errors(kind:str, errors):
+    if errors:
+        raise ValueError(f"Invalid {kind}:\n  "+"\n  ".join(errors))
+
 
 class Circuit:
-    def __init__(self, name:str):
+    def __init__(self, name:str, settings:Settings=None):
         self.name = name
-        self.transformers={}
+        self.settings=settings if settings is not None else Settings()  #Per-circuit frequency and base power
+        self.transformers=ElementViews(self.create_branch_view)  #Bulk-loaded branches get their views on first access
         self.buses={}
-        self.transmission_lines={}
+        self.transmission_lines=ElementViews(self.create_branch_view)
         self.conductors={}
         self.geometry={}
         self.bundles={}
         self.generators={}
         self.loads={}
-        self.ybus=None
+        self.bus_table=BusTable()  #Columnar bus data, Bus objects are views onto its rows
+        self.bus_table.circuit=self
+        self.branch_table=BranchTable()  #Columnar transformer and line data, in insertion order
+        self.ybus=None  #Sparse CSR matrix, see calc_y_admit
+        self.branch_names=[]
+        self.branch_from=None
+        self.branch_to=None
+        self.branch_yprim=None
+        self.slack_indices=None
+        self.pv_indices=None
+        self.pq_indices=None
+        self.pvpq_indices=None
+        self.linear_solvers={}  #Cached LinearSolver objects, reused across solves of the same topology
+        self.topology_version=0  #Incremented whenever buses, branches or generators change
+        self.ybus_version=None  #topology_version the current ybus was built for
+        self.fault_cache=None  #Generator-augmented Y-bus and its factorization, see Symmetrical_Faults
+        self.dc_powerflow=None  #Factorized DC power flow and its PTDF/LODF of the current topology, see DC_Powerflow
+        self.topology_changes=[]  #(topology_version, bus_i, bus_j, 2x2 Y-bus change) of every incremental branch edit
+        self.branch_in_service=None
+        self.line_types=[]  #(bundle, geometry) of the lines built from conductor data, see BranchTable line_type
+        self.line_type_index={}
+        self.ordering_method="amd"  #Fill-reducing ordering of the sparse factorizations, see set_ordering
+        self.bus_ordering=None  #(method, number of buses, number of branches, bus permutation)
+        self.settings_version=self.settings.version  #Settings the per-unit table data was computed with
+        self.settings_base_power=self.settings.base_power
 
     def add_bus(self, name:str, base_kv:float, vpu:float=1, delta:float=0, bus_type:str="PQ_Bus"):
 
@@ -35,10 +113,13 @@ class Circuit:
             return
 
         #Adding Bus to dictionary
-        self.buses[name]=Bus(name, base_kv,vpu,delta,bus_type)
+        self.buses[name]=Bus(name, base_kv,vpu,delta,bus_type,self.bus_table)
+        self.topology_version+=1
 
 
     def add_transformer(self, name:str, bus1:str, bus2:str, power_rating:float, impedance_percent:float, x_over_r_ratio:float):
+        #New elements are computed on the current base, so data added before a base change is rescaled first
+        self.apply_settings()
 
         #Checking is buses to connect to transformer already exist
         if bus1 not in self.buses or bus2 not in self.buses:
@@ -51,9 +132,11 @@ class Circuit:
             return
 
         #Adding Transformer to Dictionary
-        self.transformers[name]=Transformer(name, self.buses[bus1], self.buses[bus2], power_rating,impedance_percent, x_over_r_ratio)
+        self.transformers[name]=Transformer(name, self.buses[bus1], self.buses[bus2], power_rating,impedance_percent, x_over_r_ratio, self.branch_table, self.settings)
+        self.topology_version+=1
 
     def add_transmission_lines(self, name:str, bus1:str, bus2:str, bundle:Bundle, geometry:Geometry, length:float):
+        self.apply_settings()
 
         #Checking if busses to connect to Transmission Line already exist
         if bus1 not in self.buses or bus2 not in self.buses:
@@ -66,7 +149,9 @@ class Circuit:
             return
 
         #Adding Transmission Line to Dictionary
-        self.transmission_lines[name]=TransmissionLine(name, self.buses[bus1], self.buses[bus2], bundle, geometry, length)
+        self.transmission_lines[name]=TransmissionLine(name, self.buses[bus1], self.buses[bus2], bundle, geometry, length, self.branch_table, self.settings)
+        self.branch_table.data["line_type"][self.transmission_lines[name].index]=self.get_line_type(bundle, geometry)
+        self.topology_version+=1
 
     def add_conductor(self, name:str, diam:float,GRM:float, resistance:float, ampacity:float):
         self.conductors[name]=Conductor(name, diam, GRM, resistance, ampacity)
@@ -78,10 +163,12 @@ class Circuit:
         self.geometry[name]=Geometry(name,xa,ya,xb,yb,xc,yc)
 
     def add_generator(self, name:str, voltage_setpoint:float, mw_setpoint:float, gen_bus_name:str, sub_trans:float):
+        self.apply_settings()
         if(self.buses[gen_bus_name].bus_type == "PV_Bus" or self.buses[gen_bus_name].bus_type == "Slack_Bus"):
             self.generators[name] = Generator(name, voltage_setpoint, mw_setpoint)
-            self.generators[name].calc_Impedance(sub_trans)
+            self.generators[name].calc_Impedance(sub_trans, self.settings.base_power)
             self.buses[gen_bus_name].generator = self.generators[name]
+            self.topology_version+=1
         else:
             print("Error: ",gen_bus_name," is not a valid Bus to add generator")
 
@@ -92,62 +179,555 @@ class Circuit:
         else:
             print("Error: ",load_bus_name," is not a valid PQ Bus")
 
-    def calc_y_admit(self):
-        n=len(self.buses)
-
-        y_admit=np.zeros((n,n),dtype=complex)
-
-        for key in self.transformers.keys():
-
-            #Finding Connected buses
-            busIn=self.transformers[key].bus1
-            busOut=self.transformers[key].bus2
-
-            #Storing Transformer instance yprim matrix
-            temp=self.transformers[key].yprim()
-
-            #Placeholders for bus indicies
-            i=busIn.index
-            j=busOut.index
+    def add_buses(self, names, base_kv=None, vpu=1.0, delta=0.0, bus_type="PQ_Bus", g_shunt=0.0, b_shunt=0.0):
+        """
+        Add many buses at once. Arguments are scalars or one value per bus; names may instead be
+        a DataFrame (or dict of arrays) with a "name" column and any of the other arguments as columns.
+
+        :param bus_type: Bus type names ("PQ_Bus", ...) or SLACK_BUS/PV_BUS/PQ_BUS codes.
+        :param g_shunt: Shunt conductance in per-unit at 1 pu voltage, b_shunt likewise.
+        :raises ValueError: Listing every invalid bus; nothing is added then.
+        """
+        self.apply_settings()
+        names, c=get_bulk_columns(names, base_kv=base_kv, vpu=vpu, delta=delta, bus_type=bus_type,
+                                  g_shunt=g_shunt, b_shunt=b_shunt)
+        if c["bus_type"].dtype.kind in "iu":
+            codes=c["bus_type"].astype(np.int8)
+        else:
+            codes=np.array([BUS_TYPES.get(bus_type, -1) for bus_type in c["bus_type"].tolist()], dtype=np.int8)
 
-            #y_admit[i:j+1,i:j+1]=y_admit[i:j+1,i:j+1] + self.transformers[key].y_prim_mat
+        errors=check_names(names, self.buses, "bus")
+        if c["base_kv"] is None:
+            errors.append("base_kv is required")
+        else:
+            check_values(errors, names, c["base_kv"], c["base_kv"]>0, "base_kv must be positive")
+        check_values(errors, names, c["vpu"], c["vpu"]>0, "vpu must be positive")
+        for column in ("delta", "g_shunt", "b_shunt"):
+            check_values(errors, names, c[column], True, f"{column} must be finite")
+        bad_type=~np.isin(codes, (SLACK_BUS, PV_BUS, PQ_BUS))
+        if np.any(bad_type):
+            errors.append(f"invalid bus types at buses {describe(np.array(names)[bad_type])}")
+        raise_errors("buses", errors)
+
+        rows=self.bus_table.extend(names, base_kv=c["base_kv"], vpu=c["vpu"], delta=c["delta"], bus_type=codes,
+                                   v_set=c["vpu"], g_shunt=c["g_shunt"], b_shunt=c["b_shunt"])
+        self.buses.update(zip(names, [Bus.from_row(self.bus_table, row) for row in rows.tolist()]))
+        self.topology_version+=1
+
+    def add_lines(self, names, bus1=None, bus2=None, bundle=None, geometry=None, length=None, r=None, x=None,
+                  b=0.0, rating=np.inf, in_service=True):
+        """
+        Add many transmission lines at once, either from conductor data (bundle, geometry and
+        length in miles, like add_transmission_lines) or from per-unit r, x and total charging b
+        on the system base. Arguments are scalars or one value per line; names may instead be a
+        DataFrame (or dict of arrays) with a "name" column and any of the other arguments as columns.
+
+        :param bus1: Bus names, or bus table rows (integers), at the two ends; bus2 likewise.
+        :param rating: MVA rating of per-unit lines; conductor lines are rated from their ampacity.
+        :raises ValueError: Listing every invalid line; nothing is added then.
+        """
+        self.apply_settings()
+        names, c=get_bulk_columns(names, bus1=bus1, bus2=bus2, bundle=bundle, geometry=geometry, length=length,
+                                  r=r, x=x, b=b, rating=rating, in_service=in_service)
+        errors, from_bus, to_bus=self.check_branch_buses(names, c["bus1"], c["bus2"], self.transmission_lines, "line")
+
+        from_conductors=c["bundle"] is not None or c["geometry"] is not None or c["length"] is not None
+        if from_conductors and (c["r"] is not None or c["x"] is not None):
+            errors.append("give either bundle, geometry and length or r and x, not both")
+        elif from_conductors:
+            if c["bundle"] is None or c["geometry"] is None or c["length"] is None:
+                errors.append("bundle, geometry and length are all required for lines from conductor data")
+            else:
+                check_values(errors, names, c["length"], c["length"]>0, "length must be positive")
+        elif c["r"] is None or c["x"] is None:
+            errors.append("r and x (or bundle, geometry and length) are required")
+        else:
+            check_values(errors, names, c["r"], c["r"]>=0, "r must not be negative")
+            check_values(errors, names, c["x"], True, "x must be finite")
+            check_values(errors, names, c["b"], True, "b must be finite")
+            zero=(c["r"]==0)&(c["x"]==0)&c["in_service"].astype(bool)
+            if np.any(zero):
+                errors.append(f"in-service lines with zero impedance: {describe(np.array(names)[zero])}")
+        raise_errors("lines", errors)
+
+        if from_conductors:
+            line_types=np.array([self.get_line_type(bundle, geometry)
+                                 for bundle, geometry in zip(c["bundle"].tolist(), c["geometry"].tolist())], dtype=np.int32)
+            length=c["length"].astype(float)
+            z, y, rating=get_line_parameter_cache(self.settings).calc_lines(
+                c["bundle"].tolist(), c["geometry"].tolist(), self.bus_table["base_kv"][from_bus], length)
+            r, x, b=z.real, z.imag, y.imag
+        else:
+            line_types=-1
+            length=0.0
+            r, x, b, rating=c["r"], c["x"], c["b"], c["rating"]
+
+        rows=self.branch_table.extend(names, from_bus=from_bus, to_bus=to_bus, r=r, x=x, b=b, rating=rating,
+                                      in_service=c["in_service"], length=length, line_type=line_types)
+        self.transmission_lines.add_rows(names, rows.tolist())
+        self.topology_version+=1
+
+    def add_transformers(self, names, bus1=None, bus2=None, power_rating=None, impedance_percent=None,
+                         x_over_r_ratio=None, r=None, x=None, b=0.0, tap=1.0, in_service=True):
+        """
+        Add many transformers at once, either from nameplate data (power_rating in MVA,
+        impedance_percent and x_over_r_ratio, like add_transformer) or from per-unit r, x and
+        charging b on the system base. tap is the off-nominal turns ratio on the bus1 side, and
+        bus1 and bus2 are bus names or bus table rows (integers).
+        Arguments are scalars or one value per transformer; names may instead be a DataFrame
+        (or dict of arrays) with a "name" column and any of the other arguments as columns.
+
+        :raises ValueError: Listing every invalid transformer; nothing is added then.
+        """
+        self.apply_settings()
+        names, c=get_bulk_columns(names, bus1=bus1, bus2=bus2, power_rating=power_rating,
+                                  impedance_percent=impedance_percent, x_over_r_ratio=x_over_r_ratio,
+                                  r=r, x=x, b=b, tap=tap, in_service=in_service)
+        errors, from_bus, to_bus=self.check_branch_buses(names, c["bus1"], c["bus2"], self.transformers, "transformer")
+
+        from_nameplate=c["impedance_percent"] is not None or c["x_over_r_ratio"] is not None
+        if from_nameplate and (c["r"] is not None or c["x"] is not None):
+            errors.append("give either impedance_percent and x_over_r_ratio or r and x, not both")
+        elif from_nameplate:
+            if c["impedance_percent"] is None or c["x_over_r_ratio"] is None or c["power_rating"] is None:
+                errors.append("power_rating, impedance_percent and x_over_r_ratio are all required for nameplate data")
+            else:
+                check_values(errors, names, c["power_rating"], c["power_rating"]>0, "power_rating must be positive")
+                check_values(errors, names, c["impedance_percent"], c["impedance_percent"]>0,
+                             "impedance_percent must be positive")
+                check_values(errors, names, c["x_over_r_ratio"], c["x_over_r_ratio"]>0, "x_over_r_ratio must be positive")
+        elif c["r"] is None or c["x"] is None:
+            errors.append("r and x (or power_rating, impedance_percent and x_over_r_ratio) are required")
+        else:
+            check_values(errors, names, c["r"], c["r"]>=0, "r must not be negative")
+            check_values(errors, names, c["x"], True, "x must be finite")
+            zero=(c["r"]==0)&(c["x"]==0)&c["in_service"].astype(bool)
+            if np.any(zero):
+                errors.append(f"in-service transformers with zero impedance: {describe(np.array(names)[zero])}")
+            if c["power_rating"] is not None:
+                check_values(errors, names, c["power_rating"], c["power_rating"]>0, "power_rating must be positive")
+        check_values(errors, names, c["b"], True, "b must be finite")
+        check_values(errors, names, c["tap"], c["tap"]>0, "tap must be positive")
+        raise_errors("transformers", errors)
+
+        if from_nameplate:
+            #Same per-unit conversion as Transformer.calculate_impedance
+            base_kv=self.bus_table["base_kv"][from_bus]
+            base_impedance=base_kv**2/c["power_rating"]
+            system_impedance=base_kv**2/self.settings.base_power
+            z_pu_mag=((c["impedance_percent"]/100)*base_impedance)/system_impedance
+            z_pu_angle=np.arctan(c["x_over_r_ratio"])
+            r, x=z_pu_mag*np.cos(z_pu_angle), z_pu_mag*np.sin(z_pu_angle)
+        else:
+            r, x=c["r"], c["x"]
+        rating=c["power_rating"] if c["power_rating"] is not None else np.inf
+
+        rows=self.branch_table.extend(names, from_bus=from_bus, to_bus=to_bus, r=r, x=x, b=c["b"], tap=c["tap"],
+                                      rating=rating, in_service=c["in_service"], is_transformer=True)
+        self.transformers.add_rows(names, rows.tolist())
+        self.topology_version+=1
+
+    def add_loads(self, names, real_power=None, reactive_power=0.0, bus=None):
+        """
+        Add many loads at once, one per bus (given by name or bus table row), replacing any
+        load the bus already had (like add_load). Unlike add_load any bus type is accepted, as
+        in imported cases; the P load of PV and slack buses is subtracted from their injection.
+        Arguments are scalars or one value per load; names may instead be a DataFrame (or dict
+        of arrays) with a "name" column and any of the other arguments as columns.
+
+        :raises ValueError: Listing every invalid load; nothing is added then.
+        """
+        names, c=get_bulk_columns(names, real_power=real_power, reactive_power=reactive_power, bus=bus)
+        errors, rows=self.check_element_buses(names, c["bus"], self.loads, "load")
+        if c["real_power"] is None:
+            errors.append("real_power is required")
+        else:
+            check_values(errors, names, c["real_power"], True, "real_power must be finite")
+        check_values(errors, names, c["reactive_power"], True, "reactive_power must be finite")
+        raise_errors("loads", errors)
+
+        self.bus_table["p_load"][rows]=c["real_power"]
+        self.bus_table["q_load"][rows]=c["reactive_power"]
+        for name, row in zip(names, rows.tolist()):
+            load=Load.from_row(name, self.bus_table, row)
+            self.buses[self.bus_table.names[row]]._load=load
+            self.loads[name]=load
+
+    def add_generators(self, names, voltage_setpoint=1.0, mw_setpoint=None, bus=None, sub_trans=None, machine_base=None):
+        """
+        Add many generators at once, one per PV or slack bus (given by name or bus table row),
+        replacing any generator the bus already had (like add_generator). Arguments are scalars or one value per generator; names may
+        instead be a DataFrame (or dict of arrays) with a "name" column and any of the other arguments as columns.
+
+        :param sub_trans: Subtransient reactance in per-unit on machine_base, NaN (or None for all)
+            leaves a generator out of fault studies.
+        :param machine_base: MVA base of sub_trans, the MW setpoint by default like calc_Impedance.
+        :raises ValueError: Listing every invalid generator; nothing is added then.
+        """
+        self.apply_settings()
+        names, c=get_bulk_columns(names, voltage_setpoint=voltage_setpoint, mw_setpoint=mw_setpoint, bus=bus,
+                                  sub_trans=sub_trans, machine_base=machine_base)
+        errors, rows=self.check_element_buses(names, c["bus"], self.generators, "generator", (SLACK_BUS, PV_BUS))
+        if c["mw_setpoint"] is None:
+            errors.append("mw_setpoint is required")
+        else:
+            check_values(errors, names, c["mw_setpoint"], True, "mw_setpoint must be finite")
+        check_values(errors, names, c["voltage_setpoint"], c["voltage_setpoint"]>0, "voltage_setpoint must be positive")
+
+        x_sub=np.full(len(names), np.nan)
+        if c["sub_trans"] is not None and c["mw_setpoint"] is not None:
+            machine_base=c["machine_base"] if c["machine_base"] is not None else c["mw_setpoint"]
+            has_sub_trans=~np.isnan(c["sub_trans"].astype(float))
+            bad_base=has_sub_trans&~(machine_base>0)
+            if np.any(bad_base):
+                errors.append(f"generators with sub_trans need a positive machine base: {describe(np.array(names)[bad_base])}")
+            else:
+                x_sub[has_sub_trans]=(c["sub_trans"]*(self.settings.base_power/machine_base))[has_sub_trans]
+        raise_errors("generators", errors)
+
+        self.bus_table["p_gen"][rows]=c["mw_setpoint"]
+        self.bus_table["sub_trans"][rows]=1j*x_sub
+        for name, row, voltage in zip(names, rows.tolist(), c["voltage_setpoint"].tolist()):
+            generator=Generator.from_row(name, self.bus_table, row)
+            generator.voltage_setpoint=voltage
+            self.buses[self.bus_table.names[row]]._generator=generator
+            self.generators[name]=generator
+        self.topology_version+=1
+
+    def get_bus_indices(self, buses):
+        """Return the bus table rows of an array of bus names or rows, -1 for unknown buses."""
+        if buses.dtype.kind in "iu":
+            return np.where((buses>=0)&(buses<len(self.bus_table)), buses, -1).astype(np.int64)
+        return np.array([bus.index if bus is not None else -1 for bus in map(self.buses.get, buses.tolist())],
+                        dtype=np.int64)
+
+    def get_line_type(self, bundle:Bundle, geometry:Geometry):
+        """Return the index of the (bundle, geometry) pair in line_types, adding it if new."""
+        key=(id(bundle), id(geometry))
+        if key not in self.line_type_index:
+            self.line_type_index[key]=len(self.line_types)
+            self.line_types.append((bundle, geometry))
+        return self.line_type_index[key]
+
+    def check_branch_buses(self, names, bus1, bus2, elements, kind:str):
+        """Common checks of a bulk branch insertion: return (errors, from bus rows, to bus rows)."""
+        errors=check_names(names, elements, kind)
+        if bus1 is None or bus2 is None:
+            errors.append("bus1 and bus2 are required")
+            return errors, None, None
+        from_bus, to_bus=self.get_bus_indices(bus1), self.get_bus_indices(bus2)
+        unknown=(from_bus<0)|(to_bus<0)
+        if np.any(unknown):
+            errors.append(f"{kind}s connected to unknown buses: {describe(np.array(names)[unknown])}")
+        loops=(from_bus==to_bus)&~unknown
+        if np.any(loops):
+            errors.append(f"{kind}s starting and ending at the same bus: {describe(np.array(names)[loops])}")
+        return errors, from_bus, to_bus
+
+    def check_element_buses(self, names, buses, elements, kind:str, bus_types=None):
+        """Common checks of a bulk load or generator insertion: return (errors, bus rows). bus_types None allows any bus."""
+        errors=check_names(names, elements, kind)
+        if buses is None:
+            errors.append("bus is required")
+            return errors, None
+        rows=self.get_bus_indices(buses)
+        unknown=rows<0
+        if np.any(unknown):
+            errors.append(f"{kind}s at unknown buses: {describe(np.array(names)[unknown])}")
+        wrong_type=np.zeros(len(rows), dtype=bool) if bus_types is None else ~unknown&~np.isin(self.bus_table["bus_type"][np.maximum(rows, 0)], bus_types)
+        if np.any(wrong_type):
+            errors.append(f"{kind}s at buses of the wrong type: {describe(np.array(names)[wrong_type])}")
+        unique_rows, counts=np.unique(rows[~unknown], return_counts=True)
+        if np.any(counts>1):
+            errors.append(f"more than one {kind} at buses {describe(np.array(self.bus_table.names)[unique_rows[counts>1]])}")
+        return errors, rows
 
-            #Moving y-prim values into y-admit matrix
-            y_admit[i, i] = y_admit[i, i] + temp[0, 0]
-            y_admit[i, j] = y_admit[i, j] + temp[0, 1]
-            y_admit[j, i] = y_admit[j, i] + temp[1, 0]
-            y_admit[j, j] = y_admit[j, j] + temp[1, 1]
+    def calc_y_admit(self):
+        n=len(self.buses)
+        self.apply_settings()
+
+        #Bus indices and 2x2 primitive matrices of every branch, straight from the branch table
+        self.branch_names=list(self.branch_table.names)
+        self.branch_from=self.branch_table["from_bus"].copy()
+        self.branch_to=self.branch_table["to_bus"].copy()
+        self.branch_in_service=self.branch_table["in_service"].copy()
+
+        #Out-of-service branches are stamped with zeros so the sparsity pattern does not depend on switching
+        self.branch_yprim=self.branch_table.calc_yprim()
+
+        self.ybus=self.stamp_branches(n, self.branch_from, self.branch_to, self.branch_yprim)
+
+        #Bus shunts (e.g. from imported cases) go on the diagonal
+        y_shunt=self.bus_table["g_shunt"]+1j*self.bus_table["b_shunt"]
+        if np.any(y_shunt!=0):
+            self.ybus=(self.ybus+sp.diags(y_shunt,format="csr")).tocsr()
+
+        self.ybus_version=self.topology_version
+        self.calc_bus_indices()
+
+    def apply_settings(self):
+        """
+        Bring the per-unit table data up to date after the frequency or base power in settings
+        changed. Lines built from conductor data are recomputed in one array operation from the
+        line parameter cache; other per-unit branch, shunt and generator data is rescaled to the
+        new base power (its reactances are taken as given, whatever the frequency). Called before
+        any element is added or edited and before the Y-bus is built, so new elements computed on
+        the new base are never rescaled again.
+        """
+        if self.settings.version==self.settings_version:
+            return
 
+        ratio=self.settings.base_power/self.settings_base_power
+        if ratio!=1:
+            for column in ("r", "x"):
+                self.branch_table[column][:]*=ratio
+            self.branch_table["b"][:]/=ratio
+            for column in ("g_shunt", "b_shunt"):
+                self.bus_table[column][:]/=ratio
+            self.bus_table["sub_trans"][:]*=ratio
+
+        rows=np.flatnonzero(self.branch_table["line_type"]>=0)
+        if len(rows)>0:
+            line_types=self.branch_table["line_type"][rows].tolist()
+            z, y, _=get_line_parameter_cache(self.settings).calc_lines(
+                [self.line_types[k][0] for k in line_types], [self.line_types[k][1] for k in line_types],
+                self.bus_table["base_kv"][self.branch_table["from_bus"][rows]], self.branch_table["length"][rows])
+            self.branch_table["r"][rows]=z.real
+            self.branch_table["x"][rows]=z.imag
+            self.branch_table["b"][rows]=y.imag
+
+        self.settings_version=self.settings.version
+        self.settings_base_power=self.settings.base_power
+        self.topology_version+=1
+
+    def get_branch(self, name:str):
+        if name in self.transformers:
+            return self.transformers[name]
+        if name in self.transmission_lines:
+            return self.transmission_lines[name]
+        raise KeyError(f"Branch {name} does not exist")
 
-        for key in self.transmission_lines.keys():
+    def outage_branch(self, name:str):
+        """Take a transformer or line out of service and patch the Y-bus in place."""
+        branch=self.get_branch(name)
+        if not branch.in_service:
+            return
+        branch.in_service=False
+        self.update_branch(name, np.zeros((2,2),dtype=complex))
 
-            busIn=self.transmission_lines[key].bus1
-            busOut=self.transmission_lines[key].bus2
-            i=busIn.index
-            j=busOut.index
+    def restore_branch(self, name:str):
+        """Put a transformer or line back in service and patch the Y-bus in place."""
+        branch=self.get_branch(name)
+        if branch.in_service:
+            return
+        branch.in_service=True
+        self.update_branch(name, self.calc_branch_yprim(branch))
+
+    def set_branch_impedance(self, name:str, impedance:complex, shunt_admittance:complex=0):
+        """
+        Change the per-unit series impedance (and line shunt admittance) of a branch
+        and patch the Y-bus in place.
+        """
+        self.apply_settings()
+        branch=self.get_branch(name)
+        if isinstance(branch, Transformer):
+            branch.impedance=impedance
+        else:
+            branch.series_impedance=impedance
+            branch.shunt_admittance=shunt_admittance
+
+        if branch.in_service:
+            self.update_branch(name, self.calc_branch_yprim(branch))
+
+    def create_branch_view(self, row:int):
+        """Create the Transformer or TransmissionLine view of a bulk-loaded branch table row."""
+        names=self.bus_table.names
+        data=self.branch_table.data
+        bus1=self.buses[names[data["from_bus"][row]]]
+        bus2=self.buses[names[data["to_bus"][row]]]
+        if data["is_transformer"][row]:
+            return Transformer.from_row(self.branch_table, row, bus1, bus2, self.settings)
+        bundle, geometry=self.line_types[data["line_type"][row]] if data["line_type"][row]>=0 else (None, None)
+        return TransmissionLine.from_row(self.branch_table, row, bus1, bus2, self.settings, bundle, geometry)
+
+    @staticmethod
+    def calc_branch_yprim(branch):
+        if isinstance(branch, Transformer):
+            return branch.yprim()
+        return branch.yprim
+
+    def update_branch(self, name:str, yprim_new):
+        """
+        Replace the primitive matrix of one branch in the Y-bus without rebuilding it.
+
+        The 2x2 change is added to the existing CSR entries, logged in topology_changes
+        and topology_version is incremented so dependent caches can update or rebuild.
+        """
+        self.apply_settings()
+        if self.ybus is None or self.ybus_version!=self.topology_version:
+            #Nothing to patch yet: a full build picks up the new branch data
+            self.topology_version+=1
+            return
 
-            temp=self.transmission_lines[key].calc_yprim()
+        k=self.get_branch(name).index
+        i=self.branch_from[k]
+        j=self.branch_to[k]
+        delta_y=np.asarray(yprim_new,dtype=complex)-self.branch_yprim[k]
 
-            #y_admit[i:j,i:j]=y_admit[i:j,i:j] + self.transmission_lines[key].y_prim_mat
-            y_admit[i, i] = y_admit[i,i] + temp[0, 0]
-            y_admit[i, j] = y_admit[i,j] + temp[0, 1]
-            y_admit[j, i] = y_admit[j,i] + temp[1, 0]
-            y_admit[j, j] = y_admit[j,j] + temp[1, 1]
+        for row,col,value in ((i,i,delta_y[0,0]),(i,j,delta_y[0,1]),(j,i,delta_y[1,0]),(j,j,delta_y[1,1])):
+            self.patch_ybus_entry(row,col,value)
 
+        self.branch_yprim[k]=yprim_new
+        self.branch_in_service[k]=self.get_branch(name).in_service
 
+        self.topology_version+=1
+        self.ybus_version=self.topology_version
+        self.topology_changes.append((self.topology_version,i,j,delta_y))
 
-        self.ybus=y_admit
+    def patch_ybus_entry(self, row, col, value):
+        """Add value to ybus[row, col], in place when the entry is already stored."""
+        start,end=self.ybus.indptr[row],self.ybus.indptr[row+1]
+        position=np.flatnonzero(self.ybus.indices[start:end]==col)
+        if len(position)>0:
+            self.ybus.data[start+position[0]]+=value
+        else:
+            self.ybus=self.ybus+sp.csr_matrix(([value],([row],[col])),shape=self.ybus.shape)
+
+    def get_topology_changes(self, since_version:int):
+        """
+        Return the incremental branch edits made after since_version as (bus_i, bus_j, delta_y) tuples,
+        or None if some change since then (e.g. an added bus) cannot be expressed as a branch edit.
+        """
+        changes=[change for change in self.topology_changes if change[0]>since_version]
+        if [change[0] for change in changes]!=list(range(since_version+1,self.topology_version+1)):
+            return None
+        return [(i,j,delta_y) for _,i,j,delta_y in changes]
+
+    def invalidate_bus_types(self):
+        """Drop the bus type index arrays and every cache built on them after a bus type edit."""
+        self.slack_indices=self.pv_indices=self.pq_indices=self.pvpq_indices=None
+        self.topology_version+=1
+
+    def calc_bus_indices(self):
+        """Precompute sorted index arrays of the slack, PV, PQ and non-slack (PV+PQ) buses."""
+        bus_types=self.bus_table["bus_type"]
+
+        self.slack_indices=np.flatnonzero(bus_types==SLACK_BUS)
+        self.pv_indices=np.flatnonzero(bus_types==PV_BUS)
+        self.pq_indices=np.flatnonzero(bus_types==PQ_BUS)
+        self.pvpq_indices=np.flatnonzero(bus_types!=SLACK_BUS)
+
+    def set_ordering(self, method:str):
+        """
+        Choose the fill-reducing ordering used by every solver of this circuit: "amd" (minimum
+        degree, the default), "rcm" (reverse Cuthill-McKee), "natural" (the order the buses were
+        added in) or "colamd" (each linear solver orders its own matrices). Results always stay
+        in bus index order.
+        """
+        if method not in ORDERING_METHODS:
+            raise ValueError(f"Unknown ordering method: {method}, expected one of {', '.join(ORDERING_METHODS)}")
+        self.ordering_method=method
+
+    def get_bus_ordering(self):
+        """Return the bus permutation of the current ordering method, computed once per topology."""
+        key=(self.ordering_method, len(self.bus_table), len(self.branch_table))
+        if self.bus_ordering is None or self.bus_ordering[:3]!=key:
+            self.bus_ordering=key+(calc_bus_ordering(self, self.ordering_method),)
+        return self.bus_ordering[3]
+
+    def get_ordering(self, *blocks):
+        """
+        Return the permutation of a matrix whose rows and columns are the bus index arrays of
+        blocks, concatenated (e.g. (pvpq, pq) for the Jacobian), or None for "colamd".
+        """
+        bus_ordering=self.get_bus_ordering()
+        if bus_ordering is None:
+            return None
+        return calc_block_ordering(bus_ordering, blocks)
+
+    def calc_b_matrix(self):
+        """
+        Susceptance matrix (n x n, sparse CSR) of a lossless, shunt-free copy of every in-service
+        branch, with taps ignored. Used by the DC power flow and the fast decoupled B' matrix.
+        """
+        if self.ybus is None or self.ybus_version!=self.topology_version:
+            self.calc_y_admit()
+
+        b_series=self.branch_in_service/self.get_branch_impedances().imag
+        yprim_x=np.zeros((len(b_series),2,2))
+        yprim_x[:,0,0]=b_series
+        yprim_x[:,0,1]=-b_series
+        yprim_x[:,1,0]=-b_series
+        yprim_x[:,1,1]=b_series
+        return self.stamp_branches(len(self.buses), self.branch_from, self.branch_to, yprim_x).real
+
+    def get_branch_impedances(self):
+        """Return the per-unit series impedance of every branch, in the order of branch_names."""
+        return self.branch_table["r"]+1j*self.branch_table["x"]
+
+    def get_branch_ratings(self):
+        """
+        Return the MVA rating of every branch, in the order of branch_names.
+        Transformers use their power rating, lines the bundle ampacity at the line base voltage.
+        """
+        return self.branch_table["rating"].copy()
+
+    def set_voltages(self, vpu, delta):
+        """Write voltage magnitude and angle arrays (ordered by bus index) into the bus table."""
+        self.bus_table["vpu"][:]=vpu
+        self.bus_table["delta"][:]=delta
+
+    def get_voltage_vector(self):
+        """Return the complex bus voltage vector V = vpu * exp(j*delta) ordered by bus index."""
+        return self.bus_table["vpu"]*np.exp(1j*self.bus_table["delta"])
+
+    @staticmethod
+    def stamp_branches(n, branch_from, branch_to, branch_yprim):
+        """
+        Batch-stamp branch primitive matrices into a sparse n x n admittance matrix.
+
+        Each branch contributes yprim[0,0] at (from,from), yprim[0,1] at (from,to),
+        yprim[1,0] at (to,from) and yprim[1,1] at (to,to). Duplicate entries are
+        summed when the COO matrix is converted to CSR.
+        """
+        rows=np.stack([branch_from,branch_from,branch_to,branch_to],axis=1).ravel()
+        cols=np.stack([branch_from,branch_to,branch_from,branch_to],axis=1).ravel()
+        data=np.asarray(branch_yprim,dtype=complex).reshape(-1)
+
+        y_admit=sp.coo_matrix((data,(rows,cols)),shape=(n,n)).tocsr()
+        y_admit.sum_duplicates()
+        return y_admit
+
+    @staticmethod
+    def calc_branch_flows(branch_from, branch_to, branch_yprim, v):
+        """
+        Complex per-unit power flowing into each branch at its from and to ends.
+
+        :return: (s_from, s_to) arrays, one entry per branch.
+        """
+        v_from=v[branch_from]
+        v_to=v[branch_to]
+        i_from=branch_yprim[:,0,0]*v_from+branch_yprim[:,0,1]*v_to
+        i_to=branch_yprim[:,1,0]*v_from+branch_yprim[:,1,1]*v_to
+        return v_from*np.conj(i_from), v_to*np.conj(i_to)
+
+    def get_ybus_dense(self):
+        """Return a dense copy of the Y-bus. Only intended for small cases and printing."""
+        if self.ybus is None:
+            return None
+        return self.ybus.toarray()
 
     def print_ybus(self):
         bus_names = list(self.buses.keys())
-        y_admit_df = pd.DataFrame(self.ybus, index=bus_names, columns=bus_names)
-
-        pd.set_option('display.max_rows', None)  # Show all rows
-        pd.set_option('display.max_columns', None)  # Show all columns
-        pd.set_option('display.width', 1000)  # Increase the display width
-        pd.set_option('display.float_format', lambda x: f'{x.real:.5f}{x.imag:+.5f}j')
-        # Print the DataFrame
-        #print(y_admit_df)
+        y_admit_df = pd.DataFrame(self.get_ybus_dense(), index=bus_names, columns=bus_names)
+
+        with pd.option_context('display.max_rows', None,  # Show all rows
+                               'display.max_columns', None,  # Show all columns
+                               'display.width', 1000,  # Increase the display width
+                               'display.float_format', lambda x: f'{x.real:.5f}{x.imag:+.5f}j'):
+            # Print the DataFrame
+            #print(y_admit_df)
+            pass
 
 if __name__ == "__main__":
 
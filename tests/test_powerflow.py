@@ -0,0 +1,121 @@
+# 7-bus example case: power flow solutions, Y-bus assembly and fault results against reference values
+import numpy as np
+
+from circuit import Circuit
+from Conductor import Conductor
+from Bundle import Bundle
+from Geometry import Geometry
+from Newton_Raphson import Newton_Raphson
+from Fast_Decoupled import Fast_Decoupled
+from Symmetrical_Faults import Fault
+
+#Solution of the 7-bus case from an independent dense Newton-Raphson
+VPU_REF = np.array([1.0, 0.93691825, 0.92048833, 0.92979737, 0.92672652, 0.93967911, 1.0])
+DELTA_REF = np.radians([0.0, -4.44495972, -5.46544223, -4.70411452, -4.83536926, -3.95321224, 2.14920116])
+
+#Bolted three-phase fault current magnitudes in per-unit at bus1..bus7
+FAULT_CURRENT_REF = np.array([13.132, 12.472, 11.237, 12.442, 12.366, 13.295, 20.234])
+
+
+def build():
+    """The 7-bus example from Main.py."""
+    circuit = Circuit("Circuit1")
+    circuit.add_bus("bus1", 20, 1, 0, "Slack_Bus")
+    for name in ("bus2", "bus3", "bus4", "bus5", "bus6"):
+        circuit.add_bus(name, 230)
+    circuit.add_bus("bus7", 18, 1, 0, "PV_Bus")
+    conductor = Conductor("Partridge", 0.642, 0.0217, 0.385, 460)
+    bundle = Bundle("Bundle1", 2, 1.5, conductor)
+    geometry = Geometry("Geometry1", 0, 0, 19.5, 0, 39, 0)
+    circuit.add_transmission_lines("Line1", "bus2", "bus4", bundle, geometry, 10)
+    circuit.add_transmission_lines("Line2", "bus2", "bus3", bundle, geometry, 25)
+    circuit.add_transmission_lines("Line3", "bus3", "bus5", bundle, geometry, 20)
+    circuit.add_transmission_lines("Line4", "bus4", "bus6", bundle, geometry, 20)
+    circuit.add_transmission_lines("Line5", "bus5", "bus6", bundle, geometry, 10)
+    circuit.add_transmission_lines("Line6", "bus4", "bus5", bundle, geometry, 35)
+    circuit.add_transformer("Tx1", "bus1", "bus2", 125, 8.5, 10)
+    circuit.add_transformer("Tx2", "bus6", "bus7", 200, 10.5, 12)
+    circuit.add_generator("Gen1", 1.0, 100, "bus1", 0.12)
+    circuit.add_generator("Gen2", 1.0, 200.0, "bus7", 0.12)
+    circuit.add_load("Load2", 110, 50, "bus3")
+    circuit.add_load("Load3", 100, 70, "bus4")
+    circuit.add_load("Load4", 100, 65, "bus5")
+    return circuit
+
+
+def calc_dense_ybus(circuit: Circuit):
+    """Stamp every in-service branch object one at a time into a dense matrix."""
+    ybus = np.zeros((len(circuit.buses), len(circuit.buses)), dtype=complex)
+    for branch in list(circuit.transformers.values()) + list(circuit.transmission_lines.values()):
+        if branch.in_service:
+            rows = [branch.bus1.index, branch.bus2.index]
+            ybus[np.ix_(rows, rows)] += circuit.calc_branch_yprim(branch)
+    return ybus
+
+
+def calc_fault_currents(circuit: Circuit):
+    currents = []
+    for name in circuit.buses:
+        fault = Fault(circuit, name)
+        fault.calc_fault()
+        currents.append(abs(fault.fault_current))
+    return np.array(currents)
+
+
+def edit_branches(circuit: Circuit):
+    """Incremental edits that touch a line impedance, an outage and a transformer."""
+    line = circuit.transmission_lines["Line1"]
+    circuit.set_branch_impedance("Line1", 2 * line.series_impedance, line.shunt_admittance)
+    circuit.outage_branch("Line6")
+    circuit.outage_branch("Tx2")
+    circuit.restore_branch("Tx2")
+
+
+def test_newton_raphson():
+    circuit = build()
+    Newton_Raphson(circuit, 1e-10, 20).solve()
+    assert np.allclose(circuit.bus_table["vpu"], VPU_REF, atol=1e-7)
+    assert np.allclose(circuit.bus_table["delta"], DELTA_REF, atol=1e-7)
+
+
+def test_fast_decoupled():
+    circuit = build()
+    Fast_Decoupled(circuit, 1e-9, 100).solve()
+    assert np.allclose(circuit.bus_table["vpu"], VPU_REF, atol=1e-7)
+    assert np.allclose(circuit.bus_table["delta"], DELTA_REF, atol=1e-7)
+
+
+def test_sparse_ybus_matches_dense_stamp():
+    circuit = build()
+    circuit.calc_y_admit()
+    assert np.allclose(circuit.ybus.toarray(), calc_dense_ybus(circuit), rtol=0, atol=1e-10)
+
+
+def test_update_branch_matches_rebuild():
+    circuit = build()
+    circuit.calc_y_admit()
+    edit_branches(circuit)
+    assert circuit.ybus_version == circuit.topology_version
+    patched = circuit.ybus.toarray()
+    circuit.calc_y_admit()
+    assert np.allclose(patched, circuit.ybus.toarray(), rtol=0, atol=1e-10)
+    assert np.allclose(patched, calc_dense_ybus(circuit), rtol=0, atol=1e-10)
+
+
+def test_fault_currents():
+    assert np.allclose(calc_fault_currents(build()), FAULT_CURRENT_REF, rtol=0, atol=1e-3)
+
+
+def test_low_rank_fault_matches_refactorization():
+    circuit = build()
+    calc_fault_currents(circuit)
+    edit_branches(circuit)
+    updated = calc_fault_currents(circuit)
+    assert circuit.fault_cache["linear_solver"].rank > 0
+    #Without the cache the augmented Y-bus is rebuilt and factorized from scratch
+    circuit.fault_cache = None
+    refactored = calc_fault_currents(circuit)
+    assert circuit.fault_cache["linear_solver"].rank == 0
+    assert np.allclose(updated, refactored, rtol=1e-10, atol=0)
+    assert not np.allclose(updated, FAULT_CURRENT_REF, rtol=0, atol=1e-3)
+
@@ -0,0 +1,38 @@
+# Per-unit data after base power changes, whatever order elements are added and the Y-bus is built in
+import numpy as np
+
+from circuit import Circuit
+from Settings import Settings
+
+
+def build(circuit: Circuit, change_base=None):
+    """Two buses with a transformer, a per-unit line and a generator; change_base runs after the first bus."""
+    circuit.add_bus("A", 20, 1, 0, "Slack_Bus")
+    if change_base is not None:
+        change_base(circuit)
+    circuit.add_bus("B", 230)
+    circuit.add_transformer("T1", "A", "B", 100, 10.5, 10)
+    circuit.add_lines(["L1"], "A", "B", r=0.01, x=0.1, b=0.02)
+    circuit.add_generator("G1", 1.0, 100, "A", 0.12)
+    circuit.calc_y_admit()
+    return circuit
+
+
+def set_base(circuit: Circuit):
+    circuit.settings.base_power = 200
+
+
+def test_change_base_then_add_elements():
+    reference = build(Circuit("reference", Settings(base_power=200)))
+    circuit = build(Circuit("changed"), set_base)
+    assert np.allclose(circuit.get_branch_impedances(), reference.get_branch_impedances())
+    assert np.allclose(circuit.ybus.toarray(), reference.ybus.toarray())
+    assert circuit.generators["G1"].sub_trans == reference.generators["G1"].sub_trans
+
+
+def test_change_base_after_build_rescales():
+    circuit = build(Circuit("rescaled"))
+    impedances = circuit.get_branch_impedances().copy()
+    circuit.settings.base_power = 200
+    circuit.calc_y_admit()
+    assert np.allclose(circuit.get_branch_impedances(), 2 * impedances)